@@ -1,5 +1,6 @@
 # app/__init__.py
 import os
+import click
 from flask import Flask, redirect, url_for
 from config import Config
 from extensions import db, csrf, login_manager
@@ -39,6 +40,14 @@ def create_app(config_class: type[Config] = Config):
     app.register_blueprint(expert_system_bp)
     app.register_blueprint(audit_bp)
     
+    # register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # one commit per request when UNIT_OF_WORK is enabled
+    from app.services.unit_of_work import register_unit_of_work
+    register_unit_of_work(app)
+    
     @app.route("/")
     def home():
         return redirect(url_for("auth.login"))
@@ -48,18 +57,46 @@ def create_app(config_class: type[Config] = Config):
         from app.models.user import UserTable
         from app.models.role import RoleTable
         from app.models.permission import PermissionTable
-        from app.models.expert_system import Category, Symptom, Disease, Rule, Case
-        from app.models.audit_log import AuditLog
+        from app.models.expert_system import Category, Symptom, Disease, Rule, Case, CaseArchiveBlock, CaseRollup, KnowledgeBaseVersion
+        from app.models.audit_log import AuditLog, AuditArchiveBlock
+        from app.models.idempotency_key import IdempotencyKey
 
         # Default RESET_DB to 0 to prevent database reset on restart
         if os.environ.get("RESET_DB", "0") == "1":
             db.drop_all()
 
+        new_database = not db.inspect(db.engine).has_table(AuditLog.__tablename__)
         db.create_all()
+
+        # create_all() only creates missing tables; columns, indexes, the audit
+        # search index and partitions added since are applied by
+        # 'flask db upgrade', once per deploy rather than by every worker.
+        # A new database gets its search index here, while it is still empty.
+        from app.services.schema_service import SchemaService
+        missing = [] if new_database else SchemaService.missing_columns()
+        if missing:
+            message = (
+                f"Database schema is out of date (missing {', '.join(missing)}); "
+                "run 'flask db upgrade' before starting the app."
+            )
+            command = click.get_current_context(silent=True)
+            if command is None or command.info_name == "run":
+                raise RuntimeError(message)
+            # Other CLI commands, 'flask db upgrade' among them, still get the app
+            app.logger.warning(message)
+
+        from app.services.audit_search_service import AuditSearchService
+        if new_database:
+            AuditSearchService.install()
+        AuditSearchService.detect()
         
         # Only seed if the database is empty (e.g. check if any users exist)
         if not UserTable.query.first():
             from app.services.seed_service import seed_all
             seed_all()
+
+        # Load the compiled knowledge base from its snapshot (or rebuild it)
+        from app.services.knowledge_base_service import KnowledgeBaseService
+        KnowledgeBaseService.warm_start()
         
     return app
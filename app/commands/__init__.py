@@ -0,0 +1,14 @@
+# app/commands/__init__.py
+from app.commands.audit import audit_cli
+from app.commands.cases import cases_cli
+from app.commands.db import db_cli
+from app.commands.rediagnose import rediagnose_cli
+from app.commands.rollups import rollups_cli
+
+
+def register_commands(app):
+    app.cli.add_command(audit_cli)
+    app.cli.add_command(cases_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(rediagnose_cli)
+    app.cli.add_command(rollups_cli)
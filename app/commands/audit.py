@@ -0,0 +1,55 @@
+# app/commands/audit.py
+import time
+
+import click
+from flask.cli import AppGroup
+from extensions import db
+from app.services.audit_retention_service import AuditRetentionService
+from app.services.audit_search_service import AuditSearchService
+
+audit_cli = AppGroup("audit", help="Maintain the audit log.")
+
+
+@audit_cli.command("rebuild-search")
+@click.option("--batch-size", default=10_000, show_default=True, help="Entries indexed per transaction.")
+def rebuild_search(batch_size):
+    """Re-index every audit entry for search (run once after upgrading on Postgres)."""
+    backend = AuditSearchService.backend()
+    if backend == "like":
+        raise click.ClickException("No search index on this database; searches scan the audit log.")
+    started = time.perf_counter()
+    count = AuditSearchService.rebuild(batch_size)
+    click.echo(f"Indexed {count} audit entries ({backend}) in {time.perf_counter() - started:.1f}s.")
+
+
+@audit_cli.command("partition")
+def partition():
+    """Convert the audit log into monthly partitions (Postgres; run once, during maintenance)."""
+    if db.engine.dialect.name != "postgresql":
+        raise click.ClickException("Only Postgres audit logs are partitioned; 'flask audit roll' handles the rest.")
+    if AuditRetentionService.is_partitioned():
+        created = AuditRetentionService.ensure_partitions()
+        click.echo(f"Already partitioned; created {len(created)} upcoming partitions.")
+        return
+    started = time.perf_counter()
+    copied = AuditRetentionService.partition()
+    click.echo(f"Partitioned the audit log by month ({copied} entries copied) in {time.perf_counter() - started:.1f}s.")
+
+
+@audit_cli.command("roll")
+@click.option("--retention-months", type=int, help="Defaults to AUDIT_RETENTION_MONTHS.")
+@click.option("--block-size", type=int, help="Entries per compressed block; defaults to AUDIT_ARCHIVE_BLOCK_SIZE.")
+@click.option("--dry-run", is_flag=True, help="Only list the months that would be rolled.")
+def roll(retention_months, block_size, dry_run):
+    """Archive months older than the retention window under AUDIT_ARCHIVE_DIR and drop them."""
+    cutoff = AuditRetentionService.cutoff(retention_months)
+    if dry_run:
+        months = AuditRetentionService.pending(cutoff)
+        for month, count in months:
+            click.echo(f"{month:%Y-%m}: {count} entries")
+        click.echo(f"{sum(count for _, count in months)} entries created before {cutoff:%Y-%m-%d} would be rolled.")
+        return
+    started = time.perf_counter()
+    rolled = AuditRetentionService.roll(cutoff, block_size)
+    click.echo(f"Rolled {rolled} audit entries created before {cutoff:%Y-%m-%d} "
+               f"in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,86 @@
+# app/commands/cases.py
+import itertools
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from extensions import db
+from app.models.expert_system import Case
+from app.services.case_archive_service import CaseArchiveService
+from app.services.case_export_service import CaseExportService
+from app.services.expert_system_service import CaseService
+
+cases_cli = AppGroup("cases", help="Case history maintenance and export.")
+
+
+def _parse_date(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise click.BadParameter("expected YYYY-MM-DD")
+
+
+@cases_cli.command("export")
+@click.argument("output_file", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "export_format", type=click.Choice(["csv", "ndjson"]), default="csv", show_default=True)
+@click.option("--date-from", callback=_parse_date, help="First day to include (YYYY-MM-DD).")
+@click.option("--date-to", callback=_parse_date, help="Last day to include (YYYY-MM-DD).")
+@click.option("--disease-id", type=int)
+@click.option("--user-id", type=int)
+@click.option("--symptom-id", type=int)
+@click.option("--chunk-size", default=1000, show_default=True, help="Rows fetched per round trip.")
+@click.option("--include-archived", is_flag=True, help="Also export archived cases (written first).")
+def export_cases(output_file, export_format, date_from, date_to, disease_id, user_id, symptom_id, chunk_size,
+                 include_archived):
+    """Stream the case history with symptoms to OUTPUT_FILE (default stdout)."""
+    filters = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "disease_id": disease_id,
+        "user_id": user_id,
+        "symptom_id": symptom_id,
+    }
+    rows = CaseExportService.iter_rows(filters, chunk_size)
+    if include_archived:
+        rows = itertools.chain(CaseArchiveService.iter_rows(filters), rows)
+    if export_format == "csv":
+        pieces = CaseExportService.format_csv(rows, chunk_size)
+    else:
+        pieces = CaseExportService.format_ndjson(rows, chunk_size)
+    for piece in pieces:
+        output_file.write(piece)
+
+
+@cases_cli.command("archive")
+@click.option("--older-than-days", type=int, help="Defaults to CASE_ARCHIVE_AFTER_DAYS.")
+@click.option("--batch-size", type=int, help="Cases moved per transaction; defaults to CASE_ARCHIVE_BATCH_SIZE.")
+@click.option("--max-cases", type=int, help="Stop after moving this many cases.")
+@click.option("--dry-run", is_flag=True, help="Only count the cases that would be archived.")
+def archive_cases(older_than_days, batch_size, max_cases, dry_run):
+    """Move old cases into compressed segment files under CASE_ARCHIVE_DIR."""
+    cutoff = CaseArchiveService.cutoff(older_than_days)
+    if dry_run:
+        count = db.session.scalar(db.select(db.func.count(Case.id)).where(Case.created_at < cutoff))
+        click.echo(f"{count} cases created before {cutoff:%Y-%m-%d %H:%M} would be archived.")
+        return
+    started = time.perf_counter()
+    moved = CaseArchiveService.archive(
+        cutoff,
+        batch_size=batch_size or current_app.config["CASE_ARCHIVE_BATCH_SIZE"],
+        max_cases=max_cases,
+    )
+    click.echo(f"Archived {moved} cases created before {cutoff:%Y-%m-%d %H:%M} "
+               f"in {time.perf_counter() - started:.1f}s.")
+
+
+@cases_cli.command("backfill-symptom-keys")
+@click.option("--batch-size", default=1000, show_default=True)
+def backfill_symptom_keys(batch_size):
+    """Fill the symptom-set columns on cases recorded before they existed."""
+    started = time.perf_counter()
+    updated = CaseService.backfill_symptom_keys(batch_size)
+    click.echo(f"Backfilled {updated} cases in {time.perf_counter() - started:.1f}s.")
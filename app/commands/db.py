@@ -0,0 +1,14 @@
+# app/commands/db.py
+import click
+from flask.cli import AppGroup
+from app.services.schema_service import SchemaService
+
+db_cli = AppGroup("db", help="Database schema maintenance.")
+
+
+@db_cli.command("upgrade")
+def upgrade():
+    """Add the columns, indexes, search index and partitions this version needs (run once per deploy)."""
+    for change in SchemaService.upgrade():
+        click.echo(change)
+    click.echo("Database is up to date.")
@@ -0,0 +1,199 @@
+# app/commands/rediagnose.py
+import csv
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from extensions import db
+from app.models.expert_system import Case
+from app.models.user import UserTable
+from app.models.associations import tbl_cases_symptoms
+from app.services.case_rollup_service import CaseRollupService
+from app.services.diagnosis_service import DiagnosisService
+from app.services.knowledge_base_service import KnowledgeBase, build_engine
+
+# Read-only engine owned by each pool worker, built once by _init_worker
+_worker_engine = None
+
+
+def _init_worker(kb: KnowledgeBase, backend: str) -> None:
+    global _worker_engine
+    _worker_engine = build_engine(kb, backend)
+
+
+def _diagnose_chunk(chunk: List[Tuple[object, List[int]]]):
+    """Returns (key, symptom_ids, top result fields or None) for each (key, symptom_ids)."""
+    out = []
+    for key, symptom_ids in chunk:
+        results = DiagnosisService.infer_with_engine(_worker_engine, symptom_ids, top_k=1)
+        if results:
+            top = results[0]
+            out.append((key, symptom_ids, {
+                "disease_id": top["disease"].id,
+                "disease": top["disease"].name,
+                "confidence": top["confidence"],
+                "matched_count": top["matched_count"],
+                "rule_id": top["rule"].id,
+            }))
+        else:
+            out.append((key, symptom_ids, None))
+    return out
+
+
+def _fan_out(kb: KnowledgeBase, chunks: Iterator[list], workers: int):
+    """
+    Streams chunks through a process pool, yielding results in input order.
+    At most 2 x workers chunks are in flight, so memory stays bounded.
+    Workers are spawned rather than forked so they never inherit the
+    parent's database connections.
+    """
+    backend = current_app.config.get("INFERENCE_BACKEND", "index")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(kb, backend),
+    ) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_diagnose_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _case_chunks(chunk_size: int) -> Iterator[List[Tuple[int, List[int]]]]:
+    """Keyset-paginates (case_id, symptom_ids) over tbl_cases by id."""
+    last_id = 0
+    while True:
+        case_ids = db.session.scalars(
+            db.select(Case.id).where(Case.id > last_id).order_by(Case.id).limit(chunk_size)
+        ).all()
+        if not case_ids:
+            return
+        symptoms = {case_id: [] for case_id in case_ids}
+        for case_id, symptom_id in db.session.execute(
+            db.select(tbl_cases_symptoms.c.case_id, tbl_cases_symptoms.c.symptom_id)
+            .where(tbl_cases_symptoms.c.case_id.in_(case_ids))
+        ):
+            symptoms[case_id].append(symptom_id)
+        yield list(symptoms.items())
+        last_id = case_ids[-1]
+
+
+class _Progress:
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def advance(self, n: int) -> None:
+        self.count += n
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed else 0.0
+        click.echo(f"{self.label}: {self.count} processed ({rate:.0f}/s)")
+
+
+rediagnose_cli = AppGroup("rediagnose", help="Re-score cases or field reports against the current rules.")
+
+
+@rediagnose_cli.command("cases")
+@click.option("--chunk-size", default=1000, show_default=True)
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Report changes without writing them.")
+def rediagnose_cases(chunk_size, workers, dry_run):
+    """Re-score every recorded case and update its disease and confidence."""
+    progress = _Progress("cases")
+    changed = 0
+    for results in _fan_out(KnowledgeBase.load(), _case_chunks(chunk_size), workers):
+        updates = [
+            {
+                "id": case_id,
+                "disease_id": top["disease_id"] if top else None,
+                "confidence": top["confidence"] if top else None,
+            }
+            for case_id, _, top in results
+        ]
+        current = {
+            row.id: (row.disease_id, row.confidence)
+            for row in db.session.execute(
+                db.select(Case.id, Case.disease_id, Case.confidence)
+                .where(Case.id.in_([u["id"] for u in updates]))
+            )
+        }
+        updates = [u for u in updates if current.get(u["id"]) != (u["disease_id"], u["confidence"])]
+        changed += len(updates)
+        if updates and not dry_run:
+            db.session.execute(db.update(Case), updates)
+            db.session.commit()
+        progress.advance(len(results))
+    click.echo(f"{changed} cases {'would change' if dry_run else 'updated'}.")
+    if changed and not dry_run:
+        # Rollups count cases under the disease they were recorded with
+        CaseRollupService.rebuild()
+        click.echo("Prevalence rollups rebuilt.")
+
+
+def _csv_chunks(reader, column: str, chunk_size: int):
+    chunk = []
+    for line_no, row in enumerate(reader, start=2):
+        raw = (row.get(column) or "").replace(",", " ").replace(";", " ")
+        try:
+            symptom_ids = [int(token) for token in raw.split()]
+        except ValueError:
+            raise click.ClickException(f"Line {line_no}: '{row.get(column)}' is not a list of symptom ids.")
+        chunk.append((row, symptom_ids))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@rediagnose_cli.command("csv")
+@click.argument("input_path", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--column", default="symptom_ids", show_default=True,
+              help="Column holding symptom ids separated by spaces, commas or semicolons.")
+@click.option("--chunk-size", default=1000, show_default=True)
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True)
+@click.option("--record-as", "username", help="Also record a Case per matched row for this user.")
+def rediagnose_csv(input_path, output_path, column, chunk_size, workers, username):
+    """Diagnose every row of a field-report CSV and write the results."""
+    user_id = None
+    if username:
+        user_id = db.session.scalar(db.select(UserTable.id).filter_by(username=username))
+        if user_id is None:
+            raise click.ClickException(f"Unknown user '{username}'.")
+
+    # newline="": the csv module writes its own \r\n row endings
+    with open(input_path, newline="", encoding="utf-8-sig") as input_file, \
+            open(output_path, "w", newline="", encoding="utf-8") as output_file:
+        reader = csv.DictReader(input_file)
+        if column not in (reader.fieldnames or []):
+            raise click.ClickException(f"Input has no '{column}' column.")
+        result_fields = ["disease_id", "disease", "confidence", "matched_count", "rule_id"]
+        writer = csv.DictWriter(output_file, fieldnames=list(reader.fieldnames) + result_fields)
+        writer.writeheader()
+
+        kb = KnowledgeBase.load()
+        progress = _Progress("rows")
+        for results in _fan_out(kb, _csv_chunks(reader, column, chunk_size), workers):
+            for row, _, top in results:
+                writer.writerow({**row, **(top or {})})
+            if user_id is not None:
+                DiagnosisService.record_cases(user_id, [
+                    (
+                        symptom_ids,
+                        {"disease": kb.diseases[top["disease_id"]], "confidence": top["confidence"]} if top else None,
+                    )
+                    for _, symptom_ids, top in results
+                ])
+            progress.advance(len(results))
@@ -0,0 +1,17 @@
+# app/commands/rollups.py
+import time
+
+import click
+from flask.cli import AppGroup
+from app.services.case_rollup_service import CaseRollupService
+
+rollups_cli = AppGroup("rollups", help="Maintain the case prevalence rollups.")
+
+
+@rollups_cli.command("rebuild")
+@click.option("--chunk-size", default=10_000, show_default=True, help="Cases fetched per round trip.")
+def rebuild_rollups(chunk_size):
+    """Recompute the daily and weekly rollups from every recorded case."""
+    started = time.perf_counter()
+    count = CaseRollupService.rebuild(chunk_size)
+    click.echo(f"Rebuilt rollups from {count} cases in {time.perf_counter() - started:.1f}s.")
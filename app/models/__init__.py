@@ -2,7 +2,7 @@
 from .user import UserTable
 from .role import RoleTable
 from .permission import PermissionTable
-from .expert_system import Category, Symptom, Disease, Rule, Case
+from .expert_system import Category, Symptom, Disease, Rule, Case, CaseArchiveBlock, CaseRollup, KnowledgeBaseVersion
 
 __all__ = [
     "UserTable",
@@ -13,4 +13,7 @@ __all__ = [
     "Disease",
     "Rule",
     "Case",
+    "CaseArchiveBlock",
+    "CaseRollup",
+    "KnowledgeBaseVersion",
 ]
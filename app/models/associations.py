@@ -20,6 +20,8 @@ tbl_cases_symptoms = db.Table(
     "tbl_cases_symptoms",
     db.Column("case_id", db.Integer, db.ForeignKey("tbl_cases.id"), primary_key=True),
     db.Column("symptom_id", db.Integer, db.ForeignKey("tbl_symptoms.id"), primary_key=True),
+    # case history filtered by symptom
+    db.Index("ix_tbl_cases_symptoms_symptom_id", "symptom_id", "case_id"),
 )
 
 # rules <-> symptoms (many-to-many)
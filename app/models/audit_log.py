@@ -3,6 +3,15 @@ from extensions import db
 
 class AuditLog(db.Model):
     __tablename__ = "tbl_audit_logs"
+    # Keyset pagination of the audit log on (created_at, id), overall and
+    # per user / per action. On Postgres the table may be partitioned by month
+    # of created_at ('flask audit partition'); its primary key is then
+    # (id, created_at), ids still coming from seq_audit_logs_id.
+    __table_args__ = (
+        db.Index("ix_tbl_audit_logs_created_at_id", "created_at", "id"),
+        db.Index("ix_tbl_audit_logs_user_id_created_at", "user_id", "created_at", "id"),
+        db.Index("ix_tbl_audit_logs_action_created_at", "action", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, db.Sequence('seq_audit_logs_id'), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id"), nullable=True)
@@ -17,3 +26,25 @@ class AuditLog(db.Model):
 
     def __repr__(self):
         return f"<AuditLog {self.action} {self.target_type} by {self.user_id}>"
+
+
+class AuditArchiveBlock(db.Model):
+    """
+    One compressed block of archived audit entries: a gzip member at
+    offset/length in an append-only monthly segment file under AUDIT_ARCHIVE_DIR.
+    """
+    __tablename__ = "tbl_audit_archive_blocks"
+
+    id = db.Column(db.Integer, primary_key=True)
+    segment = db.Column(db.String(255), nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+    entry_count = db.Column(db.Integer, nullable=False)
+    first_entry_id = db.Column(db.Integer, nullable=False, index=True)
+    last_entry_id = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_created_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<AuditArchiveBlock {self.segment}@{self.offset}>"
@@ -83,12 +83,24 @@ class Rule(db.Model):
 
 class Case(db.Model):
     __tablename__ = "tbl_cases"
+    # Keyset pagination of the case history on (created_at, id), overall and
+    # per user / per disease
+    __table_args__ = (
+        db.Index("ix_tbl_cases_created_at_id", "created_at", "id"),
+        db.Index("ix_tbl_cases_user_id_created_at", "user_id", "created_at", "id"),
+        db.Index("ix_tbl_cases_disease_id_created_at", "disease_id", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, db.Sequence('seq_cases_id'), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id"))
     disease_id = db.Column(db.Integer, db.ForeignKey("tbl_diseases.id"))
     confidence = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Denormalized symptom set (see CaseService.encode_symptom_set): sorted ids
+    # as ",3,7,12,", a 64-bit hash of that text and a bitmap of id % 63
+    symptom_key = db.Column(db.Text)
+    symptom_set_hash = db.Column(db.BigInteger, index=True)
+    symptom_mask = db.Column(db.BigInteger)
 
     symptoms = db.relationship(
         "Symptom",
@@ -100,3 +112,57 @@ class Case(db.Model):
 
     def __repr__(self) -> str:
         return f"<Case {self.id}>"
+
+
+class CaseArchiveBlock(db.Model):
+    """
+    One compressed block of archived cases: a gzip member at offset/length
+    in an append-only segment file under CASE_ARCHIVE_DIR.
+    """
+    __tablename__ = "tbl_case_archive_blocks"
+
+    id = db.Column(db.Integer, primary_key=True)
+    segment = db.Column(db.String(255), nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+    case_count = db.Column(db.Integer, nullable=False)
+    first_case_id = db.Column(db.Integer, nullable=False, index=True)
+    last_case_id = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_created_at = db.Column(db.DateTime, nullable=False)
+    # Space-separated disease ids present in the block
+    disease_ids = db.Column(db.Text, nullable=False, default="")
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<CaseArchiveBlock {self.segment}@{self.offset}>"
+
+
+class CaseRollup(db.Model):
+    """
+    Case counts per day or week (period_start is the Monday) and per disease,
+    category or user, upserted as cases are recorded.
+    """
+    __tablename__ = "tbl_case_rollups"
+
+    period = db.Column(db.String(8), primary_key=True)  # "day" | "week"
+    period_start = db.Column(db.Date, primary_key=True)
+    dimension = db.Column(db.String(16), primary_key=True)  # "disease" | "category" | "user"
+    key_id = db.Column(db.Integer, primary_key=True)
+    case_count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self) -> str:
+        return f"<CaseRollup {self.period} {self.period_start} {self.dimension}={self.key_id}>"
+
+
+class KnowledgeBaseVersion(db.Model):
+    """Single-row counter bumped on every knowledge-base write."""
+    __tablename__ = "tbl_kb_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<KnowledgeBaseVersion {self.version}>"
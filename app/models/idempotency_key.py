@@ -0,0 +1,22 @@
+# app/models/idempotency_key.py
+from datetime import datetime
+from extensions import db
+
+
+class IdempotencyKey(db.Model):
+    """
+    A request key claimed by the first submission carrying it. response is
+    NULL while that submission is still running and holds its JSON result
+    once it has finished; repeats within the TTL replay it.
+    """
+    __tablename__ = "tbl_idempotency_keys"
+
+    # "<scope>:<user id>:<client key>"
+    key = db.Column(db.String(200), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id"), nullable=True)
+    response = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key}>"
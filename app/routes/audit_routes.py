@@ -1,12 +1,31 @@
-from flask import Blueprint, render_template, abort, Response, request
+from flask import Blueprint, render_template, abort, Response, request, current_app, jsonify, stream_with_context
 from flask_login import login_required, current_user
-from app.services.audit_service import AuditService
+from app.services.audit_export_service import AuditExportService
+from app.services.audit_search_service import AuditSearchService
+from app.services.audit_service import AuditService, ACTIONS
 from app.services.user_service import UserService
-import csv
-import io
+from utils.request_args import date_arg
 
 audit_bp = Blueprint("audit", __name__, url_prefix="/audit")
 
+FILTER_KEYS = ("action", "target_type", "user_id", "date_from", "date_to")
+
+
+def _audit_filters():
+    """Reads audit log filters from the query string; bad values are ignored."""
+    return {
+        "action": request.args.get("action", "").strip().upper() or None,
+        "target_type": request.args.get("target_type", "").strip() or None,
+        "user_id": request.args.get("user_id", type=int),
+        "date_from": date_arg("date_from"),
+        "date_to": date_arg("date_to"),
+    }
+
+
+def _filter_args(*exclude):
+    return {key: request.args[key] for key in FILTER_KEYS if key not in exclude and request.args.get(key)}
+
+
 @audit_bp.route("/")
 @login_required
 def index():
@@ -14,13 +33,68 @@ def index():
         abort(403)
     
     search_query = request.args.get("q", "").strip()
+    filters = _audit_filters()
+    page = max(1, request.args.get("page", 1, type=int))
+    next_cursor = None
+    has_next = False
     
     if search_query:
-        logs = AuditService.search_logs(search_query)
+        logs, has_next = AuditSearchService.search(
+            search_query, filters, page, current_app.config["AUDIT_PAGE_SIZE"]
+        )
     else:
-        logs = AuditService.get_all_logs()
+        try:
+            logs, next_cursor = AuditService.get_page(
+                filters, request.args.get("cursor"), current_app.config["AUDIT_PAGE_SIZE"]
+            )
+        except ValueError:
+            abort(400)
         
-    return render_template("audit/index.html", logs=logs, search_query=search_query)
+    return render_template(
+        "audit/index.html",
+        logs=logs,
+        search_query=search_query,
+        page=page,
+        has_next=has_next,
+        next_cursor=next_cursor,
+        filters=filters,
+        filter_args=_filter_args(),
+        actions=ACTIONS,
+        users=UserService.get_user_all(),
+    )
+
+@audit_bp.route("/api/search")
+@login_required
+def search_api():
+    """
+    Ranked audit log search. Query string: q, page, plus the viewer's
+    filters. Every word of q must prefix-match the username, action,
+    target or details.
+    """
+    if not current_user.has_role("Admin"):
+        abort(403)
+    page = max(1, request.args.get("page", 1, type=int))
+    logs, has_next = AuditSearchService.search(
+        request.args.get("q", ""), _audit_filters(), page, current_app.config["AUDIT_PAGE_SIZE"]
+    )
+    return jsonify({
+        "items": [
+            {
+                "id": log.id,
+                "created_at": log.created_at.isoformat(),
+                "user_id": log.user_id,
+                "username": log.user.username if log.user else None,
+                "action": log.action,
+                "target_type": log.target_type,
+                "target_id": log.target_id,
+                "details": log.details,
+                "ip_address": log.ip_address,
+            }
+            for log in logs
+        ],
+        "page": page,
+        "has_next": has_next,
+    })
 
 @audit_bp.route("/user/<int:user_id>")
 @login_required
@@ -32,47 +106,48 @@ def user_logs(user_id):
     if not user:
         abort(404)
         
-    logs = AuditService.get_logs_by_user(user_id)
-    return render_template("audit/user_logs.html", logs=logs, user=user)
+    filters = {**_audit_filters(), "user_id": user_id}
+    try:
+        logs, next_cursor = AuditService.get_page(
+            filters, request.args.get("cursor"), current_app.config["AUDIT_PAGE_SIZE"]
+        )
+    except ValueError:
+        abort(400)
+    return render_template(
+        "audit/user_logs.html",
+        logs=logs,
+        user=user,
+        next_cursor=next_cursor,
+        filters=filters,
+        filter_args=_filter_args("user_id"),
+        actions=ACTIONS,
+    )
 
 @audit_bp.route("/export")
 @login_required
 def export():
+    """
+    Streams the matching audit log as CSV. Query string: q (search words),
+    the viewer's filters (action, target_type, user_id, date_from, date_to),
+    archived=1 to include entries rolled into the archive and gzip=1 for a
+    compressed file.
+    """
     if not current_user.has_role("Admin"):
         abort(403)
         
     search_query = request.args.get("q", "").strip()
+    body = AuditExportService.iter_csv(
+        _audit_filters(), search_query or None, include_archived=request.args.get("archived") == "1"
+    )
     
-    if search_query:
-        logs = AuditService.search_logs(search_query)
-    else:
-        logs = AuditService.get_all_logs()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(["ID", "User", "Action", "Target Type", "Target ID", "Details", "IP Address", "Timestamp"])
-    
-    # Write data
-    for log in logs:
-        username = log.user.username if log.user else "System/Guest"
-        writer.writerow([
-            log.id, 
-            username, 
-            log.action, 
-            log.target_type, 
-            log.target_id, 
-            log.details, 
-            log.ip_address, 
-            log.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        ])
-        
-    output.seek(0)
-    
+    if request.args.get("gzip") == "1":
+        return Response(
+            stream_with_context(AuditExportService.gzip_stream(body)),
+            mimetype="application/gzip",
+            headers={"Content-Disposition": "attachment;filename=audit_logs.csv.gz"},
+        )
     return Response(
-        output,
+        stream_with_context(body),
         mimetype="text/csv",
-        headers={"Content-Disposition": "attachment;filename=audit_logs.csv"}
+        headers={"Content-Disposition": "attachment;filename=audit_logs.csv"},
     )
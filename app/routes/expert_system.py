@@ -1,13 +1,19 @@
 # app/routes/expert_system.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+import uuid
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from utils.decorators import require_permission
+from utils.request_args import date_arg
 from app.forms.expert_system_forms import (
     CategoryForm,
     SymptomForm,
     DiseaseForm,
     RuleForm,
 )
+from app.services.case_archive_service import CaseArchiveService
+from app.services.case_export_service import CaseExportService
+from app.services.case_rollup_service import CaseRollupService, DIMENSIONS, PERIODS
 from app.services.diagnosis_service import DiagnosisService
 from app.services.expert_system_service import (
     CategoryService,
@@ -16,7 +22,11 @@ from app.services.expert_system_service import (
     RuleService,
     CaseService,
 )
+from app.services.idempotency_service import IdempotencyService
+from app.services.outbreak_service import OutbreakService
+from app.services.similar_case_service import SimilarCaseService
 from app.services.audit_service import AuditService
+from app.services.user_service import UserService
 
 expert_system_bp = Blueprint("expert_system", __name__, url_prefix="/expert-system")
 
@@ -39,14 +49,25 @@ def diagnose():
     if request.method == "POST":
         selected_ids = [int(id) for id in request.form.getlist("symptoms")]
         if selected_ids:
-            diagnosis_results = DiagnosisService.run_inference(selected_ids)
-            if diagnosis_results:
-                case = DiagnosisService.record_case(
-                    current_user.id,
-                    selected_ids,
-                    diagnosis_results[0],
-                )
-                AuditService.log("DIAGNOSE", "Case", case.id, f"User ran diagnosis, result: {case.disease.name}")
+            key = _idempotency_key("diagnose", sorted(set(selected_ids)))
+            claimed, replayed = IdempotencyService.begin(key, current_user.id) if key else (True, None)
+            if replayed is not None:
+                # Resubmitted form: show the first result without recording another case
+                diagnosis_results = DiagnosisService.replay(replayed["scores"])
+            elif not claimed:
+                flash("This diagnosis is still being processed, please wait a moment.", "warning")
+            else:
+                try:
+                    diagnosis_results, case_id = _diagnose_and_record(selected_ids)
+                except Exception:
+                    if key:
+                        IdempotencyService.release(key)
+                    raise
+                if key:
+                    IdempotencyService.complete(key, {
+                        "case_id": case_id,
+                        "scores": DiagnosisService.scores_of(diagnosis_results),
+                    })
         else:
             flash("Please select at least one symptom.", "warning")
 
@@ -55,28 +76,377 @@ def diagnose():
         symptoms=symptoms,
         results=diagnosis_results,
         selected_ids=set(selected_ids),
+        # A fresh key per rendered form; resubmitting the same form reuses it
+        idempotency_key=uuid.uuid4().hex,
     )
 
 
+def _diagnose_and_record(selected_ids):
+    """Runs the diagnose page's inference and records the top result; returns (results, case id)."""
+    diagnosis_results = DiagnosisService.run_inference(
+        selected_ids,
+        top_k=current_app.config["DIAGNOSIS_TOP_K"] or None,
+    )
+    case = None
+    if diagnosis_results:
+        case = DiagnosisService.record_case(
+            current_user.id,
+            selected_ids,
+            diagnosis_results[0],
+        )
+        # case is None when the recorder is in write-behind mode
+        AuditService.log(
+            "DIAGNOSE",
+            "Case",
+            case.id if case else None,
+            f"User ran diagnosis, result: {diagnosis_results[0]['disease'].name}",
+        )
+    return diagnosis_results, case.id if case else None
+
+
+def _idempotency_key(scope, payload):
+    """
+    Store key from the Idempotency-Key header or the form's idempotency_key
+    field, or None when the request carries neither.
+    """
+    client_key = request.headers.get("Idempotency-Key") or request.form.get("idempotency_key")
+    return IdempotencyService.scoped_key(scope, current_user.id, client_key, payload)
+
+
+def _serialize_result(result):
+    return {
+        "disease_id": result["disease"].id,
+        "disease": result["disease"].name,
+        "confidence": result["confidence"],
+        "matched_count": result["matched_count"],
+        "treatment": result["treatment"],
+        "rule_id": result["rule"].id,
+        "rule": result["rule"].title,
+    }
+
+
+@expert_system_bp.route("/diagnose/live", methods=["POST"])
+@login_required
+@require_permission("run_diagnosis")
+def diagnose_live():
+    """
+    Live ranking for the diagnose page. JSON body:
+    {"selected_ids": [ids after the toggle], "toggled_id": id}
+    Nothing is recorded; the form POST to diagnose still creates the case.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("selected_ids"), list):
+        return jsonify({"error": "Expected a JSON object with a 'selected_ids' list."}), 400
+    try:
+        selected_ids = [int(sid) for sid in payload["selected_ids"]]
+        toggled_id = int(payload["toggled_id"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Symptom ids must be integers."}), 400
+
+    results = DiagnosisService.update_live_session(
+        current_user.id,
+        selected_ids,
+        toggled_id,
+        top_k=current_app.config["DIAGNOSIS_TOP_K"] or 10,
+    )
+    return jsonify({"results": [_serialize_result(result) for result in results]})
+
+
+@expert_system_bp.route("/api/diagnose/batch", methods=["POST"])
+@login_required
+@require_permission("run_diagnosis")
+def diagnose_batch():
+    """
+    JSON body: {"items": [[symptom_id, ...], ...], "record": false, "top_k": null}
+    Every item is ranked with the same semantics as the diagnose page.
+    Retries sending the same Idempotency-Key header and body get the first
+    response back instead of running (and recording) the batch again.
+    Like every session-authenticated POST, requests carry the CSRF token in
+    an X-CSRFToken header.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("items"), list):
+        return jsonify({"error": "Expected a JSON object with an 'items' list."}), 400
+
+    items = payload["items"]
+    max_items = current_app.config["DIAGNOSIS_BATCH_MAX_ITEMS"]
+    if len(items) > max_items:
+        return jsonify({"error": f"A batch may contain at most {max_items} items."}), 400
+
+    if not all(
+        isinstance(item, list) and all(isinstance(sid, int) and not isinstance(sid, bool) for sid in item)
+        for item in items
+    ):
+        return jsonify({"error": "Each item must be a list of integer symptom ids."}), 400
+    symptom_id_sets = items
+
+    top_k = payload.get("top_k")
+    if top_k is not None and (not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1):
+        return jsonify({"error": "'top_k' must be a positive integer."}), 400
+
+    record = bool(payload.get("record"))
+    key = _idempotency_key("diagnose_batch", [symptom_id_sets, record, top_k])
+    if key:
+        claimed, replayed = IdempotencyService.begin(key, current_user.id)
+        if replayed is not None:
+            return jsonify(replayed)
+        if not claimed:
+            return jsonify({"error": "A request with this Idempotency-Key is still being processed."}), 409
+
+    try:
+        batch_results = DiagnosisService.run_batch_inference(symptom_id_sets, top_k=top_k)
+
+        case_ids = [None] * len(batch_results)
+        if record:
+            case_ids = DiagnosisService.record_cases(
+                current_user.id,
+                [
+                    (symptom_ids, results[0] if results else None)
+                    for symptom_ids, results in zip(symptom_id_sets, batch_results)
+                ],
+            )
+            # Counted from the results: in write-behind mode the cases have no ids yet
+            recorded = sum(1 for results in batch_results if results)
+            if recorded:
+                AuditService.log("DIAGNOSE", "Case", None, f"User ran batch diagnosis, recorded {recorded} cases")
+    except Exception:
+        if key:
+            IdempotencyService.release(key)
+        raise
+
+    response = {
+        "items": [
+            {
+                "symptom_ids": symptom_ids,
+                "case_id": case_id,
+                "results": [_serialize_result(result) for result in results],
+            }
+            for symptom_ids, results, case_id in zip(symptom_id_sets, batch_results, case_ids)
+        ]
+    }
+    if key:
+        IdempotencyService.complete(key, response)
+    return jsonify(response)
+
+
+@expert_system_bp.route("/api/inference-cache")
+@login_required
+def inference_cache_stats():
+    if not current_user.has_role("Admin"):
+        abort(403)
+    return jsonify(DiagnosisService.cache_stats())
+
+
+@expert_system_bp.route("/api/outbreaks")
+@login_required
+def outbreaks():
+    """
+    Diseases and categories whose recent case rate is well above baseline.
+    ?all=1 lists every tracked disease and category with its counts.
+    """
+    if not current_user.has_role("Admin"):
+        abort(403)
+    return jsonify(OutbreakService.report(include_all=request.args.get("all") == "1"))
+
+
+def _case_filters():
+    """Reads case-history filters from the query string; bad values are ignored."""
+    filters = {
+        "disease_id": request.args.get("disease_id", type=int),
+        "symptom_id": request.args.get("symptom_id", type=int),
+        "user_id": request.args.get("user_id", type=int),
+        "date_from": date_arg("date_from"),
+        "date_to": date_arg("date_to"),
+    }
+    # Admins and Doctors see every case, everyone else only their own
+    if not (current_user.has_role("Admin") or current_user.has_role("Doctor")):
+        filters["user_id"] = current_user.id
+    return filters
+
+
 @expert_system_bp.route("/cases")
 @login_required
 @require_permission("view_cases")
 def cases_index():
-    # If user is Admin or Doctor, show all cases
-    if current_user.has_role("Admin") or current_user.has_role("Doctor"):
-        cases = CaseService.get_all()
+    filters = _case_filters()
+    try:
+        cases, next_cursor = CaseService.get_page(
+            filters, request.args.get("cursor"), current_app.config["CASES_PAGE_SIZE"]
+        )
+    except ValueError:
+        abort(400)
+
+    can_view_all = current_user.has_role("Admin") or current_user.has_role("Doctor")
+    return render_template(
+        "expert_system/cases/index.html",
+        cases=cases,
+        next_cursor=next_cursor,
+        filters=filters,
+        filter_args={
+            key: request.args[key]
+            for key in ("disease_id", "symptom_id", "user_id", "date_from", "date_to")
+            if request.args.get(key)
+        },
+        diseases=DiseaseService.get_all(),
+        symptoms=SymptomService.get_all(),
+        users=UserService.get_user_all() if can_view_all else [],
+    )
+
+
+@expert_system_bp.route("/api/cases")
+@login_required
+@require_permission("view_cases")
+def cases_api():
+    """
+    Query string: cursor, limit, disease_id, symptom_id, user_id,
+    date_from, date_to (YYYY-MM-DD). Follow next_cursor until it is null.
+    """
+    limit = request.args.get("limit", current_app.config["CASES_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, current_app.config["CASES_PAGE_MAX"]))
+    try:
+        cases, next_cursor = CaseService.get_page(_case_filters(), request.args.get("cursor"), limit)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+
+    return jsonify({
+        "items": [
+            {
+                "id": case.id,
+                "created_at": case.created_at.isoformat(),
+                "user_id": case.user_id,
+                "username": case.user.username if case.user else None,
+                "disease_id": case.disease_id,
+                "disease": case.disease.name if case.disease else None,
+                "confidence": case.confidence,
+                "symptoms": [{"id": s.id, "name": s.name} for s in case.symptoms],
+            }
+            for case in cases
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
+@expert_system_bp.route("/api/cases/export")
+@login_required
+@require_permission("view_cases")
+def cases_export():
+    """
+    Streams every matching case with its symptoms. Query string: format
+    (csv|ndjson) plus the case-history filters.
+    """
+    export_format = request.args.get("format", "csv")
+    if export_format not in ("csv", "ndjson"):
+        return jsonify({"error": "'format' must be csv or ndjson."}), 400
+
+    filters = _case_filters()
+    AuditService.log("EXPORT", "Case", None, f"Exported case history as {export_format}")
+    if export_format == "csv":
+        body, mimetype = CaseExportService.iter_csv(filters), "text/csv"
     else:
-        # Otherwise, show only their own cases
-        cases = CaseService.get_by_user(current_user.id)
-        
-    return render_template("expert_system/cases/index.html", cases=cases)
+        body, mimetype = CaseExportService.iter_ndjson(filters), "application/x-ndjson"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment;filename=cases.{export_format}"},
+    )
 
 
-@expert_system_bp.route("/cases/<int:case_id>")
+def _id_list(name):
+    """Parses ?name=1,2,3 into ints; aborts with 400 on anything else."""
+    try:
+        return [int(value) for value in request.args.get(name, "").split(",") if value.strip()]
+    except ValueError:
+        abort(400)
+
+
+@expert_system_bp.route("/api/cases/analytics/containment")
 @login_required
 @require_permission("view_cases")
-def cases_detail(case_id: int):
+def cases_containment():
+    """
+    Cases having every ?include= symptom and no ?exclude= symptom (comma
+    separated ids), in total and per disease. Takes the case-history filters.
+    """
+    if not (current_user.has_role("Admin") or current_user.has_role("Doctor")):
+        abort(403)
+    include, exclude = _id_list("include"), _id_list("exclude")
+    by_disease = CaseService.disease_counts_with_symptoms(include, exclude, _case_filters())
+    return jsonify({
+        "include": include,
+        "exclude": exclude,
+        "case_count": sum(by_disease.values()),
+        "by_disease": [
+            {"disease_id": disease_id, "case_count": count}
+            for disease_id, count in sorted(by_disease.items(), key=lambda item: -item[1])
+        ],
+    })
+
+
+@expert_system_bp.route("/api/cases/analytics/combinations")
+@login_required
+@require_permission("view_cases")
+def cases_combinations():
+    """Most common exact symptom sets, optionally containing every ?include= symptom."""
+    if not (current_user.has_role("Admin") or current_user.has_role("Doctor")):
+        abort(403)
+    limit = max(1, min(request.args.get("limit", 20, type=int), 200))
+    return jsonify({
+        "combinations": CaseService.top_symptom_combinations(limit, _id_list("include"), _case_filters()),
+    })
+
+
+def _prevalence_params():
+    """Reads period, dimension and date range; defaults to the last 30 days or 12 weeks."""
+    period = request.args.get("period", "day")
+    dimension = request.args.get("dimension", "disease")
+    if period not in PERIODS or dimension not in DIMENSIONS:
+        abort(400)
+
+    date_to = date_arg("date_to") or datetime.utcnow().date()
+    span = timedelta(days=29) if period == "day" else timedelta(weeks=11)
+    date_from = date_arg("date_from") or date_to - span
+    # Keep a report to at most a year of days or three years of weeks
+    date_from = max(date_from, date_to - (timedelta(days=365) if period == "day" else timedelta(weeks=156)))
+    return period, dimension, date_from, date_to
+
+
+@expert_system_bp.route("/reports/prevalence")
+@login_required
+@require_permission("view_cases")
+def reports_prevalence():
+    if not (current_user.has_role("Admin") or current_user.has_role("Doctor")):
+        abort(403)
+    period, dimension, date_from, date_to = _prevalence_params()
+    report = CaseRollupService.report(period, dimension, date_from, date_to)
+    return render_template(
+        "expert_system/reports/prevalence.html",
+        report=report,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+
+@expert_system_bp.route("/api/reports/prevalence")
+@login_required
+@require_permission("view_cases")
+def reports_prevalence_api():
+    """
+    Query string: period (day|week), dimension (disease|category|user),
+    date_from, date_to (YYYY-MM-DD). Served from the rollup table only.
+    """
+    if not (current_user.has_role("Admin") or current_user.has_role("Doctor")):
+        abort(403)
+    period, dimension, date_from, date_to = _prevalence_params()
+    return jsonify(CaseRollupService.report(period, dimension, date_from, date_to))
+
+
+def _get_visible_case(case_id: int):
+    """Returns (case, archived) for a live or archived case the user may view."""
     case = CaseService.get_by_id(case_id)
+    archived = False
+    if case is None:
+        case = CaseArchiveService.get(case_id)
+        archived = True
     if case is None:
         abort(404)
         
@@ -84,8 +454,47 @@ def cases_detail(case_id: int):
     if not (current_user.has_role("Admin") or current_user.has_role("Doctor")):
         if case.user_id != current_user.id:
             abort(403)
-            
-    return render_template("expert_system/cases/detail.html", case=case)
+    return case, archived
+
+
+@expert_system_bp.route("/cases/<int:case_id>")
+@login_required
+@require_permission("view_cases")
+def cases_detail(case_id: int):
+    case, archived = _get_visible_case(case_id)
+    # Similar cases come from every user, so only Admins and Doctors see them
+    similar_cases = []
+    if current_user.has_role("Admin") or current_user.has_role("Doctor"):
+        similar_cases = SimilarCaseService.similar_to_symptoms(
+            [symptom.id for symptom in case.symptoms],
+            limit=current_app.config["SIMILAR_CASES_TOP_N"],
+            exclude_case_id=case.id,
+        )
+    return render_template(
+        "expert_system/cases/detail.html",
+        case=case,
+        archived=archived,
+        similar_cases=similar_cases,
+    )
+
+
+@expert_system_bp.route("/api/cases/<int:case_id>/similar")
+@login_required
+@require_permission("view_cases")
+def cases_similar(case_id: int):
+    """Top ?n= (default SIMILAR_CASES_TOP_N) recorded cases by symptom-set Jaccard similarity."""
+    if not (current_user.has_role("Admin") or current_user.has_role("Doctor")):
+        abort(403)
+    case, _ = _get_visible_case(case_id)
+    limit = request.args.get("n", current_app.config["SIMILAR_CASES_TOP_N"], type=int)
+    return jsonify({
+        "case_id": case.id,
+        "similar": SimilarCaseService.similar_to_symptoms(
+            [symptom.id for symptom in case.symptoms],
+            limit=max(1, min(limit, 100)),
+            exclude_case_id=case.id,
+        ),
+    })
 
 
 @expert_system_bp.route("/categories")
@@ -0,0 +1,30 @@
+# app/services/archive_segments.py
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import List, Tuple
+
+
+def segment_name(prefix: str, created_at: datetime) -> str:
+    """Monthly segment file holding rows created in created_at's month."""
+    return f"{prefix}-{created_at:%Y-%m}.ndjson.gz"
+
+
+def append_member(path: str, rows: List[dict]) -> Tuple[int, int]:
+    """Appends rows as one fsynced gzip member and returns its (offset, length)."""
+    data = gzip.compress("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+    with open(path, "ab") as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return offset, len(data)
+
+
+def read_block(archive_dir: str, block) -> List[dict]:
+    """Reads back the rows of an archive block row (segment, offset, length)."""
+    with open(os.path.join(archive_dir, block.segment), "rb") as f:
+        f.seek(block.offset)
+        data = f.read(block.length)
+    return [json.loads(line) for line in gzip.decompress(data).decode("utf-8").splitlines()]
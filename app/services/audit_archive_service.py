@@ -0,0 +1,130 @@
+# app/services/audit_archive_service.py
+import os
+import re
+from datetime import datetime, timedelta
+from itertools import groupby, islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+from flask import current_app
+from extensions import db
+from app.models.audit_log import AuditArchiveBlock
+from app.services.archive_segments import append_member, read_block, segment_name
+from app.services.audit_search_service import search_terms
+
+_WORD = re.compile(r"\w+")
+
+
+def _matches(row: dict, terms: List[str]) -> bool:
+    """Same rule as the search index: every term starts a word of some field."""
+    words = _WORD.findall(" ".join(
+        row[field] or "" for field in ("username", "action", "target_type", "target_id", "details")
+    ).lower())
+    return all(any(word.startswith(term) for word in words) for term in terms)
+
+
+class AuditArchiveService:
+    """
+    Compressed storage for audit entries rolled out of tbl_audit_logs.
+
+    Entries are written as NDJSON, with the username as it was when they
+    were archived, into one append-only segment file per month of
+    created_at. Each block of up to AUDIT_ARCHIVE_BLOCK_SIZE entries is a
+    separately compressed gzip member recorded in tbl_audit_archive_blocks
+    with its id and date range, so an export of a date range only
+    decompresses the blocks that overlap it. Members are fsynced before
+    their block rows are added; the caller commits those together with the
+    removal of the entries, so a crash leaves at most unreferenced members.
+    """
+
+    @staticmethod
+    def write(rows: Iterable[tuple], block_size: int = 5_000) -> Tuple[int, Optional[int]]:
+        """
+        Archives rows of (id, user_id, username, action, target_type,
+        target_id, details, ip_address, created_at), ordered by created_at.
+        Adds the block rows to the session without committing; returns how
+        many entries were written and the highest id among them.
+        """
+        archive_dir = current_app.config["AUDIT_ARCHIVE_DIR"]
+        os.makedirs(archive_dir, exist_ok=True)
+        written, last_id = 0, None
+        entries = (
+            {
+                "id": log_id,
+                "user_id": user_id,
+                "username": username,
+                "action": action,
+                "target_type": target_type,
+                "target_id": target_id,
+                "details": details,
+                "ip_address": ip_address,
+                "created_at": created_at.isoformat(),
+            }
+            for log_id, user_id, username, action, target_type, target_id, details, ip_address, created_at in rows
+        )
+        for segment, segment_entries in groupby(
+            entries, key=lambda entry: segment_name("audit", datetime.fromisoformat(entry["created_at"]))
+        ):
+            while True:
+                block = list(islice(segment_entries, block_size))
+                if not block:
+                    break
+                offset, length = append_member(os.path.join(archive_dir, segment), block)
+                ids = [entry["id"] for entry in block]
+                db.session.add(AuditArchiveBlock(
+                    segment=segment,
+                    offset=offset,
+                    length=length,
+                    entry_count=len(block),
+                    first_entry_id=min(ids),
+                    last_entry_id=max(ids),
+                    first_created_at=datetime.fromisoformat(block[0]["created_at"]),
+                    last_created_at=datetime.fromisoformat(block[-1]["created_at"]),
+                ))
+                written += len(block)
+                last_id = max(ids) if last_id is None else max(last_id, max(ids))
+        return written, last_id
+
+    @staticmethod
+    def iter_rows(filters: Optional[dict] = None, search_query: Optional[str] = None) -> Iterator[tuple]:
+        """
+        Yields archived entries, newest first, as AuditExportService rows (id,
+        username, action, target_type, target_id, details, ip_address, created_at).
+        filters are those of AuditService.apply_filters and search_query
+        matches like the search index; blocks outside the date range are not read.
+        """
+        filters = filters or {}
+        terms = [term.lower() for term in search_terms(search_query)] if search_query else []
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        query = db.select(AuditArchiveBlock).order_by(
+            AuditArchiveBlock.first_created_at.desc(), AuditArchiveBlock.id.desc()
+        )
+        if date_from is not None:
+            query = query.where(
+                AuditArchiveBlock.last_created_at >= datetime.combine(date_from, datetime.min.time())
+            )
+        if date_to is not None:
+            query = query.where(
+                AuditArchiveBlock.first_created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+            )
+        for block in db.session.scalars(query).all():
+            # Blocks hold their entries oldest first
+            for row in reversed(read_block(current_app.config["AUDIT_ARCHIVE_DIR"], block)):
+                created_at = datetime.fromisoformat(row["created_at"])
+                if (
+                    (date_from is not None and created_at.date() < date_from)
+                    or (date_to is not None and created_at.date() > date_to)
+                    or (filters.get("action") and row["action"] != filters["action"])
+                    or (filters.get("target_type") and row["target_type"] != filters["target_type"])
+                    or (filters.get("user_id") is not None and row["user_id"] != filters["user_id"])
+                    or (search_query and not (terms and _matches(row, terms)))
+                ):
+                    continue
+                yield (
+                    row["id"],
+                    row["username"],
+                    row["action"],
+                    row["target_type"],
+                    row["target_id"],
+                    row["details"],
+                    row["ip_address"],
+                    created_at,
+                )
@@ -0,0 +1,290 @@
+# app/services/audit_retention_service.py
+import re
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from flask import current_app
+from extensions import db
+from app.models.audit_log import AuditLog
+from app.models.user import UserTable
+from app.services.audit_archive_service import AuditArchiveService
+from app.services.audit_search_service import FTS_TABLE, PG_DDL, SQLITE_DDL, AuditSearchService
+
+TABLE = "tbl_audit_logs"
+DEFAULT_PARTITION = "tbl_audit_logs_default"
+_PARTITION = re.compile(r"^tbl_audit_logs_p(\d{4})_(\d{2})$")
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _at(month: date) -> datetime:
+    return datetime.combine(month, datetime.min.time())
+
+
+def _partition_name(month: date) -> str:
+    return f"tbl_audit_logs_p{month:%Y_%m}"
+
+
+class AuditRetentionService:
+    """
+    Keeps tbl_audit_logs to the last AUDIT_RETENTION_MONTHS months; older
+    entries are rolled into AuditArchiveService files, from where the
+    export can still read them.
+
+    How a month is removed depends on the database:
+      postgresql, partitioned ('flask audit partition'): one partition per
+        month of created_at, plus a default partition for entries no month
+        partition covers yet. A rolled month's partition is dropped whole.
+      sqlite: rotating tables. When more entries are rolled than kept, the
+        kept ones are copied into a fresh table that replaces the old one
+        (indexes and search table rebuilt); otherwise the rolled ones are
+        deleted.
+      anything else, or Postgres before partitioning: DELETE.
+    Run one roll at a time.
+    """
+
+    @staticmethod
+    def cutoff(retention_months: Optional[int] = None) -> date:
+        """First day of the oldest month kept; entries before it are rolled."""
+        if retention_months is None:
+            retention_months = current_app.config["AUDIT_RETENTION_MONTHS"]
+        return _add_months(_month_start(datetime.utcnow()), -retention_months)
+
+    @staticmethod
+    def is_partitioned() -> bool:
+        if db.engine.dialect.name != "postgresql":
+            return False
+        return bool(db.session.scalar(db.text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table"
+        ), {"table": TABLE}))
+
+    @staticmethod
+    def partitions() -> List[date]:
+        """Months that have a partition, oldest first."""
+        names = db.session.scalars(db.text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table"
+        ), {"table": TABLE}).all()
+        months = []
+        for name in names:
+            match = _PARTITION.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    @staticmethod
+    def partition() -> int:
+        """
+        Converts an unpartitioned Postgres tbl_audit_logs into a partitioned
+        one, copying every entry; returns how many were copied. Takes an
+        exclusive lock on the table for the whole copy, so run it during
+        maintenance.
+        """
+        old = f"{TABLE}_unpartitioned"
+        first = db.session.scalar(db.select(db.func.min(AuditLog.created_at)))
+        months_ahead = current_app.config.get("AUDIT_PARTITION_MONTHS_AHEAD", 2)
+        current = _month_start(datetime.utcnow())
+        index_names = [index.name for index in AuditLog.__table__.indexes] + ["ix_tbl_audit_logs_search"]
+
+        db.session.execute(db.text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+        db.session.execute(db.text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+        db.session.execute(db.text(f"DROP TRIGGER IF EXISTS trg_tbl_audit_logs_search ON {old}"))
+        for name in index_names:
+            db.session.execute(db.text(f"DROP INDEX IF EXISTS {name}"))
+        db.session.execute(db.text(
+            f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        ))
+        # A partitioned table's primary key must include the partition key
+        db.session.execute(db.text(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT tbl_audit_logs_partitioned_pkey PRIMARY KEY (id, created_at)"
+        ))
+        db.session.execute(db.text(
+            f"ALTER TABLE {TABLE} ADD FOREIGN KEY (user_id) REFERENCES tbl_users (id)"
+        ))
+        db.session.execute(db.text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+        month = _month_start(first) if first is not None else current
+        while month <= _add_months(current, months_ahead):
+            db.session.execute(db.text(
+                f"CREATE TABLE {_partition_name(month)} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            ))
+            month = _add_months(month, 1)
+
+        copied = db.session.execute(db.text(f"INSERT INTO {TABLE} SELECT * FROM {old}")).rowcount
+        for index in AuditLog.__table__.indexes:
+            index.create(db.session.connection())
+        # Search column, index and trigger, now on the partitioned table
+        for statement in PG_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text(f"DROP TABLE {old}"))
+        db.session.commit()
+        return copied
+
+    @staticmethod
+    def ensure_partitions(months_ahead: Optional[int] = None) -> List[date]:
+        """
+        Creates the partitions of this month and the next months_ahead
+        (AUDIT_PARTITION_MONTHS_AHEAD) that are missing; returns their months.
+        Entries already in the default partition for those months move into
+        them, with inserts into the default partition held off meanwhile.
+        """
+        if months_ahead is None:
+            months_ahead = current_app.config.get("AUDIT_PARTITION_MONTHS_AHEAD", 2)
+        existing = set(AuditRetentionService.partitions())
+        current = _month_start(datetime.utcnow())
+        created = []
+        for month in (_add_months(current, offset) for offset in range(months_ahead + 1)):
+            if month in existing:
+                continue
+            name = _partition_name(month)
+            bounds = {"start": _at(month), "end": _at(_add_months(month, 1))}
+            db.session.execute(db.text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)"))
+            # Holds off inserts routed to the default partition until the
+            # attach commits; one landing in this month in between would make
+            # ATTACH fail. Reads are not blocked.
+            db.session.execute(db.text(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE"))
+            db.session.execute(db.text(
+                f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} "
+                "WHERE created_at >= :start AND created_at < :end"
+            ), bounds)
+            db.session.execute(db.text(
+                f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end"
+            ), bounds)
+            db.session.execute(db.text(
+                f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            ))
+            db.session.commit()
+            created.append(month)
+        return created
+
+    @staticmethod
+    def pending(cutoff: date) -> List[Tuple[date, int]]:
+        """(month, entries) for each month before cutoff still in tbl_audit_logs."""
+        first = db.session.scalar(
+            db.select(db.func.min(AuditLog.created_at)).where(AuditLog.created_at < _at(cutoff))
+        )
+        months = []
+        month = _month_start(first) if first is not None else cutoff
+        while month < cutoff:
+            count = db.session.scalar(db.select(db.func.count(AuditLog.id)).where(
+                AuditLog.created_at >= _at(month), AuditLog.created_at < _at(_add_months(month, 1))
+            ))
+            if count:
+                months.append((month, count))
+            month = _add_months(month, 1)
+        return months
+
+    @staticmethod
+    def roll(cutoff: date, block_size: Optional[int] = None) -> int:
+        """Archives and removes entries created before cutoff; returns how many were rolled."""
+        block_size = block_size or current_app.config.get("AUDIT_ARCHIVE_BLOCK_SIZE", 5_000)
+        rolled = 0
+        if AuditRetentionService.is_partitioned():
+            AuditRetentionService.ensure_partitions()
+            for month in AuditRetentionService.partitions():
+                if _add_months(month, 1) > cutoff:
+                    break
+                name = _partition_name(month)
+                # Blocks late writes to the month until it is dropped
+                db.session.execute(db.text(f"LOCK TABLE {name} IN EXCLUSIVE MODE"))
+                count, _ = AuditArchiveService.write(
+                    AuditRetentionService._rows(month, _add_months(month, 1)), block_size
+                )
+                db.session.execute(db.text(f"DROP TABLE {name}"))
+                db.session.commit()
+                rolled += count
+
+        # Whatever is left: the default partition, or the whole unpartitioned table
+        last_id = db.session.scalar(db.select(db.func.max(AuditLog.id)).where(AuditLog.created_at < _at(cutoff)))
+        if last_id is not None and db.engine.dialect.name == "sqlite" and last_id == db.session.scalar(
+            db.select(db.func.max(AuditLog.id))
+        ):
+            # SQLite hands out max(id) + 1, so the newest entry stays until a
+            # later one exists; otherwise new ids would repeat archived ones
+            last_id = db.session.scalar(
+                db.select(db.func.max(AuditLog.id)).where(AuditLog.created_at < _at(cutoff), AuditLog.id < last_id)
+            )
+        if last_id is None:
+            return rolled
+        count, _ = AuditArchiveService.write(AuditRetentionService._rows(None, cutoff, last_id), block_size)
+        kept = db.session.scalar(db.select(db.func.count(AuditLog.id))) - count
+        if db.engine.dialect.name == "sqlite" and kept < count:
+            AuditRetentionService._rotate(cutoff, last_id)
+        else:
+            db.session.execute(
+                db.delete(AuditLog).where(AuditLog.created_at < _at(cutoff), AuditLog.id <= last_id)
+            )
+        db.session.commit()
+        return rolled + count
+
+    @staticmethod
+    def _rows(start: Optional[date], end: date, last_id: Optional[int] = None):
+        query = (
+            db.select(
+                AuditLog.id,
+                AuditLog.user_id,
+                UserTable.username,
+                AuditLog.action,
+                AuditLog.target_type,
+                AuditLog.target_id,
+                AuditLog.details,
+                AuditLog.ip_address,
+                AuditLog.created_at,
+            )
+            .outerjoin(UserTable, AuditLog.user_id == UserTable.id)
+            .where(AuditLog.created_at < _at(end))
+            .order_by(AuditLog.created_at, AuditLog.id)
+        )
+        if start is not None:
+            query = query.where(AuditLog.created_at >= _at(start))
+        if last_id is not None:
+            query = query.where(AuditLog.id <= last_id)
+        return db.session.execute(query.execution_options(yield_per=1_000))
+
+    @staticmethod
+    def _rotate(cutoff: date, last_id: int) -> None:
+        """
+        SQLite: replaces tbl_audit_logs with a copy holding only the entries
+        kept (created on or after cutoff, or after last_id). Does not commit.
+        """
+        rotating = f"{TABLE}_rotating"
+        kept = "created_at >= :cutoff OR id > :last_id"
+        params = {"cutoff": _at(cutoff), "last_id": last_id}
+        db.session.flush()
+        schema = db.session.scalar(db.text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"
+        ), {"table": TABLE})
+        columns = ", ".join(
+            row[1] for row in db.session.execute(db.text(f"PRAGMA table_info({TABLE})"))
+        )
+        db.session.execute(db.text(f"DROP TABLE IF EXISTS {rotating}"))
+        db.session.execute(db.text(schema.replace(TABLE, rotating, 1)))
+        db.session.execute(db.text(
+            f"INSERT INTO {rotating} ({columns}) SELECT {columns} FROM {TABLE} WHERE {kept}"
+        ), params)
+        # Dropping the table also drops its indexes and search triggers
+        db.session.execute(db.text(f"DROP TABLE {TABLE}"))
+        db.session.execute(db.text(f"ALTER TABLE {rotating} RENAME TO {TABLE}"))
+        for index in AuditLog.__table__.indexes:
+            index.create(db.session.connection())
+
+        if AuditSearchService.backend() != "fts5":
+            return
+        # Rebuilding the search table for the kept entries beats deleting the rest from it
+        db.session.execute(db.text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+        for statement in SQLITE_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text(
+            f"INSERT INTO {FTS_TABLE}(rowid, username, action, target_type, target_id, details) "
+            "SELECT a.id, u.username, a.action, a.target_type, a.target_id, a.details "
+            f"FROM {TABLE} a LEFT JOIN tbl_users u ON u.id = a.user_id"
+        ))
@@ -0,0 +1,263 @@
+# app/services/audit_search_service.py
+import logging
+from typing import List, Optional, Tuple
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from extensions import db
+from app.models.audit_log import AuditLog
+from app.models.user import UserTable
+from app.services.audit_service import AuditService
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "tbl_audit_logs_fts"
+
+# At most this many words of a query are used
+MAX_TERMS = 8
+
+# Postgres: a weighted tsvector per row (username A, action/target B,
+# details C) kept in search_vector by a trigger, with a GIN index
+PG_DDL = [
+    "ALTER TABLE tbl_audit_logs ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_tbl_audit_logs_search ON tbl_audit_logs USING GIN (search_vector)",
+    """
+    CREATE OR REPLACE FUNCTION tbl_audit_logs_search_vector(
+        p_user_id integer, p_action text, p_target_type text, p_target_id text, p_details text
+    ) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('simple', coalesce((SELECT username FROM tbl_users WHERE id = p_user_id), '')), 'A')
+            || setweight(to_tsvector('simple', p_action || ' ' || p_target_type || ' ' || coalesce(p_target_id, '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(p_details, '')), 'C')
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION tbl_audit_logs_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := tbl_audit_logs_search_vector(
+            NEW.user_id, NEW.action, NEW.target_type, NEW.target_id, NEW.details
+        );
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER trg_tbl_audit_logs_search
+    BEFORE INSERT OR UPDATE OF user_id, action, target_type, target_id, details ON tbl_audit_logs
+    FOR EACH ROW EXECUTE FUNCTION tbl_audit_logs_search_update()
+    """,
+]
+
+# SQLite: an FTS5 table keyed by audit log id, maintained by triggers
+SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(username, action, target_type, target_id, details)
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_tbl_audit_logs_fts_insert AFTER INSERT ON tbl_audit_logs BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, username, action, target_type, target_id, details)
+        VALUES (new.id, (SELECT username FROM tbl_users WHERE id = new.user_id),
+                new.action, new.target_type, new.target_id, new.details);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_tbl_audit_logs_fts_update AFTER UPDATE ON tbl_audit_logs BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, username, action, target_type, target_id, details)
+        VALUES (new.id, (SELECT username FROM tbl_users WHERE id = new.user_id),
+                new.action, new.target_type, new.target_id, new.details);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_tbl_audit_logs_fts_delete AFTER DELETE ON tbl_audit_logs BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def search_terms(query: str) -> List[str]:
+    """Words of a search query, without the quote characters both query syntaxes use."""
+    words = (word.replace('"', "").replace("'", "").replace("\\", "") for word in query.split())
+    return [word for word in words if word][:MAX_TERMS]
+
+
+class AuditSearchService:
+    """
+    Ranked search of the audit log by username, action, target and details.
+
+    Every word must match, as a prefix of a word in any of those fields.
+    Backends, set up by install() (when the app creates a new database, or
+    by 'flask db upgrade') and picked up when the app starts (detect):
+      postgresql  full-text search on a trigger-maintained tsvector, ranked
+                  by ts_rank;
+      fts5        an SQLite FTS5 table filled by triggers, ranked by bm25;
+      like        case-insensitive substring matching, newest first, when
+                  neither is available.
+    The username is indexed as it was when the entry was written.
+    """
+
+    @staticmethod
+    def install() -> str:
+        """Creates the search index and triggers if missing; returns the backend in use."""
+        dialect = db.engine.dialect.name
+        backend, created = "like", False
+        try:
+            if dialect == "postgresql":
+                created = not db.session.scalar(db.text(
+                    "SELECT 1 FROM pg_trigger WHERE tgname = 'trg_tbl_audit_logs_search'"
+                ))
+                statements, backend = PG_DDL if created else [], "postgresql"
+            elif dialect == "sqlite":
+                created = not db.session.scalar(db.text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_tbl_audit_logs_fts_insert'"
+                ))
+                statements, backend = SQLITE_DDL if created else [], "fts5"
+            else:
+                statements = []
+            for statement in statements:
+                db.session.execute(db.text(statement))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Audit search index unavailable; falling back to substring search")
+            backend, created = "like", False
+        current_app.extensions["audit_search_backend"] = backend
+
+        if created and backend == "fts5":
+            # Also clears entries left over from a dropped tbl_audit_logs
+            AuditSearchService.rebuild()
+        elif created and db.session.scalar(db.select(AuditLog.id).limit(1)) is not None:
+            logger.warning("Audit search index created; run 'flask audit rebuild-search' to index existing entries")
+        return backend
+
+    @staticmethod
+    def detect() -> str:
+        """Picks the backend whose triggers install() left in place, without changing the schema."""
+        dialect = db.engine.dialect.name
+        trigger = {
+            "postgresql": ("SELECT 1 FROM pg_trigger WHERE tgname = 'trg_tbl_audit_logs_search'", "postgresql"),
+            "sqlite": (
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_tbl_audit_logs_fts_insert'",
+                "fts5",
+            ),
+        }.get(dialect)
+        backend = "like"
+        if trigger is not None and db.session.scalar(db.text(trigger[0])):
+            backend = trigger[1]
+        db.session.commit()
+        if trigger is not None and backend == "like":
+            logger.warning(
+                "Audit search index not installed; searching by substring scan until 'flask db upgrade' is run"
+            )
+        current_app.extensions["audit_search_backend"] = backend
+        return backend
+
+    @staticmethod
+    def backend() -> str:
+        return current_app.extensions.get("audit_search_backend", "like")
+
+    @staticmethod
+    def rebuild(batch_size: int = 10_000) -> int:
+        """Re-indexes every audit entry, batch by batch; returns how many were indexed."""
+        backend = AuditSearchService.backend()
+        if backend == "postgresql":
+            statement = db.text(
+                "UPDATE tbl_audit_logs SET search_vector = tbl_audit_logs_search_vector("
+                "user_id, action, target_type, target_id, details) WHERE id > :low AND id <= :high"
+            )
+        elif backend == "fts5":
+            db.session.execute(db.text(f"DELETE FROM {FTS_TABLE}"))
+            statement = db.text(
+                f"INSERT INTO {FTS_TABLE}(rowid, username, action, target_type, target_id, details) "
+                "SELECT a.id, u.username, a.action, a.target_type, a.target_id, a.details "
+                "FROM tbl_audit_logs a LEFT JOIN tbl_users u ON u.id = a.user_id "
+                "WHERE a.id > :low AND a.id <= :high"
+            )
+        else:
+            return 0
+        last_id = db.session.scalar(db.select(db.func.max(AuditLog.id))) or 0
+        indexed = 0
+        for low in range(0, last_id, batch_size):
+            indexed += db.session.execute(statement, {"low": low, "high": low + batch_size}).rowcount
+            db.session.commit()
+        db.session.commit()
+        return indexed
+
+    @staticmethod
+    def apply_match(query, search_query: str, ranked: bool = False):
+        """
+        Restricts a select over AuditLog to entries matching search_query.
+        With ranked, also returns the ORDER BY clauses putting the best
+        matches first (newest first among equals); otherwise that is None.
+        """
+        terms = search_terms(search_query)
+        newest = [AuditLog.created_at.desc(), AuditLog.id.desc()]
+        if not terms:
+            return query.where(db.false()), newest if ranked else None
+        backend = AuditSearchService.backend()
+
+        if backend == "postgresql":
+            tsquery = db.func.to_tsquery(
+                "simple", " & ".join("'" + term + "':*" for term in terms)
+            )
+            vector = db.literal_column("tbl_audit_logs.search_vector")
+            query = query.where(vector.op("@@")(tsquery))
+            return query, [db.func.ts_rank(vector, tsquery).desc(), *newest] if ranked else None
+
+        if backend == "fts5":
+            matches = (
+                db.select(
+                    db.literal_column("rowid").label("id"),
+                    # Weights per column: username, action, target_type, target_id, details
+                    db.literal_column(f"bm25({FTS_TABLE}, 10.0, 5.0, 5.0, 2.0, 1.0)").label("rank"),
+                )
+                .select_from(db.text(FTS_TABLE))
+                .where(db.text(f"{FTS_TABLE} MATCH :fts_query").bindparams(
+                    fts_query=" AND ".join('"' + term + '"*' for term in terms)
+                ))
+                .subquery()
+            )
+            query = query.join(matches, matches.c.id == AuditLog.id)
+            return query, [matches.c.rank.asc(), *newest] if ranked else None
+
+        for term in terms:
+            # Wildcards in the term match themselves
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            query = query.where(db.or_(
+                AuditLog.user_id.in_(
+                    db.select(UserTable.id).where(UserTable.username.ilike(pattern, escape="\\"))
+                ),
+                AuditLog.action.ilike(pattern, escape="\\"),
+                AuditLog.target_type.ilike(pattern, escape="\\"),
+                AuditLog.target_id.ilike(pattern, escape="\\"),
+                AuditLog.details.ilike(pattern, escape="\\"),
+            ))
+        return query, newest if ranked else None
+
+    @staticmethod
+    def search(
+        search_query: str,
+        filters: Optional[dict] = None,
+        page: int = 1,
+        per_page: int = 100,
+    ) -> Tuple[List[AuditLog], bool]:
+        """
+        One page of matching entries, best first, and whether there is a next
+        page. filters are those of AuditService.apply_filters; users are
+        eager-loaded.
+        """
+        query, order_by = AuditSearchService.apply_match(
+            AuditService.apply_filters(db.select(AuditLog.id), filters or {}), search_query, ranked=True
+        )
+        ids = db.session.scalars(
+            query.order_by(*order_by).offset((page - 1) * per_page).limit(per_page + 1)
+        ).all()
+        has_next = len(ids) > per_page
+        ids = ids[:per_page]
+        logs = {
+            log.id: log
+            for log in db.session.scalars(
+                db.select(AuditLog).options(joinedload(AuditLog.user)).where(AuditLog.id.in_(ids))
+            )
+        }
+        return [logs[log_id] for log_id in ids if log_id in logs], has_next
@@ -1,15 +1,28 @@
-from flask import request
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+from flask import current_app, request
 from flask_login import current_user
+from sqlalchemy.orm import joinedload
 from app.models.audit_log import AuditLog
-from app.models.user import UserTable
+from app.services import keyset
+from app.services.audit_writer import AuditWriter, insert_audit_rows
+from app.services.unit_of_work import UnitOfWork
 from extensions import db
 import json
 
+# Actions logged by the application, offered by the audit log filter
+ACTIONS = ("CREATE", "UPDATE", "DELETE", "LOGIN", "LOGOUT", "REGISTER", "DIAGNOSE", "EXPORT")
+
 class AuditService:
+    _lock = threading.Lock()
+
     @staticmethod
     def log(action, target_type, target_id=None, details=None):
         """
-        Logs an action to the audit log.
+        Logs an action to the audit log. The user, IP address and time are
+        taken now; in buffered mode (AUDIT_LOG_MODE) the entry is queued once
+        the request's writes commit and inserted by a background thread.
         """
         user_id = current_user.id if current_user and current_user.is_authenticated else None
         ip_address = request.remote_addr if request else None
@@ -17,33 +30,67 @@ class AuditService:
         if isinstance(details, (dict, list)):
             details = json.dumps(details)
 
-        log_entry = AuditLog(
-            user_id=user_id,
-            action=action,
-            target_type=target_type,
-            target_id=str(target_id) if target_id else None,
-            details=details,
-            ip_address=ip_address
-        )
-        db.session.add(log_entry)
-        db.session.commit()
+        entry = {
+            "user_id": user_id,
+            "action": action,
+            "target_type": target_type,
+            "target_id": str(target_id) if target_id else None,
+            "details": details,
+            "ip_address": ip_address,
+            "created_at": datetime.utcnow(),
+        }
+        if current_app.config.get("AUDIT_LOG_MODE") == "buffered":
+            UnitOfWork.after_commit(lambda: AuditService._submit(entry))
+            return
+
+        db.session.add(AuditLog(**entry))
+        UnitOfWork.commit()
 
     @staticmethod
-    def get_all_logs():
-        return AuditLog.query.order_by(AuditLog.created_at.desc()).all()
+    def _submit(entry):
+        if not AuditService._get_writer().submit(entry):
+            # Queue full: write this one synchronously rather than drop it
+            insert_audit_rows([entry])
+            UnitOfWork.commit()
 
     @staticmethod
-    def get_logs_by_user(user_id):
-        return AuditLog.query.filter_by(user_id=user_id).order_by(AuditLog.created_at.desc()).all()
+    def _get_writer():
+        writer = current_app.extensions.get("audit_writer")
+        if writer is None:
+            with AuditService._lock:
+                writer = current_app.extensions.get("audit_writer")
+                if writer is None:
+                    writer = AuditWriter(current_app._get_current_object())
+                    current_app.extensions["audit_writer"] = writer
+        return writer
 
     @staticmethod
-    def search_logs(username_query):
+    def apply_filters(query, filters: dict):
         """
-        Search logs by username.
+        Restricts a select over AuditLog by action, target_type, user_id,
+        date_from and date_to (dates, both inclusive). Missing keys are ignored.
         """
-        if not username_query:
-            return AuditService.get_all_logs()
-            
-        return AuditLog.query.join(UserTable).filter(
-            UserTable.username.ilike(f"%{username_query}%")
-        ).order_by(AuditLog.created_at.desc()).all()
+        if filters.get("action"):
+            query = query.where(AuditLog.action == filters["action"])
+        if filters.get("target_type"):
+            query = query.where(AuditLog.target_type == filters["target_type"])
+        if filters.get("user_id") is not None:
+            query = query.where(AuditLog.user_id == filters["user_id"])
+        return keyset.filter_dates(query, AuditLog.created_at, filters)
+
+    @staticmethod
+    def get_page(
+        filters: Optional[dict] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> Tuple[List[AuditLog], Optional[str]]:
+        """
+        Returns up to limit log entries, newest first, and the cursor of the
+        next page (None on the last page), as keyset.page. filters are those
+        of apply_filters; users are eager-loaded.
+        """
+        query = AuditService.apply_filters(
+            db.select(AuditLog).options(joinedload(AuditLog.user)),
+            filters or {},
+        )
+        return keyset.page(query, AuditLog, cursor, limit)
@@ -0,0 +1,40 @@
+# app/services/audit_writer.py
+from typing import List
+from extensions import db
+from app.models.audit_log import AuditLog
+from app.services.write_behind import WriteBehindWriter
+
+# Rows per INSERT ... VALUES statement
+INSERT_CHUNK = 500
+
+
+def insert_audit_rows(rows: List[dict]) -> None:
+    """
+    Inserts audit entries with multi-row INSERT statements. Each row has
+    user_id, action, target_type, target_id, details, ip_address and
+    created_at. Does not commit.
+    """
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(db.insert(AuditLog).values(rows[start:start + INSERT_CHUNK]))
+
+
+class AuditWriter(WriteBehindWriter):
+    """
+    Buffered audit log writer (AUDIT_LOG_MODE = "buffered").
+
+    Entries are built by the caller, so the user, IP address and timestamp
+    are those of the request that logged them, and are inserted in batches
+    every AUDIT_LOG_FLUSH_INTERVAL seconds or AUDIT_LOG_BATCH_SIZE entries,
+    spooling to AUDIT_LOG_SPOOL_PATH when a flush fails.
+    """
+
+    def __init__(self, app):
+        super().__init__(
+            app,
+            insert_audit_rows,
+            label="audit entries",
+            batch_size=app.config.get("AUDIT_LOG_BATCH_SIZE", 500),
+            flush_interval=app.config.get("AUDIT_LOG_FLUSH_INTERVAL", 1.0),
+            queue_size=app.config.get("AUDIT_LOG_QUEUE_SIZE", 10_000),
+            spool_path=app.config.get("AUDIT_LOG_SPOOL_PATH"),
+        )
@@ -0,0 +1,183 @@
+# app/services/case_archive_service.py
+import os
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Iterator, List, NamedTuple, Optional
+from flask import current_app
+from extensions import db
+from app.models.expert_system import Case, CaseArchiveBlock
+from app.models.associations import tbl_cases_symptoms
+from app.services.archive_segments import append_member, read_block, segment_name
+from app.services.case_export_service import CaseExportService
+from app.services.knowledge_base_service import CategoryRecord, DiseaseRecord, KnowledgeBaseService
+from app.services.similar_case_service import SimilarCaseService
+
+
+class ArchivedSymptom(NamedTuple):
+    id: int
+    name: str
+
+
+class ArchivedCase(NamedTuple):
+    """Read-only stand-in for a Case that now lives in the archive."""
+    id: int
+    user_id: Optional[int]
+    username: Optional[str]
+    created_at: datetime
+    confidence: Optional[float]
+    disease: Optional[DiseaseRecord]
+    symptoms: List[ArchivedSymptom]
+
+
+class CaseArchiveService:
+    """
+    Moves old cases out of tbl_cases / tbl_cases_symptoms.
+
+    Archived cases are written as NDJSON (the export row format, so names
+    survive later edits) into one append-only segment file per month of
+    created_at. Each batch is a separately compressed gzip member, recorded in
+    tbl_case_archive_blocks with its id and date range and the diseases it
+    holds, so a single case or a date/disease slice can be read back without
+    decompressing whole segments. The member is fsynced before the rows are
+    deleted in the same transaction that records the block; a crash in
+    between leaves only an unreferenced member. Run one archiver at a time.
+    """
+
+    @staticmethod
+    def archive(
+        older_than: datetime,
+        batch_size: int = 1_000,
+        max_cases: Optional[int] = None,
+    ) -> int:
+        """Archives cases created before older_than; returns how many were moved."""
+        archive_dir = current_app.config["CASE_ARCHIVE_DIR"]
+        os.makedirs(archive_dir, exist_ok=True)
+        moved = 0
+        newest_id = None
+        if db.engine.dialect.name == "sqlite":
+            # SQLite hands out max(id) + 1, so the newest case stays until a
+            # later one exists; otherwise new cases would reuse archived ids
+            newest_id = db.session.scalar(db.select(db.func.max(Case.id)))
+        while max_cases is None or moved < max_cases:
+            limit = batch_size if max_cases is None else min(batch_size, max_cases - moved)
+            case_ids = db.session.scalars(
+                db.select(Case.id)
+                .where(Case.created_at < older_than, Case.id != newest_id)
+                .order_by(Case.created_at, Case.id)
+                .limit(limit)
+            ).all()
+            if not case_ids:
+                break
+
+            rows = [
+                CaseExportService.to_row(result_row)
+                for result_row in db.session.execute(
+                    CaseExportService.select_rows()
+                    .where(Case.id.in_(case_ids))
+                    .order_by(Case.created_at, Case.id)
+                )
+            ]
+            for segment, segment_rows in groupby(
+                rows, key=lambda row: segment_name("cases", datetime.fromisoformat(row["created_at"]))
+            ):
+                segment_rows = list(segment_rows)
+                offset, length = append_member(os.path.join(archive_dir, segment), segment_rows)
+                case_id_list = [row["case_id"] for row in segment_rows]
+                db.session.add(CaseArchiveBlock(
+                    segment=segment,
+                    offset=offset,
+                    length=length,
+                    case_count=len(segment_rows),
+                    first_case_id=min(case_id_list),
+                    last_case_id=max(case_id_list),
+                    first_created_at=datetime.fromisoformat(segment_rows[0]["created_at"]),
+                    last_created_at=datetime.fromisoformat(segment_rows[-1]["created_at"]),
+                    disease_ids=" ".join(str(d) for d in sorted(
+                        {row["disease_id"] for row in segment_rows if row["disease_id"] is not None}
+                    )),
+                ))
+
+            db.session.execute(db.delete(tbl_cases_symptoms).where(tbl_cases_symptoms.c.case_id.in_(case_ids)))
+            db.session.execute(db.delete(Case).where(Case.id.in_(case_ids)))
+            db.session.commit()
+            SimilarCaseService.forget((row["case_id"], row["symptom_ids"]) for row in rows)
+            moved += len(case_ids)
+        return moved
+
+    @staticmethod
+    def cutoff(days: Optional[int] = None) -> datetime:
+        days = current_app.config["CASE_ARCHIVE_AFTER_DAYS"] if days is None else days
+        return datetime.utcnow() - timedelta(days=days)
+
+    @staticmethod
+    def get(case_id: int) -> Optional[ArchivedCase]:
+        """Reads one archived case; only blocks whose id range covers it are opened."""
+        blocks = db.session.scalars(
+            db.select(CaseArchiveBlock).where(
+                CaseArchiveBlock.first_case_id <= case_id,
+                CaseArchiveBlock.last_case_id >= case_id,
+            )
+        ).all()
+        for block in blocks:
+            for row in read_block(current_app.config["CASE_ARCHIVE_DIR"], block):
+                if row["case_id"] == case_id:
+                    return CaseArchiveService._to_case(row)
+        return None
+
+    @staticmethod
+    def iter_rows(filters: Optional[dict] = None) -> Iterator[dict]:
+        """
+        Yields archived export rows matching the CaseService.apply_filters
+        keys. Blocks outside the date range or without the disease are not read.
+        """
+        filters = filters or {}
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        disease_id = filters.get("disease_id")
+        query = db.select(CaseArchiveBlock).order_by(CaseArchiveBlock.first_created_at, CaseArchiveBlock.id)
+        if date_from is not None:
+            query = query.where(
+                CaseArchiveBlock.last_created_at >= datetime.combine(date_from, datetime.min.time())
+            )
+        if date_to is not None:
+            query = query.where(
+                CaseArchiveBlock.first_created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+            )
+        for block in db.session.scalars(query).all():
+            if disease_id is not None and str(disease_id) not in block.disease_ids.split():
+                continue
+            for row in read_block(current_app.config["CASE_ARCHIVE_DIR"], block):
+                day = datetime.fromisoformat(row["created_at"]).date()
+                if (
+                    (date_from is not None and day < date_from)
+                    or (date_to is not None and day > date_to)
+                    or (disease_id is not None and row["disease_id"] != disease_id)
+                    or (filters.get("user_id") is not None and row["user_id"] != filters["user_id"])
+                    or (filters.get("symptom_id") is not None and filters["symptom_id"] not in row["symptom_ids"])
+                ):
+                    continue
+                yield row
+
+    @staticmethod
+    def _to_case(row: dict) -> ArchivedCase:
+        # Prefer the live disease (description, treatment); fall back to the archived names
+        disease = None
+        if row["disease_id"] is not None:
+            disease = KnowledgeBaseService.get_engine().kb.diseases.get(row["disease_id"]) or DiseaseRecord(
+                id=row["disease_id"],
+                name=row["disease"] or f"#{row['disease_id']}",
+                description="",
+                treatment="",
+                category=CategoryRecord(id=None, name=row["category"]) if row["category"] else None,
+            )
+        return ArchivedCase(
+            id=row["case_id"],
+            user_id=row["user_id"],
+            username=row["username"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            confidence=row["confidence"],
+            disease=disease,
+            symptoms=[
+                ArchivedSymptom(symptom_id, name)
+                for symptom_id, name in zip(row["symptom_ids"], row["symptoms"])
+            ],
+        )
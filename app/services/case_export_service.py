@@ -0,0 +1,139 @@
+# app/services/case_export_service.py
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Optional
+from extensions import db
+from app.models.expert_system import Case, Category, Disease, Symptom
+from app.models.user import UserTable
+from app.models.associations import tbl_cases_symptoms
+from app.services.expert_system_service import CaseService
+
+EXPORT_FIELDS = [
+    "case_id",
+    "created_at",
+    "user_id",
+    "username",
+    "disease_id",
+    "disease",
+    "category",
+    "confidence",
+    "symptom_ids",
+    "symptoms",
+]
+
+# Separators inside the aggregated symptom list: id PAIR_SEP name ITEM_SEP ...
+PAIR_SEP = "\x1e"
+ITEM_SEP = "\x1f"
+
+
+def _symptom_list():
+    """Correlated subquery aggregating one case's symptoms into a single string."""
+    pair = db.cast(Symptom.id, db.String) + PAIR_SEP + Symptom.name
+    if db.session.get_bind().dialect.name == "postgresql":
+        aggregate = db.func.string_agg(pair, ITEM_SEP)
+    else:
+        aggregate = db.func.group_concat(pair, ITEM_SEP)
+    return (
+        db.select(aggregate)
+        .select_from(tbl_cases_symptoms.join(Symptom, tbl_cases_symptoms.c.symptom_id == Symptom.id))
+        .where(tbl_cases_symptoms.c.case_id == Case.id)
+        .scalar_subquery()
+    )
+
+
+class CaseExportService:
+    """
+    Streams the case history, one row per case with its symptoms, without
+    loading it into memory. Rows come off a server-side cursor in chunks
+    and symptoms are aggregated by the database, so memory use does not
+    depend on how many cases are exported.
+    """
+
+    @staticmethod
+    def select_rows():
+        """Select of one export row per case; to_row turns a result row into a dict."""
+        return (
+            db.select(
+                Case.id,
+                Case.created_at,
+                Case.user_id,
+                UserTable.username,
+                Case.disease_id,
+                Disease.name,
+                Category.name,
+                Case.confidence,
+                _symptom_list(),
+            )
+            .outerjoin(UserTable, Case.user_id == UserTable.id)
+            .outerjoin(Disease, Case.disease_id == Disease.id)
+            .outerjoin(Category, Disease.category_id == Category.id)
+        )
+
+    @staticmethod
+    def to_row(result_row) -> dict:
+        case_id, created_at, user_id, username, disease_id, disease, category, confidence, symptoms = result_row
+        pairs = sorted(
+            (int(symptom_id), name)
+            for symptom_id, name in (item.split(PAIR_SEP, 1) for item in (symptoms or "").split(ITEM_SEP) if item)
+        )
+        return {
+            "case_id": case_id,
+            "created_at": created_at.isoformat(),
+            "user_id": user_id,
+            "username": username,
+            "disease_id": disease_id,
+            "disease": disease,
+            "category": category,
+            "confidence": confidence,
+            "symptom_ids": [symptom_id for symptom_id, _ in pairs],
+            "symptoms": [name for _, name in pairs],
+        }
+
+    @staticmethod
+    def iter_rows(filters: Optional[dict] = None, chunk_size: int = 1_000) -> Iterator[dict]:
+        """Yields export rows in case id order; filters are those of CaseService.apply_filters."""
+        query = CaseService.apply_filters(CaseExportService.select_rows(), filters or {}).order_by(Case.id)
+        result = db.session.execute(query.execution_options(yield_per=chunk_size))
+        for result_row in result:
+            yield CaseExportService.to_row(result_row)
+
+    @staticmethod
+    def iter_csv(filters: Optional[dict] = None, chunk_size: int = 1_000) -> Iterator[str]:
+        return CaseExportService.format_csv(CaseExportService.iter_rows(filters, chunk_size), chunk_size)
+
+    @staticmethod
+    def iter_ndjson(filters: Optional[dict] = None, chunk_size: int = 1_000) -> Iterator[str]:
+        return CaseExportService.format_ndjson(CaseExportService.iter_rows(filters, chunk_size), chunk_size)
+
+    @staticmethod
+    def format_csv(rows: Iterable[dict], chunk_size: int = 1_000) -> Iterator[str]:
+        """CSV text in pieces of up to chunk_size rows; symptom lists are joined with '; '."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        count = 0
+        for row in rows:
+            writer.writerow({
+                **row,
+                "symptom_ids": " ".join(str(symptom_id) for symptom_id in row["symptom_ids"]),
+                "symptoms": "; ".join(row["symptoms"]),
+            })
+            count += 1
+            if count % chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    @staticmethod
+    def format_ndjson(rows: Iterable[dict], chunk_size: int = 1_000) -> Iterator[str]:
+        """One JSON object per line, in pieces of up to chunk_size lines."""
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(row, ensure_ascii=False) + "\n")
+            if len(lines) >= chunk_size:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
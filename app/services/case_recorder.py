@@ -0,0 +1,76 @@
+# app/services/case_recorder.py
+from typing import List
+from extensions import db
+from app.models.expert_system import Symptom, Case
+from app.models.associations import tbl_cases_symptoms
+from app.services.case_rollup_service import CaseRollupService
+from app.services.expert_system_service import CaseService
+from app.services.similar_case_service import SimilarCaseService
+from app.services.unit_of_work import UnitOfWork
+from app.services.write_behind import WriteBehindWriter
+
+
+def insert_case_rows(rows: List[dict]) -> List[int]:
+    """
+    Inserts cases and their symptom links with one INSERT per table, using
+    ids only. Each row has user_id, disease_id, confidence, created_at and
+    symptom_ids. Unknown symptom ids are not linked. The cases are counted
+    into the prevalence rollups (see CaseRollupService.record) and added to
+    this worker's similar-case index (after the request's commit when a unit
+    of work is open). Does not commit.
+    """
+    if not rows:
+        return []
+    known_ids = set(db.session.scalars(
+        db.select(Symptom.id).filter(
+            Symptom.id.in_({sid for row in rows for sid in row["symptom_ids"]})
+        )
+    ).all())
+    linked = [sorted(set(row["symptom_ids"]) & known_ids) for row in rows]
+    encoded = [CaseService.encode_symptom_set(symptom_ids) for symptom_ids in linked]
+
+    case_ids = db.session.scalars(
+        db.insert(Case).returning(Case.id, sort_by_parameter_order=True),
+        [
+            {
+                "user_id": row["user_id"],
+                "disease_id": row["disease_id"],
+                "confidence": row["confidence"],
+                "created_at": row["created_at"],
+                **symptom_columns,
+            }
+            for row, symptom_columns in zip(rows, encoded)
+        ],
+    ).all()
+
+    links = [
+        {"case_id": case_id, "symptom_id": symptom_id}
+        for case_id, symptom_ids in zip(case_ids, linked)
+        for symptom_id in symptom_ids
+    ]
+    if links:
+        db.session.execute(db.insert(tbl_cases_symptoms), links)
+    CaseRollupService.record(rows)
+    entries = list(zip(case_ids, linked))
+    UnitOfWork.after_commit(lambda: SimilarCaseService.record(entries))
+    return case_ids
+
+
+class CaseRecorder(WriteBehindWriter):
+    """
+    Write-behind recorder (CASE_RECORDER_MODE = "write_behind"): cases are
+    queued and bulk inserted every CASE_RECORDER_FLUSH_INTERVAL seconds or
+    CASE_RECORDER_BATCH_SIZE cases, spooling to CASE_RECORDER_SPOOL_PATH
+    when a flush fails.
+    """
+
+    def __init__(self, app):
+        super().__init__(
+            app,
+            insert_case_rows,
+            label="cases",
+            batch_size=app.config.get("CASE_RECORDER_BATCH_SIZE", 500),
+            flush_interval=app.config.get("CASE_RECORDER_FLUSH_INTERVAL", 1.0),
+            queue_size=app.config.get("CASE_RECORDER_QUEUE_SIZE", 10_000),
+            spool_path=app.config.get("CASE_RECORDER_SPOOL_PATH"),
+        )
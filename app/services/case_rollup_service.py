@@ -0,0 +1,270 @@
+# app/services/case_rollup_service.py
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import current_app
+from extensions import db
+from app.models.expert_system import Case, CaseRollup, Disease
+from app.models.user import UserTable
+from app.services.case_archive_service import CaseArchiveService
+from app.services.knowledge_base_service import KnowledgeBaseService
+from app.services.unit_of_work import UnitOfWork
+from app.services.write_behind import WriteBehindWriter
+
+PERIODS = ("day", "week")
+DIMENSIONS = ("disease", "category", "user")
+
+# (period, period_start, dimension, key_id) -> [case_count, confidence_sum]
+Totals = Dict[Tuple[str, date, str, int], List[float]]
+
+UPSERT_CHUNK = 1_000
+
+
+def period_start(period: str, day: date) -> date:
+    """Start of the day or ISO week (Monday) that day falls in."""
+    return day if period == "day" else day - timedelta(days=day.weekday())
+
+
+def _accumulate(totals: Totals, created_at: datetime, user_id: Optional[int],
+                disease_id: Optional[int], category_id: Optional[int],
+                confidence: Optional[float]) -> None:
+    keys = [
+        (dimension, key_id)
+        for dimension, key_id in (("disease", disease_id), ("category", category_id), ("user", user_id))
+        if key_id is not None
+    ]
+    day = created_at.date()
+    for period in PERIODS:
+        start = period_start(period, day)
+        for dimension, key_id in keys:
+            entry = totals[(period, start, dimension, key_id)]
+            entry[0] += 1
+            entry[1] += confidence or 0.0
+
+
+def _upsert(totals: Totals) -> None:
+    """Adds totals onto the existing rollup rows, creating missing ones."""
+    rows = [
+        {
+            "period": period,
+            "period_start": start,
+            "dimension": dimension,
+            "key_id": key_id,
+            "case_count": int(count),
+            "confidence_sum": confidence_sum,
+        }
+        for (period, start, dimension, key_id), (count, confidence_sum) in totals.items()
+    ]
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(CaseRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CaseRollup.period, CaseRollup.period_start, CaseRollup.dimension, CaseRollup.key_id],
+            set_={
+                "case_count": CaseRollup.case_count + stmt.excluded.case_count,
+                "confidence_sum": CaseRollup.confidence_sum + stmt.excluded.confidence_sum,
+            },
+        )
+        for start in range(0, len(rows), UPSERT_CHUNK):
+            db.session.execute(stmt, rows[start:start + UPSERT_CHUNK])
+        return
+
+    # Other databases: update, then insert the keys that had no row yet
+    for row in rows:
+        result = db.session.execute(
+            db.update(CaseRollup)
+            .where(
+                CaseRollup.period == row["period"],
+                CaseRollup.period_start == row["period_start"],
+                CaseRollup.dimension == row["dimension"],
+                CaseRollup.key_id == row["key_id"],
+            )
+            .values(
+                case_count=CaseRollup.case_count + row["case_count"],
+                confidence_sum=CaseRollup.confidence_sum + row["confidence_sum"],
+            )
+        )
+        if result.rowcount == 0:
+            db.session.execute(db.insert(CaseRollup), [row])
+
+
+class RollupWriter(WriteBehindWriter):
+    """
+    Counts the cases recorded by requests into the rollups in batches
+    (every CASE_ROLLUP_FLUSH_INTERVAL seconds or CASE_ROLLUP_BATCH_SIZE
+    cases), spooling to CASE_ROLLUP_SPOOL_PATH when a flush fails. Each
+    rollup row is upserted once per batch by this one thread rather than
+    once per diagnosis inside the request's transaction.
+    """
+
+    def __init__(self, app):
+        super().__init__(
+            app,
+            CaseRollupService.apply,
+            label="rollup rows",
+            batch_size=app.config.get("CASE_ROLLUP_BATCH_SIZE", 500),
+            flush_interval=app.config.get("CASE_ROLLUP_FLUSH_INTERVAL", 1.0),
+            queue_size=app.config.get("CASE_ROLLUP_QUEUE_SIZE", 10_000),
+            spool_path=app.config.get("CASE_ROLLUP_SPOOL_PATH"),
+        )
+
+
+class CaseRollupService:
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(rows: Iterable[dict]) -> None:
+        """
+        Counts newly recorded cases into the rollups. Each row has user_id,
+        disease_id, confidence and created_at. Inside a request the cases
+        are queued for the RollupWriter once the request's writes commit,
+        so concurrent diagnoses do not wait on each other's locks on the
+        shared rollup rows. Elsewhere (CLI commands, the write-behind case
+        flusher, which write in batches already) the rollups are updated
+        in the caller's transaction; that does not commit.
+        """
+        if not UnitOfWork.active():
+            CaseRollupService.apply(rows)
+            return
+        rows = [
+            {key: row[key] for key in ("user_id", "disease_id", "confidence", "created_at")}
+            for row in rows
+        ]
+        UnitOfWork.after_commit(lambda: CaseRollupService._submit(rows))
+
+    @staticmethod
+    def apply(rows: Iterable[dict]) -> None:
+        """
+        Adds rows (as for record) onto the rollup rows now, with one upsert
+        per rollup key. The category is the disease's category in the
+        current knowledge base. Does not commit.
+        """
+        diseases = KnowledgeBaseService.get_engine().kb.diseases
+        totals: Totals = defaultdict(lambda: [0, 0.0])
+        for row in rows:
+            disease = diseases.get(row["disease_id"])
+            category_id = disease.category.id if disease and disease.category else None
+            _accumulate(totals, row["created_at"], row["user_id"], row["disease_id"],
+                        category_id, row["confidence"])
+        _upsert(totals)
+
+    @staticmethod
+    def _submit(rows: List[dict]) -> None:
+        writer = CaseRollupService._get_writer()
+        overflow = [row for row in rows if not writer.submit(row)]
+        if overflow:
+            # Queue full: count these synchronously rather than drop them
+            CaseRollupService.apply(overflow)
+            UnitOfWork.commit()
+
+    @staticmethod
+    def _get_writer() -> RollupWriter:
+        writer = current_app.extensions.get("rollup_writer")
+        if writer is None:
+            with CaseRollupService._lock:
+                writer = current_app.extensions.get("rollup_writer")
+                if writer is None:
+                    writer = RollupWriter(current_app._get_current_object())
+                    current_app.extensions["rollup_writer"] = writer
+        return writer
+
+    @staticmethod
+    def rebuild(chunk_size: int = 10_000) -> int:
+        """
+        Recomputes every rollup from tbl_cases and the case archive, using
+        each disease's current category, and commits. Cases recorded or
+        archived while this runs may be counted twice or missed, so run it
+        when diagnosis traffic is quiet. Returns the number of cases read.
+        """
+        totals: Totals = defaultdict(lambda: [0, 0.0])
+        count = 0
+        categories = dict(db.session.execute(db.select(Disease.id, Disease.category_id)).all())
+        for row in CaseArchiveService.iter_rows():
+            _accumulate(totals, datetime.fromisoformat(row["created_at"]), row["user_id"], row["disease_id"],
+                        categories.get(row["disease_id"]), row["confidence"])
+            count += 1
+
+        rows = db.session.execute(
+            db.select(Case.created_at, Case.user_id, Case.disease_id, Disease.category_id, Case.confidence)
+            .outerjoin(Disease, Case.disease_id == Disease.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for created_at, user_id, disease_id, category_id, confidence in rows:
+            _accumulate(totals, created_at, user_id, disease_id, category_id, confidence)
+            count += 1
+
+        db.session.execute(db.delete(CaseRollup))
+        _upsert(totals)
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def report(period: str, dimension: str, date_from: date, date_to: date) -> dict:
+        """
+        Case counts per period between date_from and date_to (inclusive),
+        one series per disease, category or user, busiest first. Reads only
+        tbl_case_rollups.
+        """
+        periods = []
+        current = period_start(period, date_from)
+        while current <= date_to:
+            periods.append(current)
+            current += timedelta(days=1 if period == "day" else 7)
+        if not periods:
+            return {"period": period, "dimension": dimension, "periods": [], "series": []}
+
+        series: Dict[int, dict] = {}
+        position = {start: i for i, start in enumerate(periods)}
+        for key_id, start, case_count, confidence_sum in db.session.execute(
+            db.select(CaseRollup.key_id, CaseRollup.period_start, CaseRollup.case_count, CaseRollup.confidence_sum)
+            .where(
+                CaseRollup.period == period,
+                CaseRollup.dimension == dimension,
+                CaseRollup.period_start >= periods[0],
+                CaseRollup.period_start <= date_to,
+            )
+        ):
+            entry = series.setdefault(key_id, {
+                "id": key_id,
+                "counts": [0] * len(periods),
+                "total": 0,
+                "confidence_sum": 0.0,
+            })
+            entry["counts"][position[start]] += case_count
+            entry["total"] += case_count
+            entry["confidence_sum"] += confidence_sum
+
+        names = CaseRollupService._names(dimension, list(series))
+        result = []
+        for entry in sorted(series.values(), key=lambda e: (-e["total"], e["id"])):
+            confidence_sum = entry.pop("confidence_sum")
+            entry["name"] = names.get(entry["id"], f"#{entry['id']}")
+            entry["avg_confidence"] = round(confidence_sum / entry["total"], 2) if entry["total"] else None
+            result.append(entry)
+        return {
+            "period": period,
+            "dimension": dimension,
+            "periods": [start.isoformat() for start in periods],
+            "series": result,
+        }
+
+    @staticmethod
+    def _names(dimension: str, key_ids: List[int]) -> Dict[int, str]:
+        if not key_ids:
+            return {}
+        if dimension == "user":
+            return dict(db.session.execute(
+                db.select(UserTable.id, UserTable.username).where(UserTable.id.in_(key_ids))
+            ).all())
+        kb = KnowledgeBaseService.get_engine().kb
+        if dimension == "disease":
+            return {d.id: d.name for d in kb.diseases.values()}
+        return {d.category.id: d.category.name for d in kb.diseases.values() if d.category}
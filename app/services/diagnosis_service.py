@@ -1,7 +1,20 @@
+import threading
+from datetime import datetime
+from flask import current_app
 from app.models.expert_system import Symptom, Rule, Case
+from app.services.case_recorder import CaseRecorder, insert_case_rows
+from app.services.case_rollup_service import CaseRollupService
+from app.services.expert_system_service import CaseService
+from app.services.knowledge_base_service import KnowledgeBaseService, rank_key
+from app.services.inference_session import InferenceSession
+from app.services.outbreak_service import OutbreakService
+from app.services.similar_case_service import SimilarCaseService
+from app.services.unit_of_work import UnitOfWork
 from extensions import db
 
 class DiagnosisService:
+    _lock = threading.Lock()
+
     @staticmethod
     def get_all_symptoms():
         """Fetches all symptoms for the Doctor and User journeys."""
@@ -13,46 +26,216 @@ class DiagnosisService:
         return Rule.query.all()
 
     @staticmethod
-    def run_inference(selected_symptom_ids):
+    def run_inference(selected_symptom_ids, top_k=None):
         """
         Forward Chaining Inference Engine: Matches user input against Doctor rules.
+        Scoring is delegated to the compiled engine selected by INFERENCE_BACKEND.
+        With top_k only the k best results are built, in the same order as the
+        first k entries of the full ranking.
+        """
+        scores = DiagnosisService._score(selected_symptom_ids, top_k)
+        if not scores:
+            return []
+        return DiagnosisService._rank(scores, KnowledgeBaseService.get_engine().kb)
+
+    @staticmethod
+    def run_batch_inference(symptom_id_sets, top_k=None):
+        """
+        Runs inference for many symptom sets against one loaded knowledge base.
+        Each entry is ranked exactly as run_inference would rank it.
+        """
+        batch_scores = [DiagnosisService._score(symptom_ids, top_k) for symptom_ids in symptom_id_sets]
+        kb = KnowledgeBaseService.get_engine().kb
+        return [DiagnosisService._rank(scores, kb) for scores in batch_scores]
+
+    @staticmethod
+    def infer_with_engine(engine, selected_symptom_ids, top_k=None):
+        """
+        run_inference against an explicit compiled engine, without the app's
+        cache or engine registry. Used by offline jobs that run outside a
+        Flask app context; the ranking is identical to run_inference.
+        """
+        symptom_ids = frozenset(selected_symptom_ids)
+        scores = engine.top_k(symptom_ids, top_k) if top_k else engine.score(symptom_ids)
+        return DiagnosisService._rank(scores, engine.kb)
+
+    @staticmethod
+    def _score(selected_symptom_ids, top_k=None):
+        # Memoized per canonical symptom set, knowledge-base version and top_k
+        KnowledgeBaseService.check_for_updates()
+        symptom_ids = frozenset(selected_symptom_ids)
+        key = (symptom_ids, KnowledgeBaseService.get_version(), top_k)
+        cache = KnowledgeBaseService.get_cache()
+        scores = cache.get(key)
+        if scores is None:
+            engine = KnowledgeBaseService.get_engine()
+            if top_k:
+                scores = tuple(engine.top_k(symptom_ids, top_k))
+            else:
+                scores = tuple(engine.score(symptom_ids))
+            cache.put(key, scores)
+        return scores
+
+    @staticmethod
+    def update_live_session(session_key, selected_symptom_ids, toggled_symptom_id, top_k):
+        """
+        Applies one symptom toggle to the caller's incremental session and
+        returns the top results. selected_symptom_ids is the full selection
+        after the toggle; if this worker's session does not hold the selection
+        from before the toggle (other worker, evicted, or KB rebuilt), it is
+        rebuilt from selected_symptom_ids.
+        """
+        engine = KnowledgeBaseService.get_engine()
+        sessions = KnowledgeBaseService.get_live_sessions()
+        selected = set(selected_symptom_ids)
+        previous = selected ^ {toggled_symptom_id}
+
+        live = sessions.get(session_key)
+        if live is None or live.engine is not engine or live.selected != previous:
+            live = InferenceSession(engine, selected)
+        elif toggled_symptom_id in selected:
+            live.add(toggled_symptom_id)
+        else:
+            live.remove(toggled_symptom_id)
+        sessions.put(session_key, live)
+
+        return DiagnosisService._rank(live.top(top_k), engine.kb)
+
+    @staticmethod
+    def scores_of(results):
+        """(rule_id, matched_count, confidence) triples that replay rebuilds results from."""
+        return [[result["rule"].id, result["matched_count"], result["confidence"]] for result in results]
+
+    @staticmethod
+    def replay(scores):
+        """
+        Result rows for scores saved with scores_of, built from the current
+        knowledge base without running inference. Rules deleted since are
+        left out.
         """
-        all_rules = Rule.query.all()
+        return DiagnosisService._rank(scores, KnowledgeBaseService.get_engine().kb)
+
+    @staticmethod
+    def cache_stats():
+        return KnowledgeBaseService.get_cache().stats()
+
+    @staticmethod
+    def _rank(scores, kb):
+        """Builds result rows from the read model; no ORM objects are loaded."""
         results = []
+        for rule_id, matched, confidence in scores:
+            rule = kb.rules.get(rule_id)
+            if rule is None:
+                # Cached score for a rule deleted after it was computed
+                continue
+            disease = kb.diseases[rule.disease_id]
+            results.append({
+                "disease": disease,
+                "confidence": round(confidence, 2),
+                "matched_count": matched,
+                "treatment": disease.treatment,
+                "rule": rule,
+            })
 
-        for rule in all_rules:
-            # Get the set of symptom IDs required for this rule
-            rule_symptom_ids = {s.id for s in rule.symptoms}
-            input_ids = set(selected_symptom_ids)
-            
-            # Find matching symptoms
-            matches = input_ids.intersection(rule_symptom_ids)
-            if matches:
-                # Calculate confidence (Match / Total Required)
-                match_ratio = len(matches) / len(rule_symptom_ids)
-                weighted = match_ratio * (rule.confidence or 100.0)
-                confidence = min(weighted, 100.0)
-                results.append({
-                    "disease": rule.disease,
-                    "confidence": round(confidence, 2),
-                    "matched_count": len(matches),
-                    "treatment": rule.disease.treatment,
-                    "rule": rule,
-                })
-
-        # Sort by highest match percentage
-        return sorted(results, key=lambda x: x['confidence'], reverse=True)
+        # Sort by highest match percentage; ties go to the higher-priority rule
+        return sorted(results, key=lambda x: rank_key(x["rule"].id, x["rule"].priority, x["confidence"]))
+
+    @staticmethod
+    def _get_recorder():
+        recorder = current_app.extensions.get("case_recorder")
+        if recorder is None:
+            with DiagnosisService._lock:
+                recorder = current_app.extensions.get("case_recorder")
+                if recorder is None:
+                    recorder = CaseRecorder(current_app._get_current_object())
+                    current_app.extensions["case_recorder"] = recorder
+        return recorder
+
+    @staticmethod
+    def _submit(rows):
+        recorder = DiagnosisService._get_recorder()
+        overflow = [row for row in rows if not recorder.submit(row)]
+        if overflow:
+            # Queue full: write these synchronously rather than drop them
+            insert_case_rows(overflow)
+            UnitOfWork.commit()
+        OutbreakService.record((row["disease_id"], row["created_at"]) for row in rows)
 
     @staticmethod
     def record_case(user_id, selected_symptom_ids, top_result):
+        """
+        Records the top result as a Case. In write-behind mode the case is
+        queued for a bulk insert and None is returned, since it has no id yet.
+        """
         if not top_result:
             return None
+        if current_app.config.get("CASE_RECORDER_MODE") == "write_behind":
+            row = {
+                "user_id": user_id,
+                "disease_id": top_result["disease"].id,
+                "confidence": top_result["confidence"],
+                "created_at": datetime.utcnow(),
+                "symptom_ids": sorted(set(selected_symptom_ids)),
+            }
+            # Queued only once the request's writes commit, so a failed request records nothing
+            UnitOfWork.after_commit(lambda: DiagnosisService._submit([row]))
+            return None
+
+        symptoms = Symptom.query.filter(Symptom.id.in_(selected_symptom_ids)).all()
         case = Case(
             user_id=user_id,
             disease_id=top_result["disease"].id,
             confidence=top_result["confidence"],
+            created_at=datetime.utcnow(),
+            symptoms=symptoms,
+            **CaseService.encode_symptom_set(symptom.id for symptom in symptoms),
         )
-        case.symptoms = Symptom.query.filter(Symptom.id.in_(selected_symptom_ids)).all()
         db.session.add(case)
-        db.session.commit()
+        CaseRollupService.record([{
+            "user_id": case.user_id,
+            "disease_id": case.disease_id,
+            "confidence": case.confidence,
+            "created_at": case.created_at,
+        }])
+        UnitOfWork.commit()
+        # Read now: committing expires the case's attributes
+        outbreak_row = (case.disease_id, case.created_at)
+        similar_entry = (case.id, [symptom.id for symptom in case.symptoms])
+        UnitOfWork.after_commit(lambda: OutbreakService.record([outbreak_row]))
+        UnitOfWork.after_commit(lambda: SimilarCaseService.record([similar_entry]))
         return case
+
+    @staticmethod
+    def record_cases(user_id, entries):
+        """
+        Bulk variant of record_case for (selected_symptom_ids, top_result) pairs.
+        Cases and their symptom links are written with one INSERT each, using ids
+        only. Returns the new case ids aligned with entries (None where there was
+        no result, and everywhere in write-behind mode, where the cases are
+        queued once the request's writes commit).
+        """
+        recorded = [(symptom_ids, top) for symptom_ids, top in entries if top]
+        if not recorded:
+            return [None] * len(entries)
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": user_id,
+                "disease_id": top["disease"].id,
+                "confidence": top["confidence"],
+                "created_at": now,
+                "symptom_ids": sorted(set(symptom_ids)),
+            }
+            for symptom_ids, top in recorded
+        ]
+        if current_app.config.get("CASE_RECORDER_MODE") == "write_behind":
+            UnitOfWork.after_commit(lambda: DiagnosisService._submit(rows))
+            return [None] * len(entries)
+
+        case_ids = insert_case_rows(rows)
+        UnitOfWork.commit()
+        UnitOfWork.after_commit(lambda: OutbreakService.record((top["disease"].id, now) for _, top in recorded))
+
+        new_ids = iter(case_ids)
+        return [next(new_ids) if top else None for _, top in entries]
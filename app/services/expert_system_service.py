@@ -1,7 +1,13 @@
 # app/services/expert_system_service.py
-from typing import List, Optional
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import joinedload, selectinload
 from extensions import db
 from app.models.expert_system import Category, Symptom, Disease, Rule, Case
+from app.models.associations import tbl_cases_symptoms
+from app.services import keyset
+from app.services.knowledge_base_service import KnowledgeBaseService
+from app.services.unit_of_work import UnitOfWork
 
 
 class CategoryService:
@@ -20,20 +26,22 @@ class CategoryService:
             description=data.get("description") or "",
         )
         db.session.add(category)
-        db.session.commit()
+        UnitOfWork.commit()
         return category
 
     @staticmethod
     def update(category: Category, data: dict) -> Category:
         category.name = data["name"]
         category.description = data.get("description") or ""
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
         return category
 
     @staticmethod
     def delete(category: Category) -> None:
         db.session.delete(category)
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
 
 
 class SymptomService:
@@ -52,20 +60,23 @@ class SymptomService:
             description=data.get("description") or "",
         )
         db.session.add(symptom)
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.bump_version()
         return symptom
 
     @staticmethod
     def update(symptom: Symptom, data: dict) -> Symptom:
         symptom.name = data["name"]
         symptom.description = data.get("description") or ""
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.bump_version()
         return symptom
 
     @staticmethod
     def delete(symptom: Symptom) -> None:
         db.session.delete(symptom)
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
 
 
 class DiseaseService:
@@ -86,7 +97,8 @@ class DiseaseService:
             category_id=data.get("category_id") or None,
         )
         db.session.add(disease)
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
         return disease
 
     @staticmethod
@@ -95,13 +107,15 @@ class DiseaseService:
         disease.description = data["description"]
         disease.treatment = data["treatment"]
         disease.category_id = data.get("category_id") or None
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
         return disease
 
     @staticmethod
     def delete(disease: Disease) -> None:
         db.session.delete(disease)
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
 
 
 class RuleService:
@@ -127,7 +141,8 @@ class RuleService:
             symptom_ids = [int(sid) for sid in symptom_ids]
             rule.symptoms = Symptom.query.filter(Symptom.id.in_(symptom_ids)).all()
         db.session.add(rule)
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
         return rule
 
     @staticmethod
@@ -143,13 +158,15 @@ class RuleService:
             rule.symptoms = Symptom.query.filter(Symptom.id.in_(symptom_ids)).all()
         else:
             rule.symptoms = []
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
         return rule
 
     @staticmethod
     def delete(rule: Rule) -> None:
         db.session.delete(rule)
-        db.session.commit()
+        UnitOfWork.commit()
+        KnowledgeBaseService.invalidate()
 
 
 class CaseService:
@@ -164,3 +181,184 @@ class CaseService:
     @staticmethod
     def get_by_id(case_id: int) -> Optional[Case]:
         return Case.query.get(case_id)
+
+    @staticmethod
+    def apply_filters(query, filters: dict):
+        """
+        Restricts a select over Case by user_id, disease_id, symptom_id,
+        date_from and date_to (dates, both inclusive). Missing keys are ignored.
+        """
+        if filters.get("user_id") is not None:
+            query = query.where(Case.user_id == filters["user_id"])
+        if filters.get("disease_id") is not None:
+            query = query.where(Case.disease_id == filters["disease_id"])
+        if filters.get("symptom_id") is not None:
+            query = query.where(Case.id.in_(
+                db.select(tbl_cases_symptoms.c.case_id)
+                .where(tbl_cases_symptoms.c.symptom_id == filters["symptom_id"])
+            ))
+        return keyset.filter_dates(query, Case.created_at, filters)
+
+    @staticmethod
+    def get_page(
+        filters: Optional[dict] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Case], Optional[str]]:
+        """
+        Returns up to limit cases, newest first, and the cursor of the next
+        page (None on the last page), as keyset.page.
+
+        filters are those of apply_filters. disease, user and symptoms are
+        eager-loaded.
+        """
+        query = CaseService.apply_filters(
+            db.select(Case).options(
+                joinedload(Case.disease),
+                joinedload(Case.user),
+                selectinload(Case.symptoms),
+            ),
+            filters or {},
+        )
+        return keyset.page(query, Case, cursor, limit)
+
+    @staticmethod
+    def encode_symptom_set(symptom_ids: Iterable[int]) -> dict:
+        """
+        Column values for a case's symptom set:
+          symptom_key       sorted ids wrapped in commas (",3,7,12,"), so
+                            "contains 7" is symptom_key LIKE '%,7,%';
+          symptom_set_hash  signed 64-bit hash of the key, equal for equal sets;
+          symptom_mask      bit (id % 63) set per symptom: exact while every
+                            symptom id is below 63, otherwise a prefilter
+                            checked before the key.
+        """
+        ids = sorted(set(symptom_ids))
+        key = "," + ",".join(str(sid) for sid in ids) + ","
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return {
+            "symptom_key": key,
+            "symptom_set_hash": int.from_bytes(digest, "big", signed=True),
+            "symptom_mask": CaseService.symptom_mask(ids),
+        }
+
+    @staticmethod
+    def symptom_mask(symptom_ids: Iterable[int]) -> int:
+        mask = 0
+        for symptom_id in symptom_ids:
+            mask |= 1 << (symptom_id % 63)
+        return mask
+
+    @staticmethod
+    def decode_symptom_key(symptom_key: str) -> List[int]:
+        return [int(sid) for sid in symptom_key.strip(",").split(",") if sid]
+
+    @staticmethod
+    def apply_symptom_containment(query, include: Iterable[int] = (), exclude: Iterable[int] = ()):
+        """Restricts a select over Case to cases with every include and no exclude symptom."""
+        include, exclude = [int(sid) for sid in include], [int(sid) for sid in exclude]
+        query = query.where(Case.symptom_key.is_not(None))
+        if not include and not exclude:
+            return query
+        # While every symptom id, recorded or asked for, is in 0..62 each bit
+        # stands for one symptom and the mask alone is exact; otherwise it only
+        # prefilters the key match (id 70 shares bit 7 with symptom 7)
+        exact = all(0 <= sid < 63 for sid in include + exclude) and (
+            db.session.scalar(db.select(db.func.max(Symptom.id))) or 0
+        ) < 63
+        if include:
+            required = CaseService.symptom_mask(include)
+            query = query.where(Case.symptom_mask.op("&")(required) == required)
+            if not exact:
+                for symptom_id in include:
+                    query = query.where(Case.symptom_key.like(f"%,{symptom_id},%"))
+        for symptom_id in exclude:
+            absent = Case.symptom_mask.op("&")(CaseService.symptom_mask([symptom_id])) == 0
+            if not exact:
+                absent = db.or_(absent, Case.symptom_key.not_like(f"%,{symptom_id},%"))
+            query = query.where(absent)
+        return query
+
+    @staticmethod
+    def count_with_symptoms(
+        include: Iterable[int] = (),
+        exclude: Iterable[int] = (),
+        filters: Optional[dict] = None,
+    ) -> int:
+        """Cases that have all of include and none of exclude; filters as in apply_filters."""
+        query = CaseService.apply_filters(db.select(db.func.count(Case.id)), filters or {})
+        return db.session.scalar(CaseService.apply_symptom_containment(query, include, exclude))
+
+    @staticmethod
+    def disease_counts_with_symptoms(
+        include: Iterable[int] = (),
+        exclude: Iterable[int] = (),
+        filters: Optional[dict] = None,
+    ) -> Dict[Optional[int], int]:
+        """Like count_with_symptoms, broken down by diagnosed disease id."""
+        query = CaseService.apply_filters(
+            db.select(Case.disease_id, db.func.count(Case.id)).group_by(Case.disease_id), filters or {}
+        )
+        return dict(db.session.execute(CaseService.apply_symptom_containment(query, include, exclude)).all())
+
+    @staticmethod
+    def top_symptom_combinations(
+        limit: int = 20,
+        include: Iterable[int] = (),
+        filters: Optional[dict] = None,
+    ) -> List[dict]:
+        """
+        Most frequent exact symptom sets, optionally only those containing
+        include. Groups on the indexed symptom_set_hash instead of joining
+        tbl_cases_symptoms. Each entry has symptom_ids, symptoms (names) and
+        case_count.
+        """
+        query = CaseService.apply_filters(
+            db.select(db.func.min(Case.symptom_key), db.func.count(Case.id).label("case_count"))
+            .group_by(Case.symptom_set_hash)
+            .order_by(db.desc("case_count"))
+            .limit(limit),
+            filters or {},
+        )
+        rows = db.session.execute(CaseService.apply_symptom_containment(query, include)).all()
+        combinations = [(CaseService.decode_symptom_key(key), count) for key, count in rows]
+        names = dict(db.session.execute(
+            db.select(Symptom.id, Symptom.name)
+            .where(Symptom.id.in_({sid for ids, _ in combinations for sid in ids}))
+        ).all())
+        return [
+            {
+                "symptom_ids": ids,
+                "symptoms": [names.get(sid, f"#{sid}") for sid in ids],
+                "case_count": count,
+            }
+            for ids, count in combinations
+        ]
+
+    @staticmethod
+    def backfill_symptom_keys(batch_size: int = 1_000) -> int:
+        """Fills symptom_key / symptom_set_hash on cases recorded before they existed."""
+        updated = 0
+        last_id = 0
+        while True:
+            case_ids = db.session.scalars(
+                db.select(Case.id)
+                .where(Case.id > last_id, Case.symptom_key.is_(None))
+                .order_by(Case.id)
+                .limit(batch_size)
+            ).all()
+            if not case_ids:
+                return updated
+            symptoms: Dict[int, List[int]] = {case_id: [] for case_id in case_ids}
+            for case_id, symptom_id in db.session.execute(
+                db.select(tbl_cases_symptoms.c.case_id, tbl_cases_symptoms.c.symptom_id)
+                .where(tbl_cases_symptoms.c.case_id.in_(case_ids))
+            ):
+                symptoms[case_id].append(symptom_id)
+            db.session.execute(db.update(Case), [
+                {"id": case_id, **CaseService.encode_symptom_set(symptom_ids)}
+                for case_id, symptom_ids in symptoms.items()
+            ])
+            db.session.commit()
+            updated += len(case_ids)
+            last_id = case_ids[-1]
@@ -0,0 +1,199 @@
+# app/services/idempotency_service.py
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from app.models.idempotency_key import IdempotencyKey
+from app.services.unit_of_work import UnitOfWork
+
+# Client keys: a form token or Idempotency-Key header, e.g. a UUID
+_CLIENT_KEY = re.compile(r"^[A-Za-z0-9_.:-]{1,100}$")
+
+# Expired keys are deleted at most this often per worker
+PURGE_INTERVAL_SECONDS = 60
+
+
+class DatabaseIdempotencyStore:
+    """
+    Keys in tbl_idempotency_keys, shared by every worker on the database.
+    The primary key makes the first insert the only successful claim, so
+    concurrent duplicates run once even when they land on different workers.
+    """
+
+    def __init__(self):
+        self._purged_at = 0.0
+
+    def claim(self, key: str, user_id: Optional[int], lease_seconds: float) -> Tuple[bool, Optional[dict]]:
+        """
+        (True, None) when this call claimed key; otherwise (False, response),
+        where response is None while the claimant is still running. A claim
+        whose lease ran out without completing can be taken over.
+        """
+        self._maybe_purge()
+        # Claims run on their own connection and commit straight away, so
+        # duplicates on other workers see them while the request's session
+        # (and whatever it has loaded) is left alone
+        for _ in range(3):
+            now = datetime.utcnow()
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(db.insert(IdempotencyKey), [{
+                        "key": key,
+                        "user_id": user_id,
+                        "created_at": now,
+                        "expires_at": now + timedelta(seconds=lease_seconds),
+                    }])
+                return True, None
+            except IntegrityError:
+                pass
+
+            with db.engine.begin() as connection:
+                existing = connection.execute(
+                    db.select(IdempotencyKey.response, IdempotencyKey.expires_at).where(IdempotencyKey.key == key)
+                ).first()
+                if existing is None:
+                    continue
+                if existing.expires_at > now:
+                    return False, json.loads(existing.response) if existing.response is not None else None
+                # Expired: delete it unless another request already replaced it, then retry
+                connection.execute(
+                    db.delete(IdempotencyKey).where(
+                        IdempotencyKey.key == key,
+                        IdempotencyKey.expires_at == existing.expires_at,
+                    )
+                )
+        return False, None
+
+    def complete(self, key: str, response: dict, ttl_seconds: float) -> None:
+        db.session.execute(
+            db.update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(
+                response=json.dumps(response),
+                expires_at=datetime.utcnow() + timedelta(seconds=ttl_seconds),
+            )
+        )
+        # With a unit of work this commits together with the submission's writes
+        UnitOfWork.commit()
+
+    def release(self, key: str) -> None:
+        # Called after a failed submission. The delete waits for the request's
+        # writes to be rolled back (SQLite would block on their lock meanwhile)
+        # and runs on its own connection, like the claim.
+        def delete_claim():
+            with db.engine.begin() as connection:
+                connection.execute(
+                    db.delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.response.is_(None))
+                )
+
+        UnitOfWork.after_rollback(delete_claim)
+
+    def _maybe_purge(self) -> None:
+        if time.monotonic() - self._purged_at < PURGE_INTERVAL_SECONDS:
+            return
+        self._purged_at = time.monotonic()
+        with db.engine.begin() as connection:
+            connection.execute(db.delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+
+
+class MemoryIdempotencyStore:
+    """
+    Per-process stand-in for DatabaseIdempotencyStore, for tests and single
+    worker setups. Duplicates that reach another worker are not caught.
+    """
+
+    def __init__(self):
+        # key -> (expires_at monotonic, JSON response or None while running)
+        self._entries: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+
+    def claim(self, key: str, user_id: Optional[int], lease_seconds: float) -> Tuple[bool, Optional[dict]]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._purged_at >= PURGE_INTERVAL_SECONDS:
+                self._purged_at = now
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            existing = self._entries.get(key)
+            if existing is not None and existing[0] > now:
+                return False, json.loads(existing[1]) if existing[1] is not None else None
+            self._entries[key] = (now + lease_seconds, None)
+            return True, None
+
+    def complete(self, key: str, response: dict, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, json.dumps(response))
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and existing[1] is None:
+                del self._entries[key]
+
+
+class IdempotencyService:
+    """
+    Runs a submission once per idempotency key. The first request with a key
+    claims it and stores its JSON-able result on completion; repeats within
+    IDEMPOTENCY_TTL_SECONDS get that result back instead of running again,
+    and repeats arriving while the first is still running wait for it.
+    """
+
+    @staticmethod
+    def get_store():
+        store = current_app.extensions.get("idempotency_store")
+        if store is None:
+            if current_app.config.get("IDEMPOTENCY_BACKEND", "database") == "memory":
+                store = MemoryIdempotencyStore()
+            else:
+                store = DatabaseIdempotencyStore()
+            store = current_app.extensions.setdefault("idempotency_store", store)
+        return store
+
+    @staticmethod
+    def scoped_key(scope: str, user_id: Optional[int], client_key: Optional[str], payload) -> Optional[str]:
+        """
+        Store key for a client key, or None when it is missing or malformed.
+        The JSON-able payload is part of the key, so reusing a key for a
+        different submission (e.g. a form changed after going back) runs it.
+        """
+        if not client_key or not _CLIENT_KEY.match(client_key):
+            return None
+        fingerprint = hashlib.blake2b(
+            json.dumps(payload, sort_keys=True).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        return f"{scope}:{user_id}:{client_key}:{fingerprint}"
+
+    @staticmethod
+    def begin(key: str, user_id: Optional[int]) -> Tuple[bool, Optional[dict]]:
+        """
+        (True, None) when the caller should run the submission and then call
+        complete or release; otherwise (False, stored response). The response
+        is None if the first submission did not finish within
+        IDEMPOTENCY_WAIT_SECONDS.
+        """
+        config = current_app.config
+        store = IdempotencyService.get_store()
+        deadline = time.monotonic() + config.get("IDEMPOTENCY_WAIT_SECONDS", 5)
+        while True:
+            claimed, response = store.claim(key, user_id, config.get("IDEMPOTENCY_LEASE_SECONDS", 60))
+            if claimed or response is not None or time.monotonic() >= deadline:
+                return claimed, response
+            time.sleep(0.1)
+
+    @staticmethod
+    def complete(key: str, response: dict) -> None:
+        IdempotencyService.get_store().complete(
+            key, response, current_app.config.get("IDEMPOTENCY_TTL_SECONDS", 600)
+        )
+
+    @staticmethod
+    def release(key: str) -> None:
+        """Gives up a claim after a failed submission so a retry can run."""
+        IdempotencyService.get_store().release(key)
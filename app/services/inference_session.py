@@ -0,0 +1,57 @@
+# app/services/inference_session.py
+import heapq
+from typing import Dict, Iterable, List, Set
+from app.services.knowledge_base_service import RuleScore, rank_key
+
+
+class InferenceSession:
+    """
+    Incremental inference state for one diagnose page. Ticking or unticking
+    a symptom only rescores the rules indexed under that symptom, so each
+    toggle costs O(affected rules) instead of a full run_inference.
+    """
+
+    def __init__(self, engine, symptom_ids: Iterable[int] = ()):
+        self.engine = engine
+        self.selected: Set[int] = set()
+        self.matched: Dict[int, int] = {}
+        self.scores: Dict[int, float] = {}
+        for symptom_id in symptom_ids:
+            self.add(symptom_id)
+
+    def _score(self, rule_id: int, matched: int) -> float:
+        rule = self.engine.kb.rules[rule_id]
+        # Same formula as the engines' score()
+        match_ratio = matched / len(rule.symptom_ids)
+        return min(match_ratio * (rule.confidence or 100.0), 100.0)
+
+    def add(self, symptom_id: int) -> None:
+        if symptom_id in self.selected:
+            return
+        self.selected.add(symptom_id)
+        for rule_id in self.engine.rules_for_symptom(symptom_id):
+            matched = self.matched.get(rule_id, 0) + 1
+            self.matched[rule_id] = matched
+            self.scores[rule_id] = self._score(rule_id, matched)
+
+    def remove(self, symptom_id: int) -> None:
+        if symptom_id not in self.selected:
+            return
+        self.selected.discard(symptom_id)
+        for rule_id in self.engine.rules_for_symptom(symptom_id):
+            matched = self.matched[rule_id] - 1
+            if matched:
+                self.matched[rule_id] = matched
+                self.scores[rule_id] = self._score(rule_id, matched)
+            else:
+                del self.matched[rule_id]
+                del self.scores[rule_id]
+
+    def top(self, k: int) -> List[RuleScore]:
+        rules = self.engine.kb.rules
+        best = heapq.nsmallest(
+            k,
+            self.scores.items(),
+            key=lambda item: rank_key(item[0], rules[item[0]].priority, item[1]),
+        )
+        return [(rule_id, self.matched[rule_id], confidence) for rule_id, confidence in best]
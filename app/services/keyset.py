@@ -0,0 +1,46 @@
+# app/services/keyset.py
+import base64
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from extensions import db
+
+
+def encode_cursor(row) -> str:
+    """Opaque cursor for the (created_at, id) position of row."""
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def filter_dates(query, column, filters: dict):
+    """Restricts column to filters' date_from and date_to (dates, both inclusive) when given."""
+    if filters.get("date_from") is not None:
+        query = query.where(column >= datetime.combine(filters["date_from"], datetime.min.time()))
+    if filters.get("date_to") is not None:
+        query = query.where(column < datetime.combine(filters["date_to"] + timedelta(days=1), datetime.min.time()))
+    return query
+
+
+def page(query, model, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """
+    Runs a select over model newest first from cursor on and returns up to
+    limit rows and the cursor of the next page (None on the last page).
+    Pages are keyed on (created_at, id), so each one is an index range scan
+    however deep it is. Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(db.tuple_(model.created_at, model.id) < (created_at, row_id))
+    rows = db.session.scalars(
+        query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    ).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,347 @@
+# app/services/knowledge_base_service.py
+import heapq
+import secrets
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from app.models.expert_system import Category, Disease, Rule, KnowledgeBaseVersion
+from app.models.associations import tbl_rules_symptoms
+from app.services.inference_cache import InferenceCache
+from app.services.unit_of_work import UnitOfWork
+
+# (rule_id, matched_count, confidence before rounding), ordered by rule_id
+RuleScore = Tuple[int, int, float]
+
+
+class CategoryRecord(NamedTuple):
+    id: int
+    name: str
+
+
+class DiseaseRecord(NamedTuple):
+    id: int
+    name: str
+    description: str
+    treatment: str
+    category: Optional[CategoryRecord]
+
+
+class RuleRecord(NamedTuple):
+    id: int
+    title: str
+    priority: int
+    confidence: float
+    disease_id: int
+    symptom_ids: Tuple[int, ...]
+
+
+class KnowledgeBase:
+    """
+    Lightweight read model of the rule base. Inference works from these
+    records instead of ORM objects, so ranking never lazy-loads anything.
+    """
+
+    def __init__(
+        self,
+        rules: Dict[int, RuleRecord],
+        diseases: Dict[int, DiseaseRecord],
+        version: int = 0,
+    ):
+        self.rules = rules
+        self.diseases = diseases
+        # Persisted KnowledgeBaseVersion this read model was loaded at
+        self.version = version
+
+    @classmethod
+    def load(cls) -> "KnowledgeBase":
+        """Loads rules, their symptom ids and their diseases in three queries."""
+        # Read the version first: a write racing the load can only make it look stale
+        version = KnowledgeBaseService.get_persisted_version()
+        symptom_ids: Dict[int, List[int]] = {}
+        for rule_id, symptom_id in db.session.execute(
+            db.select(tbl_rules_symptoms.c.rule_id, tbl_rules_symptoms.c.symptom_id)
+            .order_by(tbl_rules_symptoms.c.rule_id, tbl_rules_symptoms.c.symptom_id)
+        ):
+            symptom_ids.setdefault(rule_id, []).append(symptom_id)
+
+        rules = {
+            row.id: RuleRecord(
+                id=row.id,
+                title=row.title,
+                priority=row.priority,
+                confidence=row.confidence,
+                disease_id=row.disease_id,
+                symptom_ids=tuple(symptom_ids.get(row.id, ())),
+            )
+            for row in db.session.execute(
+                db.select(Rule.id, Rule.title, Rule.priority, Rule.confidence, Rule.disease_id)
+                .order_by(Rule.id)
+            )
+        }
+
+        diseases = {
+            row.id: DiseaseRecord(
+                id=row.id,
+                name=row.name,
+                description=row.description,
+                treatment=row.treatment,
+                category=CategoryRecord(row.category_id, row.category_name) if row.category_id else None,
+            )
+            for row in db.session.execute(
+                db.select(
+                    Disease.id,
+                    Disease.name,
+                    Disease.description,
+                    Disease.treatment,
+                    Category.id.label("category_id"),
+                    Category.name.label("category_name"),
+                ).outerjoin(Category, Disease.category_id == Category.id)
+            )
+        }
+        return cls(rules, diseases, version)
+
+
+def rank_key(rule_id: int, priority: int, confidence: float) -> Tuple[float, int, int]:
+    """Ranking order: highest rounded confidence, then lowest priority number, then rule id."""
+    return (-round(confidence, 2), priority, rule_id)
+
+
+class KnowledgeBaseIndex:
+    """
+    Compiled, read-only view of the rule base used by the inference engine.
+    Maps each symptom id to the rules that require it so a diagnosis only
+    touches rules sharing at least one selected symptom.
+    """
+
+    def __init__(
+        self,
+        kb: KnowledgeBase,
+        symptom_rules: Dict[int, List[int]],
+        required_counts: Dict[int, int],
+        confidences: Dict[int, float],
+        priorities: Dict[int, int],
+    ):
+        self.kb = kb
+        self.symptom_rules = symptom_rules
+        self.required_counts = required_counts
+        self.confidences = confidences
+        self.priorities = priorities
+        # Best score a rule can reach, i.e. with every required symptom matched
+        self.ceilings = {
+            rule_id: round(min(confidence or 100.0, 100.0), 2)
+            for rule_id, confidence in confidences.items()
+        }
+
+    @classmethod
+    def build(cls, kb: KnowledgeBase) -> "KnowledgeBaseIndex":
+        symptom_rules: Dict[int, List[int]] = {}
+        required_counts: Dict[int, int] = {}
+        for rule in kb.rules.values():
+            for symptom_id in rule.symptom_ids:
+                symptom_rules.setdefault(symptom_id, []).append(rule.id)
+            required_counts[rule.id] = len(rule.symptom_ids)
+        return cls(
+            kb,
+            symptom_rules,
+            required_counts,
+            {rule.id: rule.confidence for rule in kb.rules.values()},
+            {rule.id: rule.priority for rule in kb.rules.values()},
+        )
+
+    def match(self, symptom_ids: Iterable[int]) -> Dict[int, int]:
+        """Returns {rule_id: matched_count} for every rule sharing a symptom."""
+        matched: Dict[int, int] = {}
+        for symptom_id in set(symptom_ids):
+            for rule_id in self.symptom_rules.get(symptom_id, ()):
+                matched[rule_id] = matched.get(rule_id, 0) + 1
+        return matched
+
+    def rules_for_symptom(self, symptom_id: int) -> List[int]:
+        return self.symptom_rules.get(symptom_id, [])
+
+    def score(self, symptom_ids: Iterable[int]) -> List[RuleScore]:
+        scores = []
+        for rule_id, matched in sorted(self.match(symptom_ids).items()):
+            # Calculate confidence (Match / Total Required)
+            match_ratio = matched / self.required_counts[rule_id]
+            weighted = match_ratio * (self.confidences[rule_id] or 100.0)
+            scores.append((rule_id, matched, min(weighted, 100.0)))
+        return scores
+
+    def top_k(self, symptom_ids: Iterable[int], k: int) -> List[RuleScore]:
+        """
+        Returns the k best scores in ranking order using a bounded min-heap.
+        A rule whose confidence ceiling is below the current k-th best score
+        cannot enter the heap, so its score is never computed.
+        """
+        heap = []
+        for rule_id, matched in self.match(symptom_ids).items():
+            if len(heap) == k and self.ceilings[rule_id] < heap[0][0]:
+                continue
+            match_ratio = matched / self.required_counts[rule_id]
+            confidence = min(match_ratio * (self.confidences[rule_id] or 100.0), 100.0)
+            # Heap root is the worst entry: lowest score, then highest priority number and id
+            entry = (round(confidence, 2), -self.priorities[rule_id], -rule_id, matched, confidence)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        heap.sort(reverse=True)
+        return [(-neg_rule_id, matched, confidence) for _, _, neg_rule_id, matched, confidence in heap]
+
+
+def build_engine(kb: KnowledgeBase, backend: str = "index"):
+    """Compiles kb into the engine for backend ("index" or "numpy")."""
+    if backend == "numpy":
+        from app.services.matrix_engine import IncidenceMatrixEngine
+        return IncidenceMatrixEngine.build(kb)
+    if backend != "index":
+        raise ValueError(f"Unknown INFERENCE_BACKEND: {backend}")
+    return KnowledgeBaseIndex.build(kb)
+
+
+class KnowledgeBaseService:
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _build_engine(kb: KnowledgeBase):
+        return build_engine(kb, current_app.config.get("INFERENCE_BACKEND", "index"))
+
+    @staticmethod
+    def _load_and_snapshot() -> KnowledgeBase:
+        kb = KnowledgeBase.load()
+        path = current_app.config.get("KNOWLEDGE_BASE_SNAPSHOT_PATH")
+        if path:
+            from app.services.knowledge_base_snapshot import write_snapshot
+            try:
+                write_snapshot(kb, path)
+            except OSError as exc:
+                current_app.logger.warning("Could not write knowledge-base snapshot: %s", exc)
+        return kb
+
+    @staticmethod
+    def _install(engine) -> None:
+        current_app.extensions["knowledge_base"] = engine
+        current_app.extensions["knowledge_base_checked_at"] = time.monotonic()
+
+    @staticmethod
+    def warm_start() -> None:
+        """
+        Installs the compiled engine at boot. The snapshot file is used when its
+        version header matches tbl_kb_version; otherwise the knowledge base is
+        loaded from the database and the snapshot is rewritten.
+        """
+        if db.session.scalar(db.select(KnowledgeBaseVersion.id).limit(1)) is None:
+            try:
+                KnowledgeBaseService._create_version_row()
+                db.session.commit()
+            except IntegrityError:
+                # Another worker booting at the same time created it first
+                db.session.rollback()
+
+        path = current_app.config.get("KNOWLEDGE_BASE_SNAPSHOT_PATH")
+        kb = None
+        if path:
+            from app.services.knowledge_base_snapshot import read_snapshot
+            kb = read_snapshot(path)
+        if kb is None or kb.version != KnowledgeBaseService.get_persisted_version():
+            kb = KnowledgeBaseService._load_and_snapshot()
+        with KnowledgeBaseService._lock:
+            KnowledgeBaseService._install(KnowledgeBaseService._build_engine(kb))
+
+    @staticmethod
+    def get_engine():
+        """Returns the compiled engine for the current app, building it on first use."""
+        engine = current_app.extensions.get("knowledge_base")
+        if engine is None:
+            with KnowledgeBaseService._lock:
+                engine = current_app.extensions.get("knowledge_base")
+                if engine is None:
+                    engine = KnowledgeBaseService._build_engine(KnowledgeBaseService._load_and_snapshot())
+                    KnowledgeBaseService._install(engine)
+        return engine
+
+    @staticmethod
+    def check_for_updates() -> None:
+        """
+        Drops the engine if another worker has written to the knowledge base.
+        Those writes only show up in tbl_kb_version, which is polled at most
+        once per KNOWLEDGE_BASE_REFRESH_SECONDS.
+        """
+        engine = current_app.extensions.get("knowledge_base")
+        interval = current_app.config.get("KNOWLEDGE_BASE_REFRESH_SECONDS", 0)
+        checked_at = current_app.extensions.get("knowledge_base_checked_at", 0.0)
+        if engine is None or not interval or time.monotonic() - checked_at < interval:
+            return
+        current_app.extensions["knowledge_base_checked_at"] = time.monotonic()
+        if KnowledgeBaseService.get_persisted_version() != engine.kb.version:
+            current_app.extensions.pop("knowledge_base", None)
+            KnowledgeBaseService._bump_local_version()
+
+    @staticmethod
+    def get_cache() -> InferenceCache:
+        cache = current_app.extensions.get("inference_cache")
+        if cache is None:
+            with KnowledgeBaseService._lock:
+                cache = current_app.extensions.get("inference_cache")
+                if cache is None:
+                    cache = InferenceCache(current_app.config.get("INFERENCE_CACHE_SIZE", 1024))
+                    current_app.extensions["inference_cache"] = cache
+        return cache
+
+    @staticmethod
+    def get_live_sessions() -> InferenceCache:
+        """Per-worker LRU of incremental diagnose-page sessions."""
+        sessions = current_app.extensions.get("inference_sessions")
+        if sessions is None:
+            with KnowledgeBaseService._lock:
+                sessions = current_app.extensions.get("inference_sessions")
+                if sessions is None:
+                    sessions = InferenceCache(current_app.config.get("DIAGNOSIS_LIVE_SESSIONS", 256))
+                    current_app.extensions["inference_sessions"] = sessions
+        return sessions
+
+    @staticmethod
+    def get_version() -> int:
+        """In-process stamp used to key the inference cache."""
+        return current_app.extensions.get("knowledge_base_version", 0)
+
+    @staticmethod
+    def get_persisted_version() -> int:
+        version = db.session.scalar(db.select(KnowledgeBaseVersion.version).limit(1))
+        return version or 0
+
+    @staticmethod
+    def _bump_local_version() -> None:
+        with KnowledgeBaseService._lock:
+            current_app.extensions["knowledge_base_version"] = KnowledgeBaseService.get_version() + 1
+
+    @staticmethod
+    def bump_version() -> None:
+        """
+        Marks every cached inference result and the snapshot file as stale.
+        The persisted counter changes in the caller's transaction; this
+        worker's cache stamp moves once that transaction has committed.
+        """
+        updated = db.session.execute(
+            db.update(KnowledgeBaseVersion).values(version=KnowledgeBaseVersion.version + 1)
+        ).rowcount
+        if not updated:
+            KnowledgeBaseService._create_version_row()
+        UnitOfWork.commit()
+        UnitOfWork.after_commit(KnowledgeBaseService._bump_local_version)
+
+    @staticmethod
+    def _create_version_row() -> None:
+        # Start from a random value so a snapshot written against a dropped and
+        # recreated database can never match the new version counter.
+        db.session.add(KnowledgeBaseVersion(id=1, version=secrets.randbits(31)))
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drops the compiled engine after the caller's writes commit; the next inference rebuilds it."""
+        UnitOfWork.after_commit(lambda: current_app.extensions.pop("knowledge_base", None))
+        KnowledgeBaseService.bump_version()
@@ -0,0 +1,147 @@
+# app/services/knowledge_base_snapshot.py
+"""
+Compiled knowledge-base snapshot so workers can start without querying the
+rule tables. Layout (native byte order, 8-byte items):
+
+    header       magic, kb version, #symptoms, #rules, #links, #diseases, #text bytes
+    symptom_ids  int64[#symptoms]
+    rule_ids, rule_disease_ids, rule_priorities            int64[#rules]
+    rule_confidences                                       float64[#rules]
+    rule_indptr  int64[#rules + 1]   CSR row offsets into rule_columns
+    rule_columns int64[#links]       indices into symptom_ids
+    disease_ids, disease_category_ids (0 = none)           int64[#diseases]
+    text         UTF-8 JSON with rule titles and disease/category text
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from typing import Optional
+from app.services.knowledge_base_service import (
+    CategoryRecord,
+    DiseaseRecord,
+    KnowledgeBase,
+    RuleRecord,
+)
+
+MAGIC = b"IDNSKB01"
+HEADER = struct.Struct("=8sqqqqqq")
+
+
+def write_snapshot(kb: KnowledgeBase, path: str) -> None:
+    """Writes kb to path atomically, so readers never see a partial file."""
+    rules = sorted(kb.rules.values(), key=lambda r: r.id)
+    diseases = sorted(kb.diseases.values(), key=lambda d: d.id)
+
+    symptom_ids = sorted({sid for rule in rules for sid in rule.symptom_ids})
+    columns = {sid: i for i, sid in enumerate(symptom_ids)}
+    indptr = [0]
+    rule_columns = []
+    for rule in rules:
+        rule_columns.extend(columns[sid] for sid in rule.symptom_ids)
+        indptr.append(len(rule_columns))
+
+    text = json.dumps({
+        "rule_titles": [rule.title for rule in rules],
+        "diseases": [
+            [d.name, d.description, d.treatment, d.category.name if d.category else None]
+            for d in diseases
+        ],
+    }).encode("utf-8")
+
+    sections = [
+        array("q", symptom_ids),
+        array("q", [rule.id for rule in rules]),
+        array("q", [rule.disease_id for rule in rules]),
+        array("q", [rule.priority for rule in rules]),
+        array("d", [rule.confidence for rule in rules]),
+        array("q", indptr),
+        array("q", rule_columns),
+        array("q", [d.id for d in diseases]),
+        array("q", [d.category.id if d.category else 0 for d in diseases]),
+    ]
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".kb-snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(
+                MAGIC, kb.version, len(symptom_ids), len(rules),
+                len(rule_columns), len(diseases), len(text),
+            ))
+            for section in sections:
+                section.tofile(f)
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot(path: str) -> Optional[KnowledgeBase]:
+    """Returns the snapshot at path, or None if it is missing or unreadable."""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse(mm)
+    except (OSError, ValueError, struct.error, KeyError, IndexError):
+        return None
+
+
+def _parse(mm) -> Optional[KnowledgeBase]:
+    magic, version, n_symptoms, n_rules, n_links, n_diseases, n_text = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        return None
+
+    offset = HEADER.size
+    view = memoryview(mm)
+
+    def take(fmt, count):
+        nonlocal offset
+        end = offset + 8 * count
+        if end > len(mm):
+            raise ValueError("truncated knowledge-base snapshot")
+        with view[offset:end].cast(fmt) as items:
+            values = items.tolist()
+        offset = end
+        return values
+
+    try:
+        symptom_ids = take("q", n_symptoms)
+        rule_ids = take("q", n_rules)
+        rule_disease_ids = take("q", n_rules)
+        rule_priorities = take("q", n_rules)
+        rule_confidences = take("d", n_rules)
+        indptr = take("q", n_rules + 1)
+        rule_columns = take("q", n_links)
+        disease_ids = take("q", n_diseases)
+        category_ids = take("q", n_diseases)
+        text = json.loads(bytes(view[offset:offset + n_text]).decode("utf-8"))
+    finally:
+        view.release()
+
+    rules = {
+        rule_id: RuleRecord(
+            id=rule_id,
+            title=text["rule_titles"][i],
+            priority=rule_priorities[i],
+            confidence=rule_confidences[i],
+            disease_id=rule_disease_ids[i],
+            symptom_ids=tuple(symptom_ids[c] for c in rule_columns[indptr[i]:indptr[i + 1]]),
+        )
+        for i, rule_id in enumerate(rule_ids)
+    }
+    diseases = {}
+    for i, disease_id in enumerate(disease_ids):
+        name, description, treatment, category_name = text["diseases"][i]
+        diseases[disease_id] = DiseaseRecord(
+            id=disease_id,
+            name=name,
+            description=description,
+            treatment=treatment,
+            category=CategoryRecord(category_ids[i], category_name) if category_ids[i] else None,
+        )
+    return KnowledgeBase(rules, diseases, version)
@@ -0,0 +1,115 @@
+# app/services/matrix_engine.py
+from typing import Iterable, List
+import numpy as np
+from app.services.knowledge_base_service import KnowledgeBase, RuleScore, rank_key
+
+
+class IncidenceMatrixEngine:
+    """
+    Vectorized inference backend (INFERENCE_BACKEND = "numpy").
+
+    tbl_rules_symptoms is compiled into a CSR rule x symptom incidence matrix
+    with rule ids, required counts and confidences held in parallel arrays.
+    Matched counts for every rule come from one sparse matrix-vector product
+    against the 0/1 vector of selected symptoms.
+    """
+
+    def __init__(self, kb, rule_ids, indptr, indices, symptom_columns, required, confidences, priorities):
+        self.kb = kb
+        self.rule_ids = rule_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.symptom_columns = symptom_columns
+        self.required = required
+        self.confidences = confidences
+        self.priorities = priorities
+        # Column-major (CSC) copy of the incidence for per-symptom lookups
+        rows = np.repeat(np.arange(len(rule_ids), dtype=np.int64), required)
+        order = np.argsort(indices, kind="stable")
+        self.column_rows = rows[order]
+        self.column_indptr = np.searchsorted(
+            indices[order], np.arange(len(symptom_columns) + 1, dtype=np.int64)
+        )
+
+    @classmethod
+    def build(cls, kb: KnowledgeBase) -> "IncidenceMatrixEngine":
+        # Rules without symptoms can never match and get no row
+        rules = [rule for rule in kb.rules.values() if rule.symptom_ids]
+
+        indptr = [0]
+        indices: List[int] = []
+        symptom_columns = {}
+        for rule in rules:
+            for symptom_id in rule.symptom_ids:
+                indices.append(symptom_columns.setdefault(symptom_id, len(symptom_columns)))
+            indptr.append(len(indices))
+
+        indptr_arr = np.asarray(indptr, dtype=np.int64)
+        return cls(
+            kb=kb,
+            rule_ids=np.asarray([rule.id for rule in rules], dtype=np.int64),
+            indptr=indptr_arr,
+            indices=np.asarray(indices, dtype=np.int64),
+            symptom_columns=symptom_columns,
+            required=np.diff(indptr_arr),
+            confidences=np.asarray([rule.confidence or 100.0 for rule in rules], dtype=np.float64),
+            priorities=np.asarray([rule.priority for rule in rules], dtype=np.int64),
+        )
+
+    def _match(self, symptom_ids: Iterable[int]):
+        """Returns (hit rows, matched counts, confidences) for rules with any match."""
+        if not len(self.rule_ids):
+            return None
+        columns = [self.symptom_columns[s] for s in set(symptom_ids) if s in self.symptom_columns]
+        if not columns:
+            return None
+        selected = np.zeros(len(self.symptom_columns), dtype=np.int64)
+        selected[columns] = 1
+
+        # CSR SpMV: every compiled rule has at least one symptom, so no row is empty
+        matched = np.add.reduceat(selected[self.indices], self.indptr[:-1])
+        hit = np.flatnonzero(matched)
+        confidence = np.minimum(
+            matched[hit] / self.required[hit] * self.confidences[hit],
+            100.0,
+        )
+        return hit, matched[hit], confidence
+
+    def score(self, symptom_ids: Iterable[int]) -> List[RuleScore]:
+        match = self._match(symptom_ids)
+        if match is None:
+            return []
+        hit, matched, confidence = match
+        return list(zip(
+            self.rule_ids[hit].tolist(),
+            matched.tolist(),
+            confidence.tolist(),
+        ))
+
+    def top_k(self, symptom_ids: Iterable[int], k: int) -> List[RuleScore]:
+        match = self._match(symptom_ids)
+        if match is None:
+            return []
+        hit, matched, confidence = match
+        if len(hit) > k:
+            # Keep everything that could tie with the k-th best after rounding to 2 places
+            threshold = np.partition(confidence, len(confidence) - k)[len(confidence) - k]
+            keep = confidence >= threshold - 0.01
+            hit, matched, confidence = hit[keep], matched[keep], confidence[keep]
+        ranked = sorted(
+            zip(
+                self.rule_ids[hit].tolist(),
+                matched.tolist(),
+                confidence.tolist(),
+                self.priorities[hit].tolist(),
+            ),
+            key=lambda row: rank_key(row[0], row[3], row[2]),
+        )
+        return [(rule_id, count, score) for rule_id, count, score, _ in ranked[:k]]
+
+    def rules_for_symptom(self, symptom_id: int) -> List[int]:
+        column = self.symptom_columns.get(symptom_id)
+        if column is None:
+            return []
+        rows = self.column_rows[self.column_indptr[column]:self.column_indptr[column + 1]]
+        return self.rule_ids[rows].tolist()
@@ -0,0 +1,259 @@
+# app/services/outbreak_service.py
+import calendar
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import current_app
+from extensions import db
+from app.models.expert_system import Case
+from app.services.knowledge_base_service import KnowledgeBaseService
+
+# ("disease" | "category", id)
+Key = Tuple[str, int]
+
+
+def bucket_of(when: datetime, bucket_seconds: int) -> int:
+    """Index of the bucket holding a naive UTC datetime."""
+    return calendar.timegm(when.utctimetuple()) // bucket_seconds
+
+
+class SlidingWindow:
+    """
+    Case counts for one disease or category in a ring of time buckets.
+
+    The newest window_buckets buckets form the recent window; the
+    baseline_buckets before them form the baseline. Both sums are kept
+    up to date as buckets are added and expired, so recording a case and
+    reading the counts are O(1) amortized.
+    """
+
+    __slots__ = ("window_buckets", "size", "counts", "head", "recent", "baseline")
+
+    def __init__(self, window_buckets: int, baseline_buckets: int):
+        self.window_buckets = window_buckets
+        self.size = window_buckets + baseline_buckets
+        self.counts = [0] * self.size
+        self.head: Optional[int] = None
+        self.recent = 0
+        self.baseline = 0
+
+    def advance(self, bucket: int) -> None:
+        """Moves the newest bucket forward to bucket, expiring what falls out."""
+        if self.head is None or bucket - self.head >= self.size:
+            self.counts = [0] * self.size
+            self.recent = self.baseline = 0
+            self.head = bucket
+            return
+        while self.head < bucket:
+            self.head += 1
+            # The bucket leaving the recent window joins the baseline...
+            moved = self.counts[(self.head - self.window_buckets) % self.size]
+            self.recent -= moved
+            self.baseline += moved
+            # ...and the slot being reused held the oldest baseline bucket
+            slot = self.head % self.size
+            self.baseline -= self.counts[slot]
+            self.counts[slot] = 0
+
+    def add(self, bucket: int, count: int = 1) -> None:
+        if self.head is None or bucket > self.head:
+            self.advance(bucket)
+        age = self.head - bucket
+        if age >= self.size:
+            return
+        self.counts[bucket % self.size] += count
+        if age < self.window_buckets:
+            self.recent += count
+        else:
+            self.baseline += count
+
+
+class OutbreakDetector:
+    """
+    Per-worker sliding-window case rates per disease and per category.
+
+    A key is anomalous when its recent window holds at least min_cases
+    cases and sits z_threshold Poisson standard deviations above what its
+    baseline rate predicts for a window of that length.
+    """
+
+    def __init__(self, bucket_seconds: int, window_buckets: int, baseline_buckets: int,
+                 min_cases: int, z_threshold: float):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.baseline_buckets = baseline_buckets
+        self.min_cases = min_cases
+        self.z_threshold = z_threshold
+        self.windows: Dict[Key, SlidingWindow] = {}
+        self.synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # (key, bucket, count) recorded since begin_sync, while a resync runs
+        self._journal: Optional[List[Tuple[Key, int, int]]] = None
+
+    def record(self, key: Key, when: datetime, count: int = 1) -> None:
+        bucket = bucket_of(when, self.bucket_seconds)
+        with self._lock:
+            self._add(self.windows, key, bucket, count)
+            if self._journal is not None:
+                self._journal.append((key, bucket, count))
+
+    def _add(self, windows: Dict[Key, SlidingWindow], key: Key, bucket: int, count: int) -> None:
+        window = windows.get(key)
+        if window is None:
+            window = windows[key] = SlidingWindow(self.window_buckets, self.baseline_buckets)
+        window.add(bucket, count)
+
+    def begin_sync(self) -> bool:
+        """
+        Starts keeping the cases recorded from now on, so that replace() can
+        carry them over into state read from the database after this call.
+        Returns False, changing nothing, if another resync is under way.
+        """
+        with self._lock:
+            if self._journal is not None:
+                return False
+            self._journal = []
+            return True
+
+    def cancel_sync(self) -> None:
+        with self._lock:
+            self._journal = None
+
+    def replace(self, counts: Iterable[Tuple[Key, int, int]]) -> None:
+        """
+        Swaps in fresh state from (key, bucket, count) triples, plus the
+        cases recorded since begin_sync, which the triples may not include.
+        """
+        windows: Dict[Key, SlidingWindow] = {}
+        for key, bucket, count in counts:
+            self._add(windows, key, bucket, count)
+        with self._lock:
+            for key, bucket, count in self._journal or ():
+                self._add(windows, key, bucket, count)
+            self._journal = None
+            self.windows = windows
+            self.synced_at = time.monotonic()
+
+    def stats(self, now: datetime) -> List[dict]:
+        """Recent and expected counts for every key, anomalies flagged."""
+        bucket = bucket_of(now, self.bucket_seconds)
+        out = []
+        with self._lock:
+            for (dimension, key_id), window in self.windows.items():
+                window.advance(bucket)
+                expected = window.baseline * self.window_buckets / self.baseline_buckets
+                z = (window.recent - expected) / math.sqrt(max(expected, 1.0))
+                out.append({
+                    "dimension": dimension,
+                    "id": key_id,
+                    "recent": window.recent,
+                    "baseline": window.baseline,
+                    "expected": round(expected, 2),
+                    "ratio": round(window.recent / expected, 2) if expected else None,
+                    "z": round(z, 2),
+                    "anomalous": window.recent >= self.min_cases and z >= self.z_threshold,
+                })
+        out.sort(key=lambda s: (-s["z"], s["dimension"], s["id"]))
+        return out
+
+
+class OutbreakService:
+    @staticmethod
+    def get_detector() -> OutbreakDetector:
+        detector = current_app.extensions.get("outbreak_detector")
+        if detector is None:
+            config = current_app.config
+            bucket_seconds = int(config.get("OUTBREAK_BUCKET_MINUTES", 60) * 60)
+            detector = current_app.extensions.setdefault("outbreak_detector", OutbreakDetector(
+                bucket_seconds=bucket_seconds,
+                window_buckets=max(1, round(config.get("OUTBREAK_WINDOW_HOURS", 6) * 3600 / bucket_seconds)),
+                baseline_buckets=max(1, round(config.get("OUTBREAK_BASELINE_DAYS", 7) * 86400 / bucket_seconds)),
+                min_cases=config.get("OUTBREAK_MIN_CASES", 5),
+                z_threshold=config.get("OUTBREAK_Z_THRESHOLD", 3.0),
+            ))
+        return detector
+
+    @staticmethod
+    def record(rows: Iterable[Tuple[int, datetime]]) -> None:
+        """Counts (disease_id, created_at) pairs for freshly recorded cases."""
+        detector = OutbreakService.get_detector()
+        diseases = KnowledgeBaseService.get_engine().kb.diseases
+        for disease_id, created_at in rows:
+            detector.record(("disease", disease_id), created_at)
+            disease = diseases.get(disease_id)
+            if disease is not None and disease.category is not None:
+                detector.record(("category", disease.category.id), created_at)
+
+    @staticmethod
+    def sync() -> None:
+        """
+        Rebuilds the counters from tbl_cases with one grouped query over the
+        baseline and window span. Each worker only sees the cases it records
+        itself, so this picks up those of other workers. Cases this worker
+        records while the query runs are carried over rather than dropped.
+        """
+        detector = OutbreakService.get_detector()
+        if not detector.begin_sync():
+            # Another thread is resyncing; the current counts stay in use
+            return
+        try:
+            counts = OutbreakService._read_counts(detector)
+        except Exception:
+            detector.cancel_sync()
+            raise
+        detector.replace(counts)
+
+    @staticmethod
+    def _read_counts(detector: OutbreakDetector) -> List[Tuple[Key, int, int]]:
+        """(key, bucket, count) triples for the cases in the detector's span."""
+        span = detector.window_buckets + detector.baseline_buckets
+        since_bucket = bucket_of(datetime.utcnow(), detector.bucket_seconds) - span + 1
+        since = datetime.utcfromtimestamp(since_bucket * detector.bucket_seconds)
+
+        if db.session.get_bind().dialect.name == "postgresql":
+            epoch = db.cast(db.func.floor(db.extract("epoch", Case.created_at)), db.BigInteger)
+        else:
+            epoch = db.cast(db.func.strftime("%s", Case.created_at), db.Integer)
+        bucket = (epoch // detector.bucket_seconds).label("bucket")
+        rows = db.session.execute(
+            db.select(Case.disease_id, bucket, db.func.count())
+            .where(Case.created_at >= since, Case.disease_id.is_not(None))
+            .group_by(Case.disease_id, bucket)
+        ).all()
+
+        diseases = KnowledgeBaseService.get_engine().kb.diseases
+        counts = []
+        for disease_id, bucket_index, count in rows:
+            counts.append((("disease", disease_id), int(bucket_index), count))
+            disease = diseases.get(disease_id)
+            if disease is not None and disease.category is not None:
+                counts.append((("category", disease.category.id), int(bucket_index), count))
+        return counts
+
+    @staticmethod
+    def report(include_all: bool = False) -> dict:
+        """Current anomalies (or every tracked key), resyncing first when due."""
+        detector = OutbreakService.get_detector()
+        interval = current_app.config.get("OUTBREAK_RESYNC_SECONDS", 300)
+        if detector.synced_at is None or (interval and time.monotonic() - detector.synced_at >= interval):
+            OutbreakService.sync()
+
+        kb = KnowledgeBaseService.get_engine().kb
+        names = {("disease", d.id): d.name for d in kb.diseases.values()}
+        names.update({("category", d.category.id): d.category.name for d in kb.diseases.values() if d.category})
+        now = datetime.utcnow()
+        entries = [
+            {**entry, "name": names.get((entry["dimension"], entry["id"]), f"#{entry['id']}")}
+            for entry in detector.stats(now)
+            if include_all or entry["anomalous"]
+        ]
+        return {
+            "generated_at": now.isoformat(timespec="seconds"),
+            "window_hours": detector.window_buckets * detector.bucket_seconds / 3600,
+            "baseline_hours": detector.baseline_buckets * detector.bucket_seconds / 3600,
+            "min_cases": detector.min_cases,
+            "z_threshold": detector.z_threshold,
+            "entries": entries,
+        }
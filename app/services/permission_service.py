@@ -1,6 +1,7 @@
 # app/service/permission_service.py
 from typing import List, Optional
 from app.models.permission import PermissionTable
+from app.services.unit_of_work import UnitOfWork
 from extensions import db
 
 class PermissionService:
@@ -21,7 +22,7 @@ class PermissionService:
             description=data.get("description") or "",
         )
         db.session.add(perm)
-        db.session.commit()
+        UnitOfWork.commit()
         return perm
     
     @staticmethod
@@ -34,11 +35,11 @@ class PermissionService:
         permission.module = data.get("module", "General")
         permission.description = data.get("description") or ""
         
-        db.session.commit()
+        UnitOfWork.commit()
         return permission
     
     @staticmethod
     def delete_permission(permission: PermissionTable) -> None:
         db.session.delete(permission)
-        db.session.commit()
+        UnitOfWork.commit()
         
\ No newline at end of file
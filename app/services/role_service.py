@@ -2,6 +2,7 @@
 from typing import List, Optional
 from app.models.role import RoleTable
 from app.models.permission import PermissionTable
+from app.services.unit_of_work import UnitOfWork
 from extensions import db
 
 class RoleService:
@@ -32,7 +33,7 @@ class RoleService:
             role.permissions = list(permissions)
             
         db.session.add(role)
-        db.session.commit()
+        UnitOfWork.commit()
         return role
     
     @staticmethod
@@ -54,10 +55,10 @@ class RoleService:
                 ).all()
             role.permissions = list(perms)
         
-        db.session.commit()
+        UnitOfWork.commit()
         return role
     
     @staticmethod
     def delete_role(role: RoleTable) -> None:
         db.session.delete(role)
-        db.session.commit()
\ No newline at end of file
+        UnitOfWork.commit()
\ No newline at end of file
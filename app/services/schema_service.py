@@ -0,0 +1,71 @@
+# app/services/schema_service.py
+from typing import List
+from sqlalchemy.schema import CreateIndex
+from extensions import db
+
+
+class SchemaService:
+    """
+    Brings an existing database up to the models. create_all() at startup
+    only creates missing tables; columns, indexes, the audit search index
+    and audit log partitions added since are applied here, by
+    'flask db upgrade' run once per deploy rather than by every worker as
+    it boots. On Postgres, indexes are built CONCURRENTLY so the tables
+    stay writable meanwhile.
+    """
+
+    @staticmethod
+    def missing_columns() -> List[str]:
+        """"table.column" for each model column the database does not have yet."""
+        inspector = db.inspect(db.engine)
+        missing = []
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            missing.extend(f"{table.name}.{column.name}" for column in table.columns if column.name not in existing)
+        return missing
+
+    @staticmethod
+    def upgrade() -> List[str]:
+        """Applies what is missing; returns a line per change."""
+        from app.services.audit_retention_service import AuditRetentionService
+        from app.services.audit_search_service import AuditSearchService
+
+        changes = []
+        db.create_all()
+        inspector = db.inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    db.session.execute(db.text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                        f"{column.type.compile(db.engine.dialect)}"
+                    ))
+                    changes.append(f"added column {table.name}.{column.name}")
+        db.session.commit()
+
+        postgres = db.engine.dialect.name == "postgresql"
+        partitioned = AuditRetentionService.is_partitioned()
+        db.session.commit()
+        for table in db.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                if postgres and not (partitioned and table.name == "tbl_audit_logs"):
+                    # CONCURRENTLY cannot run in a transaction (nor on a partitioned table)
+                    index.dialect_kwargs["postgresql_concurrently"] = True
+                    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                        connection.execute(CreateIndex(index, if_not_exists=True))
+                else:
+                    index.create(db.engine, checkfirst=True)
+                changes.append(f"created index {index.name}")
+
+        backend = AuditSearchService.install()
+        changes.append(f"audit search: {backend}")
+        if partitioned:
+            months = AuditRetentionService.ensure_partitions()
+            changes.extend(f"created audit log partition {month:%Y-%m}" for month in months)
+        return changes
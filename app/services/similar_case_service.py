@@ -0,0 +1,291 @@
+# app/services/similar_case_service.py
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from flask import current_app
+from extensions import db
+from app.models.expert_system import Case, Disease
+from app.models.associations import tbl_cases_symptoms
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime for the (a * x + b) mod p hash family
+_PRIME = (1 << 61) - 1
+
+
+class MinHashLSH:
+    """
+    MinHash signatures of symptom-id sets, banded for locality-sensitive
+    lookup. Two sets share a bucket in at least one band with probability
+    1 - (1 - J^rows)^bands for Jaccard similarity J, so similar cases are
+    found by looking at a few buckets instead of every case. Only band
+    buckets are kept (case ids per bucket); exact similarity is computed
+    by the caller on the candidates.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = random.Random(seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hashes = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+
+    def signature(self, symptom_ids: Iterable[int]) -> List[int]:
+        ids = set(symptom_ids)
+        return [min((a * x + b) % _PRIME for x in ids) for a, b in self._hashes]
+
+    def band_keys(self, symptom_ids: Iterable[int]) -> List[Tuple[int, int]]:
+        signature = self.signature(symptom_ids)
+        return [
+            (band, hash(tuple(signature[band * self.rows:(band + 1) * self.rows])))
+            for band in range(self.bands)
+        ]
+
+    def add(self, case_id: int, band_keys: Sequence[Tuple[int, int]]) -> None:
+        """Adds a case under the band_keys of its symptom set (none for an empty set)."""
+        for key in band_keys:
+            self._buckets[key].append(case_id)
+
+    def discard(self, case_ids: Set[int], band_keys: Iterable[Tuple[int, int]]) -> None:
+        """Removes case_ids from the buckets under band_keys."""
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            bucket[:] = [case_id for case_id in bucket if case_id not in case_ids]
+            if not bucket:
+                del self._buckets[key]
+
+    def candidates(self, symptom_ids: Sequence[int], limit: int) -> Dict[int, int]:
+        """
+        Case ids sharing at least one band with symptom_ids, mapped to the
+        number of shared bands. Each bucket contributes at most limit ids,
+        newest first, so very common symptom sets stay cheap to query.
+        """
+        if not symptom_ids:
+            return {}
+        hits: Dict[int, int] = defaultdict(int)
+        for key in self.band_keys(symptom_ids):
+            bucket = self._buckets.get(key)
+            if bucket:
+                for case_id in bucket[-limit:]:
+                    hits[case_id] += 1
+        return hits
+
+
+class SimilarCaseIndex:
+    """
+    Per-worker MinHashLSH over recorded cases, kept by a background thread.
+
+    The thread starts with the worker's first similar-case query, builds
+    the index from tbl_cases_symptoms and then, every refresh_seconds,
+    indexes the cases added since: those with an id above the watermark of
+    the sync before last, so a case whose insert committed up to one
+    interval after its id was handed out is still picked up. Only the ids
+    indexed in that range are remembered, to skip them on the next pass.
+    Cases this worker records are added as they are written.
+
+    Cases this worker archives are removed as they go; archived or deleted
+    cases found among a query's candidates are dropped from the buckets that
+    query read, so other workers' indexes shed them as they are hit. Until
+    the first build is done the index is not ready and queries find nothing.
+    """
+
+    def __init__(self, app, num_perm: int, bands: int, refresh_seconds: float = 60.0):
+        self.app = app
+        self.lsh = MinHashLSH(num_perm, bands)
+        self.refresh_seconds = refresh_seconds
+        self.ready = threading.Event()
+        # Next sync reads ids above floor; recent holds the ids indexed above it
+        self.floor = 0
+        self.watermark = 0
+        self.recent: Set[int] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="similar-case-index", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self.app.app_context():
+                try:
+                    self.sync()
+                except Exception:
+                    logger.exception("Similar-case index refresh failed")
+                finally:
+                    db.session.remove()
+            time.sleep(self.refresh_seconds)
+
+    def add(self, case_id: int, symptom_ids: Sequence[int]) -> None:
+        keys = self.lsh.band_keys(symptom_ids) if symptom_ids else []
+        with self._lock:
+            if case_id in self.recent:
+                return
+            self.lsh.add(case_id, keys)
+            self.recent.add(case_id)
+
+    def remove(self, entries: Iterable[Tuple[int, Sequence[int]]]) -> None:
+        """Drops (case_id, symptom_ids) pairs, e.g. archived cases."""
+        by_key: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        for case_id, symptom_ids in entries:
+            for key in self.lsh.band_keys(symptom_ids) if symptom_ids else []:
+                by_key[key].add(case_id)
+        with self._lock:
+            for key, case_ids in by_key.items():
+                self.lsh.discard(case_ids, [key])
+
+    def sync(self, chunk_size: int = 10_000) -> None:
+        """Indexes cases above the floor in id order; signatures are computed outside the lock."""
+        after = self.floor
+        while True:
+            chunk = db.session.scalars(
+                db.select(Case.id).where(Case.id > after).order_by(Case.id).limit(chunk_size)
+            ).all()
+            if not chunk:
+                break
+            after = chunk[-1]
+            with self._lock:
+                chunk = [case_id for case_id in chunk if case_id not in self.recent]
+            symptoms = _symptom_sets(chunk)
+            keyed = [
+                (case_id, self.lsh.band_keys(symptoms[case_id]) if case_id in symptoms else [])
+                for case_id in chunk
+            ]
+            with self._lock:
+                for case_id, keys in keyed:
+                    if case_id not in self.recent:
+                        self.lsh.add(case_id, keys)
+                        self.recent.add(case_id)
+        with self._lock:
+            newest = max(self.watermark, after)
+            # The first build has no earlier watermark to look back to
+            self.floor = self.watermark if self.ready.is_set() else newest
+            self.watermark = newest
+            self.recent = {case_id for case_id in self.recent if case_id > self.floor}
+        self.ready.set()
+
+    def candidates(self, symptom_ids: Sequence[int], limit: int) -> Dict[int, int]:
+        if not self.ready.is_set():
+            return {}
+        with self._lock:
+            return self.lsh.candidates(symptom_ids, limit)
+
+    def prune(self, case_ids: Set[int], symptom_ids: Sequence[int]) -> None:
+        """Drops case_ids, found gone, from the buckets a query for symptom_ids reads."""
+        keys = self.lsh.band_keys(symptom_ids)
+        with self._lock:
+            self.lsh.discard(case_ids, keys)
+
+
+def _symptom_sets(case_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    sets: Dict[int, Set[int]] = defaultdict(set)
+    for case_id, symptom_id in db.session.execute(
+        db.select(tbl_cases_symptoms.c.case_id, tbl_cases_symptoms.c.symptom_id)
+        .where(tbl_cases_symptoms.c.case_id.in_(list(case_ids)))
+    ):
+        sets[case_id].add(symptom_id)
+    return sets
+
+
+class SimilarCaseService:
+    @staticmethod
+    def get_index() -> SimilarCaseIndex:
+        """This worker's index, starting its background build on first use."""
+        index = current_app.extensions.get("similar_case_index")
+        if index is None:
+            index = current_app.extensions.setdefault("similar_case_index", SimilarCaseIndex(
+                current_app._get_current_object(),
+                num_perm=current_app.config.get("SIMILAR_CASES_NUM_PERM", 64),
+                bands=current_app.config.get("SIMILAR_CASES_BANDS", 16),
+                refresh_seconds=current_app.config.get("SIMILAR_CASES_REFRESH_SECONDS", 60),
+            ))
+        index.start()
+        return index
+
+    @staticmethod
+    def record(entries: Iterable[Tuple[int, Sequence[int]]]) -> None:
+        """
+        Indexes freshly written (case_id, symptom_ids) pairs, if this worker
+        has an index; CLI runs and idle workers do not start one for this.
+        """
+        index = current_app.extensions.get("similar_case_index")
+        if index is None:
+            return
+        for case_id, symptom_ids in entries:
+            index.add(case_id, symptom_ids)
+
+    @staticmethod
+    def forget(entries: Iterable[Tuple[int, Sequence[int]]]) -> None:
+        """Removes archived or deleted (case_id, symptom_ids) pairs from this worker's index, if any."""
+        index = current_app.extensions.get("similar_case_index")
+        if index is not None:
+            index.remove(entries)
+
+    @staticmethod
+    def similar_to_symptoms(
+        symptom_ids: Sequence[int],
+        limit: int = 10,
+        exclude_case_id: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Up to limit recorded cases most similar to symptom_ids by exact
+        Jaccard similarity, among the LSH candidates. Each entry has case_id,
+        similarity, created_at, disease_id, disease and confidence. Empty
+        while this worker's index is still being built.
+        """
+        query_set = set(symptom_ids)
+        if not query_set:
+            return []
+        index = SimilarCaseService.get_index()
+        max_candidates = current_app.config.get("SIMILAR_CASES_MAX_CANDIDATES", 2_000)
+        hits = index.candidates(sorted(query_set), max_candidates)
+        hits.pop(exclude_case_id, None)
+        # Most shared bands first, then newest
+        candidate_ids = sorted(hits, key=lambda case_id: (-hits[case_id], -case_id))[:max_candidates]
+        if not candidate_ids:
+            return []
+
+        case_sets = _symptom_sets(candidate_ids)
+        gone = set(candidate_ids) - case_sets.keys()
+        if gone:
+            # Archived or deleted since they were indexed
+            index.prune(gone, sorted(query_set))
+
+        scored = []
+        for case_id, case_set in case_sets.items():
+            similarity = len(query_set & case_set) / len(query_set | case_set)
+            scored.append((similarity, case_id))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+        scored = scored[:limit]
+
+        details = {
+            row.id: row
+            for row in db.session.execute(
+                db.select(Case.id, Case.created_at, Case.disease_id, Disease.name, Case.confidence)
+                .outerjoin(Disease, Case.disease_id == Disease.id)
+                .where(Case.id.in_([case_id for _, case_id in scored]))
+            )
+        }
+        return [
+            {
+                "case_id": case_id,
+                "similarity": round(similarity, 4),
+                "created_at": details[case_id].created_at.isoformat(),
+                "disease_id": details[case_id].disease_id,
+                "disease": details[case_id].name,
+                "confidence": details[case_id].confidence,
+            }
+            for similarity, case_id in scored
+            if case_id in details
+        ]
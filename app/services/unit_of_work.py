@@ -0,0 +1,90 @@
+# app/services/unit_of_work.py
+from typing import Callable
+from flask import Flask, g, has_request_context
+from extensions import db
+
+
+class UnitOfWork:
+    """
+    One transaction per request. With UNIT_OF_WORK enabled, services call
+    UnitOfWork.commit() where they used to commit: inside a request that
+    only flushes (so new rows get their ids), and the request's writes are
+    committed once after the view returns, or rolled back if it fails.
+    Outside a request (CLI commands, background flushers) commit() commits
+    immediately, as before.
+
+    Side effects that must not happen for rolled-back writes (in-memory
+    indexes, cache invalidation) go through after_commit; clean-up that must
+    wait for the request's writes to be undone goes through after_rollback.
+    """
+
+    @staticmethod
+    def active() -> bool:
+        return has_request_context() and g.get("unit_of_work", False)
+
+    @staticmethod
+    def commit() -> None:
+        if UnitOfWork.active():
+            db.session.flush()
+        else:
+            db.session.commit()
+
+    @staticmethod
+    def after_commit(callback: Callable[[], None]) -> None:
+        """Runs callback once the request's transaction commits (now, if none is open)."""
+        if UnitOfWork.active():
+            g.unit_of_work_callbacks.append(callback)
+        else:
+            callback()
+
+    @staticmethod
+    def after_rollback(callback: Callable[[], None]) -> None:
+        """Runs callback once the request's transaction rolls back (now, if none is open)."""
+        if UnitOfWork.active():
+            g.unit_of_work_rollback_callbacks.append(callback)
+        else:
+            callback()
+
+    @staticmethod
+    def _finish(commit: bool) -> None:
+        if not UnitOfWork.active():
+            return
+        g.unit_of_work = False
+        callbacks, g.unit_of_work_callbacks = g.unit_of_work_callbacks, []
+        rollback_callbacks, g.unit_of_work_rollback_callbacks = g.unit_of_work_rollback_callbacks, []
+        if not commit:
+            db.session.rollback()
+            for callback in rollback_callbacks:
+                callback()
+            return
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for callback in rollback_callbacks:
+                callback()
+            raise
+        for callback in callbacks:
+            callback()
+
+
+def register_unit_of_work(app: Flask) -> None:
+    if not app.config.get("UNIT_OF_WORK", False):
+        return
+
+    @app.before_request
+    def begin_unit_of_work():
+        g.unit_of_work = True
+        g.unit_of_work_callbacks = []
+        g.unit_of_work_rollback_callbacks = []
+
+    @app.after_request
+    def commit_unit_of_work(response):
+        # Committed before the response is sent, so a failed commit is a 500
+        UnitOfWork._finish(commit=response.status_code < 500)
+        return response
+
+    @app.teardown_request
+    def rollback_unit_of_work(exc):
+        # Only still open when the view raised and no response was produced
+        UnitOfWork._finish(commit=False)
@@ -2,6 +2,7 @@
 from typing import List, Optional
 from app.models.user import UserTable
 from app.models.role import RoleTable
+from app.services.unit_of_work import UnitOfWork
 from extensions import db
 
 class UserService:
@@ -33,7 +34,7 @@ class UserService:
                 user.roles = [role]
                 
         db.session.add(user)
-        db.session.commit()
+        UnitOfWork.commit()
         return user
         
     @staticmethod
@@ -56,10 +57,10 @@ class UserService:
             if role:
                 user.roles = [role]
                 
-        db.session.commit()
+        UnitOfWork.commit()
         return user
     
     @staticmethod
     def delete_user(user: UserTable) -> None:
         db.session.delete(user)
-        db.session.commit()
\ No newline at end of file
+        UnitOfWork.commit()
\ No newline at end of file
@@ -0,0 +1,259 @@
+# app/services/write_behind.py
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _lock_exclusive(f) -> None:
+    # Imported here so the sync modes, which never spool, work without fcntl (e.g. on Windows)
+    import fcntl
+
+    fcntl.flock(f, fcntl.LOCK_EX)
+
+
+class Spool:
+    """
+    JSON-lines file of rows a write-behind flush could not write, shared by
+    every worker process.
+
+    Appends hold an exclusive flock and re-open the file if a replayer
+    renamed it meanwhile. A replay first claims the spool by renaming it to
+    a file private to its process (<path>.<pid>.<n>.replay), so rows other
+    workers append afterwards go to a fresh spool and no row is replayed
+    twice. Claims left by dead processes are taken over. When the batch
+    insert fails but the database answers, rows are retried one by one and
+    those that still fail are moved to <path>.rejected instead of blocking
+    the spool forever.
+    """
+
+    def __init__(self, path: Optional[str], label: str, datetime_fields: Sequence[str] = ("created_at",)):
+        self.path = path
+        self.label = label
+        self.datetime_fields = tuple(datetime_fields)
+
+    def append(self, rows: List[dict]) -> None:
+        if not self.path:
+            logger.error("No spool path configured; %d %s lost", len(rows), self.label)
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._append_to(self.path, rows, follow_renames=True)
+
+    def replay(self, insert: Callable[[List[dict]], object]) -> None:
+        """
+        Writes every claimable spooled row with insert (which must not
+        commit), committing per file. Call with an app context.
+        """
+        if not self.path:
+            return
+        for path in self._claim():
+            with open(path, encoding="utf-8") as f:
+                # Waits for a writer that opened the spool before it was renamed
+                _lock_exclusive(f)
+                rows = [self._decode(line) for line in f if line.strip()]
+            if rows and not self._insert(rows, insert):
+                return
+            os.unlink(path)
+
+    def _claim(self) -> List[str]:
+        claimed = []
+        for path in sorted(glob.glob(glob.escape(self.path) + ".*.replay")):
+            try:
+                pid = int(path[len(self.path) + 1:].split(".", 1)[0])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                claimed.append(path)
+            elif not _pid_alive(pid):
+                target = self._private_name()
+                try:
+                    os.replace(path, target)
+                except FileNotFoundError:
+                    continue  # another worker took it over first
+                claimed.append(target)
+        target = self._private_name()
+        try:
+            os.replace(self.path, target)
+        except FileNotFoundError:
+            pass
+        else:
+            claimed.append(target)
+        return claimed
+
+    def _private_name(self) -> str:
+        return f"{self.path}.{os.getpid()}.{time.time_ns()}.replay"
+
+    def _insert(self, rows: List[dict], insert: Callable[[List[dict]], object]) -> bool:
+        """Writes rows; False (rows kept) if the database is unavailable."""
+        try:
+            insert(rows)
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            logger.exception("Replaying %d spooled %s failed", len(rows), self.label)
+        try:
+            db.session.execute(db.text("SELECT 1"))
+            db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            return False
+
+        # The database answers, so some rows themselves are bad
+        rejected = []
+        for row in rows:
+            try:
+                insert([row])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                rejected.append(row)
+        if rejected:
+            logger.error("Moving %d spooled %s that cannot be written to %s.rejected",
+                         len(rejected), self.label, self.path)
+            self._append_to(f"{self.path}.rejected", rejected, follow_renames=False)
+        return True
+
+    def _append_to(self, path: str, rows: List[dict], follow_renames: bool) -> None:
+        data = "".join(self._encode(row) + "\n" for row in rows)
+        while True:
+            with open(path, "a", encoding="utf-8") as f:
+                _lock_exclusive(f)
+                if follow_renames:
+                    try:
+                        renamed = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+                    except FileNotFoundError:
+                        renamed = True
+                    if renamed:
+                        continue  # claimed by a replayer after we opened it
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                return
+
+    def _encode(self, row: dict) -> str:
+        return json.dumps({
+            **row,
+            **{field: row[field].isoformat() for field in self.datetime_fields if row.get(field) is not None},
+        })
+
+    def _decode(self, line: str) -> dict:
+        row = json.loads(line)
+        for field in self.datetime_fields:
+            if row.get(field) is not None:
+                row[field] = datetime.fromisoformat(row[field])
+        return row
+
+
+class WriteBehindWriter:
+    """
+    Bounded in-process queue of rows that a background thread writes with
+    insert (a function inserting a list of rows without committing) every
+    flush_interval seconds or batch_size rows. Durability fallbacks:
+      * queue full: submit returns False and the caller writes the row itself;
+      * flush error: the batch is appended to a Spool at spool_path and
+        replayed before the next flush;
+      * process exit: remaining rows are flushed by an atexit hook.
+    """
+
+    def __init__(
+        self,
+        app,
+        insert: Callable[[List[dict]], object],
+        label: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        queue_size: int = 10_000,
+        spool_path: Optional[str] = None,
+    ):
+        self.app = app
+        self.insert = insert
+        self.label = label
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool = Spool(spool_path, label)
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def submit(self, row: dict) -> bool:
+        """Queues row; returns False if the queue is full and nothing was queued."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            return False
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="write-behind-" + self.label.replace(" ", "-"), daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def _run(self) -> None:
+        batch: List[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                row = False
+            if row is None:
+                self.flush(batch)
+                return
+            if row:
+                batch.append(row)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self.flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def flush(self, batch: List[dict]) -> None:
+        with self._flush_lock, self.app.app_context():
+            try:
+                self.spool.replay(self.insert)
+                if not batch:
+                    return
+                try:
+                    self.insert(batch)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Flushing %d %s failed; spooling them", len(batch), self.label)
+                    self.spool.append(batch)
+            finally:
+                db.session.remove()
+
+    def shutdown(self) -> None:
+        """Stops the flusher after writing everything still queued."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join()
@@ -0,0 +1,194 @@
+# benchmarks/bench_inference.py
+"""
+Micro-benchmarks for DiagnosisService.run_inference and record_case.
+
+Runs against in-memory or file SQLite, so it works offline:
+
+    python -m benchmarks.bench_inference --preset medium --out bench.json
+    python -m benchmarks.bench_inference --preset medium --backend numpy \\
+        --compare bench.json
+
+Each run reports latency percentiles, throughput and peak memory, and can
+write them as JSON for comparison against an earlier run.
+"""
+import argparse
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from config import Config
+from benchmarks.synthetic_kb import PRESETS, generate_knowledge_base, sample_selections
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": pct(50) * 1000,
+        "p90_ms": pct(90) * 1000,
+        "p99_ms": pct(99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "throughput_per_s": len(samples) / total if total else 0.0,
+    }
+
+
+def _timed(fn, inputs):
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run(args):
+    n_symptoms, n_rules = PRESETS[args.preset]
+    if args.symptoms is not None:
+        n_symptoms = args.symptoms
+    if args.rules is not None:
+        n_rules = args.rules
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database
+        WTF_CSRF_ENABLED = False
+        INFERENCE_BACKEND = args.backend
+        INFERENCE_CACHE_SIZE = args.cache_size
+        KNOWLEDGE_BASE_SNAPSHOT_PATH = ""
+        KNOWLEDGE_BASE_REFRESH_SECONDS = 0
+
+    from app import create_app
+    from extensions import db
+    from app.models.user import UserTable
+    from app.services.diagnosis_service import DiagnosisService
+    from app.services.knowledge_base_service import KnowledgeBaseService
+
+    app = create_app(BenchConfig)
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "preset": args.preset,
+            "symptoms": n_symptoms,
+            "rules": n_rules,
+            "backend": args.backend,
+            "cache_size": args.cache_size,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "database": args.database,
+        },
+        "results": {},
+    }
+
+    with app.app_context():
+        start = time.perf_counter()
+        generate_knowledge_base(n_symptoms, n_rules, seed=args.seed)
+        report["results"]["generate_s"] = time.perf_counter() - start
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        KnowledgeBaseService.invalidate()
+        KnowledgeBaseService.get_engine()
+        build_s = time.perf_counter() - start
+        _, build_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["results"]["engine_build"] = {
+            "seconds": build_s,
+            "peak_traced_mb": build_peak / (1024 * 1024),
+        }
+
+        selections = sample_selections(args.queries, seed=args.seed + 1)
+        for selection in selections[:args.warmup]:
+            DiagnosisService.run_inference(selection)
+
+        report["results"]["run_inference"] = _percentiles(
+            _timed(DiagnosisService.run_inference, selections)
+        )
+        report["results"]["run_inference_top_k"] = _percentiles(
+            _timed(lambda s: DiagnosisService.run_inference(s, top_k=args.top_k), selections)
+        )
+
+        user_id = db.session.scalar(db.select(UserTable.id).limit(1))
+        tops = [
+            (selection, results[0])
+            for selection in selections[:args.record_cases]
+            for results in [DiagnosisService.run_inference(selection, top_k=1)]
+            if results
+        ]
+        report["results"]["record_case"] = _percentiles(
+            _timed(lambda item: DiagnosisService.record_case(user_id, item[0], item[1]), tops)
+        ) if tops else None
+        report["results"]["cache"] = DiagnosisService.cache_stats()
+
+    report["results"]["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def _print_report(report, baseline=None):
+    meta = report["meta"]
+    print(f"preset={meta['preset']} symptoms={meta['symptoms']} rules={meta['rules']} "
+          f"backend={meta['backend']} cache={meta['cache_size']}")
+    results = report["results"]
+    print(f"  generate            {results['generate_s']:.2f}s")
+    print(f"  engine_build        {results['engine_build']['seconds']:.3f}s "
+          f"(peak {results['engine_build']['peak_traced_mb']:.1f} MiB traced)")
+    for name in ("run_inference", "run_inference_top_k", "record_case"):
+        stats = results.get(name)
+        if not stats:
+            continue
+        line = (f"  {name:<19} p50 {stats['p50_ms']:.3f}ms  p90 {stats['p90_ms']:.3f}ms  "
+                f"p99 {stats['p99_ms']:.3f}ms  {stats['throughput_per_s']:.0f}/s")
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and base.get("p50_ms"):
+            line += f"  (p50 x{stats['p50_ms'] / base['p50_ms']:.2f} vs baseline)"
+        print(line)
+    print(f"  peak_rss            {results['peak_rss_mb']:.1f} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--symptoms", type=int, help="override the preset symptom count")
+    parser.add_argument("--rules", type=int, help="override the preset rule count")
+    parser.add_argument("--database", default="sqlite://", help="SQLite URI (default: in-memory)")
+    parser.add_argument("--backend", choices=["index", "numpy"], default="index")
+    parser.add_argument("--cache-size", type=int, default=0, help="inference cache size (0 = off)")
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--record-cases", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
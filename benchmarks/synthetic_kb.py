@@ -0,0 +1,108 @@
+# benchmarks/synthetic_kb.py
+"""
+Synthetic knowledge-base generator for benchmarks.
+
+Builds categories, diseases, symptoms and rules on top of the seed data
+with bulk Core inserts. Symptom popularity follows a Zipf-like curve (a few
+signs such as lethargy appear in many rules) and rules need 1-8 symptoms,
+mostly 2-4, like the hand-authored ones.
+"""
+import random
+from typing import Dict, List
+from extensions import db
+from app.models.expert_system import Category, Symptom, Disease, Rule
+from app.models.associations import tbl_rules_symptoms
+
+# name: (symptoms, rules); "seed" is seed_expert_data as-is
+PRESETS: Dict[str, tuple] = {
+    "seed": (0, 0),
+    "small": (200, 1_000),
+    "medium": (2_000, 20_000),
+    "large": (10_000, 100_000),
+    "xlarge": (50_000, 500_000),
+}
+
+# Relative weights for 1..8 required symptoms per rule
+RULE_SIZE_WEIGHTS = [4, 22, 34, 22, 10, 5, 2, 1]
+
+CHUNK = 5_000
+
+
+def _insert(table, rows: List[dict]) -> None:
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(db.insert(table), rows[start:start + CHUNK])
+
+
+def symptom_weights(count: int, exponent: float = 1.1) -> List[float]:
+    return [1.0 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def generate_knowledge_base(n_symptoms: int, n_rules: int, seed: int = 42) -> None:
+    """Adds n_symptoms symptoms and n_rules rules to the current database."""
+    if not n_symptoms and not n_rules:
+        return
+    rng = random.Random(seed)
+
+    _insert(Category.__table__, [
+        {"name": f"Synthetic category {i}", "description": "Generated"}
+        for i in range(max(4, n_rules // 5_000))
+    ])
+    category_ids = db.session.scalars(db.select(Category.id)).all()
+
+    n_diseases = max(5, n_rules // 10)
+    _insert(Disease.__table__, [
+        {
+            "name": f"Synthetic disease {i}",
+            "description": "Generated disease",
+            "treatment": "Generated treatment",
+            "category_id": rng.choice(category_ids),
+        }
+        for i in range(n_diseases)
+    ])
+    disease_ids = db.session.scalars(db.select(Disease.id)).all()
+
+    _insert(Symptom.__table__, [
+        {"name": f"Synthetic symptom {i}", "description": "Generated"}
+        for i in range(n_symptoms)
+    ])
+    symptom_ids = db.session.scalars(db.select(Symptom.id).order_by(Symptom.id)).all()
+
+    _insert(Rule.__table__, [
+        {
+            "title": f"Synthetic rule {i}",
+            "description": "Generated rule",
+            "priority": rng.randint(1, 5),
+            "confidence": float(rng.choice(range(50, 101, 5))),
+            "disease_id": rng.choice(disease_ids),
+        }
+        for i in range(n_rules)
+    ])
+    new_rule_ids = db.session.scalars(
+        db.select(Rule.id).order_by(Rule.id.desc()).limit(n_rules)
+    ).all()
+
+    weights = symptom_weights(len(symptom_ids))
+    links = []
+    for rule_id in new_rule_ids:
+        size = rng.choices(range(1, 9), weights=RULE_SIZE_WEIGHTS)[0]
+        chosen = set()
+        while len(chosen) < min(size, len(symptom_ids)):
+            chosen.update(rng.choices(symptom_ids, weights=weights, k=size - len(chosen)))
+        links.extend({"rule_id": rule_id, "symptom_id": sid} for sid in chosen)
+    _insert(tbl_rules_symptoms, links)
+    db.session.commit()
+
+
+def sample_selections(count: int, seed: int = 7) -> List[List[int]]:
+    """Draws diagnose-page style selections of 1-6 symptoms, weighted by popularity."""
+    rng = random.Random(seed)
+    symptom_ids = db.session.scalars(db.select(Symptom.id).order_by(Symptom.id)).all()
+    weights = symptom_weights(len(symptom_ids))
+    selections = []
+    for _ in range(count):
+        size = min(rng.randint(1, 6), len(symptom_ids))
+        chosen = set()
+        while len(chosen) < size:
+            chosen.update(rng.choices(symptom_ids, weights=weights, k=size - len(chosen)))
+        selections.append(sorted(chosen))
+    return selections
@@ -0,0 +1,39 @@
+# tests/conftest.py
+import pytest
+from config import Config
+from app import create_app
+from extensions import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+        WTF_CSRF_ENABLED = False
+        KNOWLEDGE_BASE_SNAPSHOT_PATH = ""
+        CASE_ARCHIVE_DIR = str(tmp_path / "case_archive")
+        AUDIT_ARCHIVE_DIR = str(tmp_path / "audit_archive")
+        CASE_RECORDER_SPOOL_PATH = str(tmp_path / "case_spool.jsonl")
+        AUDIT_LOG_SPOOL_PATH = str(tmp_path / "audit_spool.jsonl")
+
+    app = create_app(TestConfig)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as the seeded admin (user 1)."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+    return client
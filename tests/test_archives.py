@@ -0,0 +1,89 @@
+# tests/test_archives.py
+import random
+from datetime import date, datetime, timedelta
+from extensions import db
+from app.models.audit_log import AuditLog
+from app.models.expert_system import Case, CaseRollup
+from app.services.audit_export_service import AuditExportService
+from app.services.audit_retention_service import AuditRetentionService
+from app.services.case_archive_service import CaseArchiveService
+from app.services.case_recorder import insert_case_rows
+from app.services.case_rollup_service import CaseRollupService
+
+
+def rollup_totals():
+    return sorted(
+        (row.period, row.period_start, row.dimension, row.key_id, row.case_count, round(row.confidence_sum, 6))
+        for row in db.session.scalars(db.select(CaseRollup))
+    )
+
+
+def add_cases(count, seed=1):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    insert_case_rows([
+        {
+            "user_id": 1,
+            "disease_id": rng.randint(1, 5),
+            "confidence": rng.choice([40.0, 62.5, 85.0]),
+            "created_at": start + timedelta(hours=rng.randint(0, 24 * 200)),
+            "symptom_ids": rng.sample(range(1, 15), rng.randint(1, 4)),
+        }
+        for _ in range(count)
+    ])
+    db.session.commit()
+
+
+def test_archived_cases_keep_their_rollups(app_context):
+    add_cases(400)
+    recorded = rollup_totals()
+    assert CaseRollupService.rebuild() == 400
+    assert rollup_totals() == recorded
+
+    moved = CaseArchiveService.archive(datetime(2025, 5, 1), batch_size=70)
+    assert 0 < moved < 400
+    assert db.session.query(Case).count() == 400 - moved
+    assert CaseRollupService.rebuild() == 400
+    assert rollup_totals() == recorded
+
+
+def test_archived_case_reads_back(app_context):
+    add_cases(50)
+    oldest = db.session.scalars(db.select(Case).order_by(Case.created_at, Case.id)).first()
+    expected = (oldest.id, oldest.created_at, oldest.disease_id, sorted(s.id for s in oldest.symptoms))
+    CaseArchiveService.archive(oldest.created_at + timedelta(seconds=1))
+    db.session.expire_all()
+
+    archived = CaseArchiveService.get(expected[0])
+    assert db.session.get(Case, expected[0]) is None
+    assert (archived.id, archived.created_at, archived.disease.id, [s.id for s in archived.symptoms]) == expected
+    assert [row["case_id"] for row in CaseArchiveService.iter_rows()] == [expected[0]]
+
+
+def test_rolled_audit_entries_are_exported_with_the_live_ones(app_context):
+    db.session.execute(db.insert(AuditLog), [
+        {
+            "user_id": 1,
+            "action": "LOGIN" if i % 3 else "UPDATE",
+            "target_type": "User",
+            "target_id": str(i),
+            "details": f"entry {i}",
+            "created_at": datetime(2025, 1, 1) + timedelta(hours=7 * i),
+        }
+        for i in range(600)
+    ])
+    db.session.commit()
+    before = list(AuditExportService.iter_rows())
+
+    rolled = AuditRetentionService.roll(date(2025, 2, 1), block_size=40)
+    assert 0 < rolled < 600
+    assert db.session.query(AuditLog).count() == 600 - rolled
+
+    rows = list(AuditExportService.iter_csv(include_archived=True))
+    assert "".join(rows) == "".join(AuditExportService.format_csv(before))
+
+    filters = {"action": "UPDATE", "date_to": date(2025, 1, 20)}
+    expected = [row for row in before if row[2] == "UPDATE" and row[7].date() <= date(2025, 1, 20)]
+    assert "".join(AuditExportService.iter_csv(filters, include_archived=True)) == "".join(
+        AuditExportService.format_csv(expected)
+    )
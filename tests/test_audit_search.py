@@ -0,0 +1,104 @@
+# tests/test_audit_search.py
+from datetime import date, datetime, timedelta
+import pytest
+from flask import current_app
+from extensions import db
+from app.models.audit_log import AuditLog
+from app.services.audit_search_service import AuditSearchService
+
+
+def add_logs(*entries):
+    start = datetime(2026, 2, 1)
+    db.session.execute(db.insert(AuditLog), [
+        {
+            "user_id": 1,
+            "action": action,
+            "target_type": target_type,
+            "details": details,
+            "created_at": start + timedelta(days=i),
+        }
+        for i, (action, target_type, details) in enumerate(entries)
+    ])
+    db.session.commit()
+
+
+def found(search_query, filters=None):
+    return [log.details for log in AuditSearchService.search(search_query, filters)[0]]
+
+
+@pytest.fixture(params=["fts5", "like"])
+def backend(request, app_context):
+    current_app.extensions["audit_search_backend"] = request.param
+    return request.param
+
+
+def test_new_database_gets_the_fts5_index(app_context):
+    assert AuditSearchService.backend() == "fts5"
+    assert AuditSearchService.detect() == "fts5"
+
+
+def test_every_word_must_match_a_prefix(backend):
+    add_logs(
+        ("UPDATE", "Disease", "renamed influenza"),
+        ("UPDATE", "Symptom", "renamed fever"),
+        ("DELETE", "Disease", "removed influenza"),
+    )
+    assert sorted(found("influ")) == ["removed influenza", "renamed influenza"]
+    assert found("renamed influ") == ["renamed influenza"]
+    assert found("disease removed") == ["removed influenza"]
+    assert found("measles") == []
+    assert found('"  \'') == []
+
+
+def test_filters_apply_to_matches(backend):
+    add_logs(
+        ("UPDATE", "Disease", "note one"),
+        ("DELETE", "Disease", "note two"),
+        ("UPDATE", "Disease", "note three"),
+    )
+    assert sorted(found("note", {"action": "UPDATE"})) == ["note one", "note three"]
+    assert found("note", {"date_from": date(2026, 2, 2), "date_to": date(2026, 2, 2)}) == ["note two"]
+
+
+def test_fts5_ranks_the_closest_match_first(app_context):
+    add_logs(
+        ("UPDATE", "Rule", "rule fever rule cough rule headache rule"),
+        ("UPDATE", "Rule", "fever"),
+        ("UPDATE", "Rule", "a fever among many other words in a long entry"),
+    )
+    assert found("fever")[0] == "fever"
+
+
+def test_like_fallback_matches_wildcards_literally(app_context):
+    current_app.extensions["audit_search_backend"] = "like"
+    add_logs(
+        ("UPDATE", "Rule", "confidence 100%"),
+        ("UPDATE", "Rule", "confidence 1000"),
+        ("UPDATE", "Rule", "user_name"),
+        ("UPDATE", "Rule", "username"),
+    )
+    assert found("100%") == ["confidence 100%"]
+    assert found("user_") == ["user_name"]
+
+
+def test_triggers_keep_the_index_in_sync(app_context):
+    add_logs(("UPDATE", "Disease", "old words"))
+    log = db.session.query(AuditLog).one()
+    log.details = "new words"
+    db.session.commit()
+    assert found("old") == []
+    assert found("new") == ["new words"]
+
+    db.session.delete(log)
+    db.session.commit()
+    assert found("words") == []
+    assert AuditSearchService.rebuild() == 0
+
+
+def test_rebuild_indexes_existing_entries(app_context):
+    add_logs(("UPDATE", "Disease", "indexed later"))
+    db.session.execute(db.text("DELETE FROM tbl_audit_logs_fts"))
+    db.session.commit()
+    assert found("indexed") == []
+    assert AuditSearchService.rebuild() == db.session.query(AuditLog).count()
+    assert found("indexed") == ["indexed later"]
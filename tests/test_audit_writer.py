@@ -0,0 +1,68 @@
+# tests/test_audit_writer.py
+import pytest
+from flask import abort
+from extensions import db
+from app.models.audit_log import AuditLog
+from app.services.audit_service import AuditService
+
+
+def logged(app, action="TEST"):
+    with app.app_context():
+        return db.session.query(AuditLog).filter_by(action=action).count()
+
+
+def flush_audit_writer(app):
+    writer = app.extensions.get("audit_writer")
+    if writer is not None:
+        writer.shutdown()
+
+
+@pytest.fixture
+def logging_app(app):
+    @app.route("/_test/log/<int:status>")
+    def log_then_respond(status):
+        AuditService.log("TEST", "Test", 1, {"status": status})
+        if status >= 500:
+            abort(status)
+        return "ok"
+
+    return app
+
+
+def test_sync_mode_writes_before_returning(app):
+    with app.test_request_context():
+        AuditService.log("TEST", "Test", 1, "now")
+    assert logged(app) == 1
+    assert "audit_writer" not in app.extensions
+
+
+def test_buffered_mode_writes_through_the_writer(app):
+    app.config["AUDIT_LOG_MODE"] = "buffered"
+    with app.test_request_context():
+        for i in range(5):
+            AuditService.log("TEST", "Test", i, {"i": i})
+    flush_audit_writer(app)
+    assert logged(app) == 5
+    with app.app_context():
+        details = sorted(log.details for log in db.session.query(AuditLog).filter_by(action="TEST"))
+    assert details == sorted(f'{{"i": {i}}}' for i in range(5))
+
+
+def test_full_queue_falls_back_to_a_direct_write(app):
+    app.config.update(AUDIT_LOG_MODE="buffered", AUDIT_LOG_QUEUE_SIZE=1, AUDIT_LOG_FLUSH_INTERVAL=3600)
+    with app.test_request_context():
+        writer = AuditService._get_writer()
+        writer._ensure_started = lambda: None  # no flusher: the queue stays full
+        for i in range(3):
+            AuditService.log("TEST", "Test", i)
+    assert logged(app) == 2
+    assert writer._queue.qsize() == 1
+
+
+@pytest.mark.parametrize("mode", ["sync", "buffered"])
+def test_failed_request_logs_nothing(logging_app, client, mode):
+    logging_app.config["AUDIT_LOG_MODE"] = mode
+    assert client.get("/_test/log/500").status_code == 500
+    assert client.get("/_test/log/200").status_code == 200
+    flush_audit_writer(logging_app)
+    assert logged(logging_app) == 1
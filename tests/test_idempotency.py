@@ -0,0 +1,56 @@
+# tests/test_idempotency.py
+import pytest
+from extensions import db
+from app.models.expert_system import Case
+from app.services.idempotency_service import DatabaseIdempotencyStore, MemoryIdempotencyStore
+
+
+@pytest.fixture(params=["database", "memory"])
+def store(request, app_context):
+    return DatabaseIdempotencyStore() if request.param == "database" else MemoryIdempotencyStore()
+
+
+def test_duplicate_gets_the_first_response(store):
+    assert store.claim("k", 1, 60) == (True, None)
+    # Still running: no response yet
+    assert store.claim("k", 1, 60) == (False, None)
+    store.complete("k", {"case_id": 7}, 600)
+    db.session.commit()
+    assert store.claim("k", 1, 60) == (False, {"case_id": 7})
+
+
+def test_expired_lease_can_be_taken_over(store):
+    assert store.claim("k", 1, -1) == (True, None)
+    assert store.claim("k", 1, 60) == (True, None)
+    assert store.claim("k", 1, 60) == (False, None)
+
+
+def test_released_claim_can_be_retried(store):
+    assert store.claim("k", 1, 60) == (True, None)
+    store.release("k")
+    assert store.claim("k", 1, 60) == (True, None)
+
+
+@pytest.mark.parametrize("backend", ["database", "memory"])
+def test_resubmitted_diagnosis_is_recorded_once(app, client, backend):
+    app.config["IDEMPOTENCY_BACKEND"] = backend
+    form = {"symptoms": ["1", "2", "3"], "idempotency_key": "form-1"}
+    first = client.post("/expert-system/diagnose", data=form)
+    second = client.post("/expert-system/diagnose", data=form)
+    assert first.status_code == second.status_code == 200
+    with app.app_context():
+        assert db.session.query(Case).count() == 1
+
+    client.post("/expert-system/diagnose", data={**form, "symptoms": ["1", "2"]})
+    with app.app_context():
+        assert db.session.query(Case).count() == 2
+
+
+def test_claim_does_not_expire_the_request_session(app, client):
+    from sqlalchemy import event
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    client.post("/expert-system/diagnose", data={"symptoms": ["1", "2"], "idempotency_key": "form-2"})
+    assert not [statement for statement in statements if "WHERE tbl_symptoms.id = ?" in statement]
@@ -0,0 +1,75 @@
+# tests/test_inference_engines.py
+import random
+import pytest
+from app.services.knowledge_base_service import (
+    DiseaseRecord,
+    KnowledgeBase,
+    KnowledgeBaseIndex,
+    RuleRecord,
+    build_engine,
+    rank_key,
+)
+from app.services.diagnosis_service import DiagnosisService
+
+
+def random_kb(rng, n_symptoms=60, n_rules=300):
+    diseases = {
+        disease_id: DiseaseRecord(disease_id, f"Disease {disease_id}", "", "", None)
+        for disease_id in range(1, 21)
+    }
+    rules = {}
+    for rule_id in range(1, n_rules + 1):
+        rules[rule_id] = RuleRecord(
+            id=rule_id,
+            title=f"Rule {rule_id}",
+            priority=rng.randint(1, 4),
+            # Few distinct values, None and 0 included, so ties are common
+            confidence=rng.choice([None, 0.0, 50.0, 66.6, 80.0, 100.0, 120.0]),
+            disease_id=rng.randint(1, 20),
+            symptom_ids=tuple(sorted(rng.sample(range(1, n_symptoms + 1), rng.randint(0, 6)))),
+        )
+    return KnowledgeBase(rules, diseases)
+
+
+def baseline_ranking(kb, selected):
+    """The original engine: score every rule sharing a symptom, then sort."""
+    selected = set(selected)
+    scores = []
+    for rule in kb.rules.values():
+        required = set(rule.symptom_ids)
+        matches = selected & required
+        if matches:
+            confidence = min(len(matches) / len(required) * (rule.confidence or 100.0), 100.0)
+            scores.append((rule.id, len(matches), confidence))
+    scores.sort(key=lambda score: rank_key(score[0], kb.rules[score[0]].priority, score[2]))
+    return [(rule_id, matched, round(confidence, 2)) for rule_id, matched, confidence in scores]
+
+
+def ranked(results):
+    return [(result["rule"].id, result["matched_count"], result["confidence"]) for result in results]
+
+
+@pytest.mark.parametrize("backend", ["index", "numpy"])
+@pytest.mark.parametrize("seed", range(5))
+def test_engines_rank_like_the_baseline(backend, seed):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    rng = random.Random(seed)
+    kb = random_kb(rng)
+    engine = build_engine(kb, backend)
+    for _ in range(50):
+        selected = rng.sample(range(1, 70), rng.randint(1, 10))
+        expected = baseline_ranking(kb, selected)
+        assert ranked(DiagnosisService.infer_with_engine(engine, selected)) == expected
+        for k in (1, 3, 10):
+            assert ranked(DiagnosisService.infer_with_engine(engine, selected, top_k=k)) == expected[:k]
+
+
+def test_index_skips_unknown_and_repeated_symptoms():
+    kb = KnowledgeBase(
+        {1: RuleRecord(1, "r", 1, 90.0, 1, (1, 2))},
+        {1: DiseaseRecord(1, "d", "", "", None)},
+    )
+    index = KnowledgeBaseIndex.build(kb)
+    assert index.score([1, 1, 999]) == [(1, 1, 45.0)]
+    assert index.top_k([999], 3) == []
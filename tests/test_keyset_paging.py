@@ -0,0 +1,68 @@
+# tests/test_keyset_paging.py
+import random
+from datetime import date, datetime, timedelta
+import pytest
+from extensions import db
+from app.models.audit_log import AuditLog
+from app.models.expert_system import Case
+from app.services import keyset
+from app.services.audit_service import AuditService
+from app.services.case_recorder import insert_case_rows
+from app.services.expert_system_service import CaseService
+
+
+def all_pages(get_page, limit, **kwargs):
+    rows, cursor = [], None
+    while True:
+        page, cursor = get_page(cursor=cursor, limit=limit, **kwargs)
+        rows.extend(page)
+        if cursor is None:
+            return rows
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50, 1000])
+def test_case_pages_have_no_gaps_or_duplicates(app_context, limit):
+    rng = random.Random(limit)
+    start = datetime(2026, 3, 1, 12)
+    # Many cases share a created_at, so pages often split a tie
+    insert_case_rows([
+        {
+            "user_id": 1,
+            "disease_id": 1,
+            "confidence": 50.0,
+            "created_at": start + timedelta(minutes=rng.randint(0, 20)),
+            "symptom_ids": [1],
+        }
+        for _ in range(300)
+    ])
+    db.session.commit()
+
+    ids = [case.id for case in all_pages(CaseService.get_page, limit)]
+    expected = db.session.scalars(
+        db.select(Case.id).order_by(Case.created_at.desc(), Case.id.desc())
+    ).all()
+    assert ids == expected
+
+    filters = {"date_from": date(2026, 3, 1), "date_to": date(2026, 3, 1)}
+    assert [case.id for case in all_pages(CaseService.get_page, limit, filters=filters)] == expected
+
+
+def test_audit_pages_have_no_gaps_or_duplicates(app_context):
+    moment = datetime(2026, 3, 1, 12)
+    db.session.execute(db.insert(AuditLog), [
+        {"action": "LOGIN", "target_type": "User", "created_at": moment - timedelta(seconds=i % 5)}
+        for i in range(123)
+    ])
+    db.session.commit()
+
+    logs = all_pages(AuditService.get_page, 10, filters={"action": "LOGIN"})
+    keys = [(log.created_at, log.id) for log in logs]
+    assert len(keys) == len(set(keys)) == 123
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_malformed_cursor_is_rejected(app_context):
+    with pytest.raises(ValueError):
+        CaseService.get_page(cursor="not-a-cursor")
+    created_at, row_id = keyset.decode_cursor(keyset.encode_cursor(Case(id=5, created_at=datetime(2026, 1, 2))))
+    assert (created_at, row_id) == (datetime(2026, 1, 2), 5)
@@ -0,0 +1,41 @@
+# tests/test_outbreak.py
+from datetime import datetime
+from app.services.outbreak_service import OutbreakDetector, bucket_of
+
+NOW = datetime(2026, 3, 1, 12)
+
+
+def detector():
+    return OutbreakDetector(bucket_seconds=3600, window_buckets=6, baseline_buckets=168, min_cases=5, z_threshold=3.0)
+
+
+def recent(detector, key=("disease", 1)):
+    return {(s["dimension"], s["id"]): s["recent"] for s in detector.stats(NOW)}.get(key, 0)
+
+
+def test_cases_recorded_during_a_resync_are_kept():
+    outbreaks = detector()
+    outbreaks.record(("disease", 1), NOW)
+    assert outbreaks.begin_sync()
+    # Another resync started meanwhile must not reset the journal
+    assert not outbreaks.begin_sync()
+    outbreaks.record(("disease", 1), NOW)
+    outbreaks.record(("disease", 2), NOW)
+    # The snapshot read from the database only has the first case
+    outbreaks.replace([(("disease", 1), bucket_of(NOW, 3600), 1)])
+    assert recent(outbreaks) == 2
+    assert recent(outbreaks, ("disease", 2)) == 1
+
+    outbreaks.replace([(("disease", 1), bucket_of(NOW, 3600), 2)])
+    assert recent(outbreaks) == 2
+    assert recent(outbreaks, ("disease", 2)) == 0
+
+
+def test_cancelled_resync_can_be_retried():
+    outbreaks = detector()
+    assert outbreaks.begin_sync()
+    outbreaks.cancel_sync()
+    outbreaks.record(("disease", 1), NOW)
+    assert outbreaks.begin_sync()
+    outbreaks.replace([(("disease", 1), bucket_of(NOW, 3600), 1)])
+    assert recent(outbreaks) == 1
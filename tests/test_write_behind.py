@@ -0,0 +1,149 @@
+# tests/test_write_behind.py
+import glob
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import datetime
+from extensions import db
+from app.models.expert_system import Case, CaseRollup
+from app.services.case_rollup_service import CaseRollupService
+from app.services.write_behind import Spool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rows(*numbers):
+    return [{"n": n, "created_at": datetime(2026, 1, 1, 0, 0, n)} for n in numbers]
+
+
+def test_replay_writes_each_spooled_row_once(app_context, tmp_path):
+    spool = Spool(str(tmp_path / "spool.jsonl"), "rows")
+    spool.append(rows(1, 2))
+    spool.append(rows(3))
+    written = []
+    spool.replay(written.extend)
+    assert written == rows(1, 2, 3)
+    spool.replay(written.extend)
+    assert written == rows(1, 2, 3)
+    assert glob.glob(str(tmp_path / "spool.jsonl*")) == []
+
+
+def test_rows_spooled_during_a_replay_wait_for_the_next_one(app_context, tmp_path):
+    spool = Spool(str(tmp_path / "spool.jsonl"), "rows")
+    spool.append(rows(1))
+    written = []
+
+    def insert(batch):
+        # Another worker spools while this one replays the claimed file
+        if not written:
+            spool.append(rows(2))
+        written.extend(batch)
+
+    spool.replay(insert)
+    assert written == rows(1)
+    spool.replay(insert)
+    assert written == rows(1, 2)
+
+
+def test_claim_of_a_dead_worker_is_taken_over(app_context, tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    Spool(path, "rows").append(rows(1))
+    os.replace(path, f"{path}.{dead.pid}.1.replay")
+
+    written = []
+    Spool(path, "rows").replay(written.extend)
+    assert written == rows(1)
+    assert glob.glob(path + "*") == []
+
+
+def test_rows_that_cannot_be_written_are_moved_aside(app_context, tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    spool = Spool(path, "rows")
+    spool.append(rows(1, 2, 3))
+    written = []
+
+    def insert(batch):
+        if any(row["n"] == 2 for row in batch):
+            raise ValueError("bad row")
+        written.extend(batch)
+
+    spool.replay(insert)
+    assert written == rows(1, 3)
+    assert not os.path.exists(path)
+    rejected = []
+    Spool(path + ".rejected", "rows").replay(rejected.extend)
+    assert rejected == rows(2)
+
+
+def test_queued_rows_are_flushed_at_exit(app, tmp_path):
+    script = textwrap.dedent(f"""
+        from datetime import datetime
+        from config import Config
+        from app import create_app
+        from app.services.case_recorder import insert_case_rows
+        from app.services.write_behind import WriteBehindWriter
+
+        class TestConfig(Config):
+            SQLALCHEMY_DATABASE_URI = {app.config["SQLALCHEMY_DATABASE_URI"]!r}
+            KNOWLEDGE_BASE_SNAPSHOT_PATH = ""
+
+        app = create_app(TestConfig)
+        writer = WriteBehindWriter(app, insert_case_rows, "cases", flush_interval=3600)
+        for _ in range(5):
+            writer.submit({{
+                "user_id": 1, "disease_id": 1, "confidence": 10.0,
+                "created_at": datetime.utcnow(), "symptom_ids": [1, 2],
+            }})
+        # No flush is due for an hour: only the atexit hook can write them
+    """)
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, timeout=60)
+    with app.app_context():
+        assert db.session.query(Case).count() == 5
+
+
+def diagnose(client):
+    return client.post("/expert-system/diagnose", data={"symptoms": ["1", "2", "3"]})
+
+
+def test_sync_mode_records_the_case_in_the_request(app, client):
+    assert diagnose(client).status_code == 200
+    assert "case_recorder" not in app.extensions
+    with app.app_context():
+        assert db.session.query(Case).count() == 1
+
+
+def test_write_behind_mode_records_the_case_on_flush(app, client):
+    app.config.update(CASE_RECORDER_MODE="write_behind", CASE_RECORDER_FLUSH_INTERVAL=3600)
+    for _ in range(3):
+        assert diagnose(client).status_code == 200
+    with app.app_context():
+        assert db.session.query(Case).count() == 0
+    app.extensions["case_recorder"].shutdown()
+    with app.app_context():
+        assert db.session.query(Case).count() == 3
+        assert all(len(case.symptoms) == 3 for case in db.session.query(Case))
+
+
+def rollup_counts():
+    return sorted(
+        (row.period, row.period_start, row.dimension, row.key_id, row.case_count)
+        for row in db.session.query(CaseRollup)
+    )
+
+
+def test_request_rollups_are_counted_after_commit_in_batches(app, client):
+    app.config["CASE_ROLLUP_FLUSH_INTERVAL"] = 3600
+    for _ in range(3):
+        assert diagnose(client).status_code == 200
+    with app.app_context():
+        # The requests only queued them: none of them locked a rollup row
+        assert rollup_counts() == []
+    app.extensions["rollup_writer"].shutdown()
+    with app.app_context():
+        counted = rollup_counts()
+        assert [row[4] for row in counted if row[0] == "day" and row[2] == "disease"] == [3]
+        CaseRollupService.rebuild()
+        assert rollup_counts() == counted
@@ -0,0 +1,11 @@
+from datetime import date, datetime
+from typing import Optional
+from flask import request
+
+
+def date_arg(name: str) -> Optional[date]:
+    """Reads a YYYY-MM-DD query string argument; None if missing or malformed."""
+    try:
+        return datetime.strptime(request.args.get(name, ""), "%Y-%m-%d").date()
+    except ValueError:
+        return None